@@ -1,7 +1,13 @@
 import shutil
 import os
-import src.util as util
-import src.version as version
+import sys
+
+# The src modules import each other by name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import util
+import version
+import pack
 
 VERSION = version.version_to_string(version.VERSION)
 
@@ -10,6 +16,7 @@ BUILD_PATH = "dist"
 def main():
     os.makedirs(BUILD_PATH, exist_ok=True)
     shutil.make_archive(os.path.join(BUILD_PATH, f"Carotene-TL-{VERSION}"), "zip", util.TL_PREFIX)
+    pack.write_pack(util.TL_PREFIX, os.path.join(BUILD_PATH, f"Carotene-TL-{VERSION}.cpak"))
 
 if __name__ == "__main__":
     main()
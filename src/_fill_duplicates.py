@@ -1,4 +1,5 @@
 import util
+import os
 import glob
 import tqdm
 
@@ -14,7 +15,7 @@ def main():
         "111",
         "147"
     ]
-    all_mdb_jsons = [util.MDB_FOLDER_EDITING + f"text_data\\{file}.json" for file in files]
+    all_mdb_jsons = [os.path.join(util.MDB_FOLDER_EDITING, "text_data", f"{file}.json") for file in files]
 
     hash_dict = {}
     all_dict = {}
@@ -1,3 +1,7 @@
+import startup
+startup.start_profile_from_args()
+
+import sys
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
@@ -6,10 +10,15 @@ import ui.widget_tabs as widget_tabs
 def main():
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     app = QApplication([])
-    widget = widget_tabs.Ui_widget_tabs(app)
+    with startup.section("Ui_widget_tabs"):
+        widget = widget_tabs.Ui_widget_tabs(app)
     widget.show()
-    app.exec_()
-    pass
+
+    if startup.is_profiling():
+        # Quit once the window is up, with exit code 1 when over the startup budget.
+        QTimer.singleShot(0, lambda: app.exit(0 if startup.report() else 1))
+
+    return app.exec_()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
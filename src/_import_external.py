@@ -7,6 +7,7 @@ import datetime
 from selenium import webdriver
 import time
 from multiprocessing import Pool
+from text_catalog import TextDataCatalog
 
 MISSIONS_JSONS = [
     "66",
@@ -38,31 +39,29 @@ def fetch_chara_data(chara_id):
     
     return out
 
-def import_category(category, data):
+def import_category(category, data, catalog=None):
     print(f"Importing text category {category}")
 
-    json_path = util.MDB_FOLDER_EDITING + f"text_data/{category}.json"
+    save = not catalog
+    catalog = catalog or TextDataCatalog()
 
-    if not os.path.exists(json_path):
+    if not catalog.exists(category):
         print(f"Skipping {category}, file not found. Run _update_local.py first.")
         return
 
-    json_data = util.load_json(json_path)
-
     for chara_id, value in data:
         if not value:  # No translation
             continue
 
-        key = f"[{category}, {chara_id}]"
-        for entry in json_data:
-            if key in entry["keys"]:
-                entry["text"] = value.strip()
-                entry['new'] = False
-                break
-        else:
-            print(f"WARN: Couldn't find {key} in {category}.json")
-    
-    util.save_json(json_path, json_data)
+        entry = catalog.get(category, chara_id)
+        if not entry:
+            print(f"WARN: Couldn't find [{category}, {chara_id}] in {category}.json")
+            continue
+
+        catalog.update(category, entry, text=value.strip(), new=False)
+
+    if save:
+        catalog.save()
 
 
 def apply_umapyoi_character_profiles(chara_ids):
@@ -85,8 +84,10 @@ def apply_umapyoi_character_profiles(chara_ids):
                 category_data[category] = [tup]
     
     # Update intermediate data per category
+    catalog = TextDataCatalog()
     for category, data in category_data.items():
-        import_category(category, data)
+        import_category(category, data, catalog)
+    catalog.save()
 
 
 def fetch_outfits(chara_id):
@@ -12,6 +12,9 @@ from settings import settings, pc, filter_mdb_jsons
 import math
 import json
 import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
@@ -85,27 +88,120 @@ def _set_value_in_table(key, value):
 def _get_version_from_table():
     return _get_value_from_table("version")
 
+def _get_meta_stat():
+    stat = os.stat(util.META_PATH)
+    return stat.st_size, stat.st_mtime_ns
+
+def _get_meta_summary(cursor):
+    # Cheap summary of the asset hashes in the meta DB, computed inside SQLite.
+    # A different summary means the assets changed. The same summary doesn't prove they didn't.
+    cursor.execute("SELECT count(*), sum(length(h)), max(h), min(h) FROM a;")
+    return list(cursor.fetchone())
+
+def _load_meta_status():
+    if not os.path.exists(util.META_STATUS_PATH):
+        return None
+
+    try:
+        return util.load_json(util.META_STATUS_PATH)
+    except json.JSONDecodeError:
+        return None
+
+def _save_meta_status(status):
+    util.save_json(util.META_STATUS_PATH, status)
+
+def _remove_meta_status():
+    if os.path.exists(util.META_STATUS_PATH):
+        os.remove(util.META_STATUS_PATH)
+
+def save_meta_status():
+    # Remember which assets the meta DB held when the patch started.
+    with util.MetaConnection() as (conn, cursor):
+        summary = _get_meta_summary(cursor)
+
+    size, mtime = _get_meta_stat()
+
+    _save_meta_status({
+        'summary': summary,
+        'size': size,
+        'mtime': mtime,
+    })
+
+def touch_meta_status():
+    # The patcher itself modifies the meta DB. Store the new file stat
+    # so the next status check can take the fast path.
+    status = _load_meta_status()
+    if not status:
+        return
+
+    status['size'], status['mtime'] = _get_meta_stat()
+    _save_meta_status(status)
+
+def _compare_meta_hashes(path, table):
+    # Compare the asset hashes of the live meta DB with a table in another DB, inside SQLite.
+    with util.MetaConnection() as (conn, cursor):
+        cursor.execute("ATTACH DATABASE ? AS bak;", (path,))
+        cursor.execute(f"SELECT 1 FROM (SELECT h FROM main.a EXCEPT SELECT h FROM bak.{table}) LIMIT 1;")
+        updated = cursor.fetchone() is not None
+        if not updated:
+            cursor.execute(f"SELECT 1 FROM (SELECT h FROM bak.{table} EXCEPT SELECT h FROM main.a) LIMIT 1;")
+            updated = cursor.fetchone() is not None
+        cursor.execute("DETACH DATABASE bak;")
+
+    return updated
+
+def _has_meta_undo_hashes():
+    with util.MetaUndoConnection() as (conn, cursor):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='h';")
+        return cursor.fetchone() is not None
+
+def _is_meta_updated_from_backup():
+    # The undo log keeps the asset hashes from when the meta DB was patched.
+    if os.path.exists(util.META_UNDO_PATH) and _has_meta_undo_hashes():
+        return _compare_meta_hashes(util.META_UNDO_PATH, "h")
+
+    # Full backups were made by older versions of the patcher.
+    bak_path = util.META_PATH + util.META_BACKUP_SUFFIX
+    if os.path.exists(bak_path):
+        return _compare_meta_hashes(bak_path, "a")
+
+    # Nothing to compare against, so we can't trust the undo log.
+    return True
+
 def _is_meta_updated():
     if not _is_meta_patched():
         return False
 
-    cur_hashes = set()
-    bak_hashes = set()
+    status = _load_meta_status()
 
-    with util.MetaConnection() as (conn, cursor):
-        cursor.execute("SELECT h from a;")
-        cur_hashes = set([row[0] for row in cursor.fetchall()])
+    if not status or 'summary' not in status:
+        # Patched by an older version that didn't store a status file.
+        updated = _is_meta_updated_from_backup()
+        if not updated:
+            save_meta_status()
+        return updated
 
-    with util.MetaBackupConnection() as (conn, cursor):
-        cursor.execute("SELECT h from a;")
-        bak_hashes = set([row[0] for row in cursor.fetchall()])
+    size, mtime = _get_meta_stat()
+    if status['size'] == size and status['mtime'] == mtime:
+        # Untouched since the last check.
+        return False
+
+    with util.MetaConnection() as (conn, cursor):
+        if _get_meta_summary(cursor) != status['summary']:
+            return True
 
-    if cur_hashes != bak_hashes:
+    # Same count and hash range. Only comparing the hashes themselves can rule out replaced assets.
+    if _is_meta_updated_from_backup():
         return True
 
+    # Only the other columns changed, for example because the game downloaded assets.
+    touch_meta_status()
     return False
 
 def _is_meta_patched():
+    if os.path.exists(util.META_UNDO_PATH):
+        return True
+
     bak_path = util.META_PATH + util.META_BACKUP_SUFFIX
 
     if not os.path.exists(bak_path):
@@ -116,11 +212,12 @@ def _is_meta_patched():
 
 def get_current_patch_ver():
     # Load settings
-    cur_patch_ver = settings.installed_version
-    cur_dll_ver = settings.dll_version
-    install_started = settings.install_started
-    is_installed = settings.installed
-    dll_name = settings.dll_name
+    cur_settings = settings.as_dict()
+    cur_patch_ver = cur_settings['installed_version']
+    cur_dll_ver = cur_settings['dll_version']
+    install_started = cur_settings['install_started']
+    is_installed = cur_settings['installed']
+    dll_name = cur_settings['dll_name']
 
     if not dll_name:
         dll_path = None
@@ -129,9 +226,6 @@ def get_current_patch_ver():
 
     mdb_ver = _get_version_from_table()
 
-    meta_is_patched = _is_meta_patched()
-    meta_is_updated = _is_meta_updated()
-
     if install_started:
         # The patcher was started, but not finished.
         return "unfinished", None
@@ -169,11 +263,11 @@ def get_current_patch_ver():
         # This should never happen, but we mark it as partial just in case.
         return "partial", None
     
-    if not meta_is_patched:
+    if not _is_meta_patched():
         # The meta DB is no longer patched.
         return "partial", None
     
-    if meta_is_updated:
+    if _is_meta_updated():
         # The meta DB has been updated.
         return "partial", None
     
@@ -181,6 +275,29 @@ def get_current_patch_ver():
     return cur_patch_ver, cur_dll_ver
 
 
+# Columns that identify a row in each table we import into.
+MDB_TABLE_KEYS = {
+    "text_data": ("category", "`index`"),
+    "race_jikkyo_message": ("id",),
+}
+
+# Fraction of free pages before the MDB is worth a VACUUM.
+VACUUM_FREE_RATIO = 0.1
+
+def vacuum_if_fragmented(conn, cursor):
+    cursor.execute("PRAGMA page_count;")
+    page_count = cursor.fetchone()[0]
+    cursor.execute("PRAGMA freelist_count;")
+    free_count = cursor.fetchone()[0]
+
+    if not page_count or free_count / page_count < VACUUM_FREE_RATIO:
+        return
+
+    print("Vacuuming MDB")
+    cursor.execute("VACUUM;")
+    conn.commit()
+
+
 def import_mdb():
     mdb_jsons = util.get_tl_mdb_jsons()
     mdb_jsons = filter_mdb_jsons(mdb_jsons)
@@ -190,8 +307,16 @@ def import_mdb():
             key = util.split_mdb_path(mdb_json)
             table = key[0]
 
-            # Backup the table
-            cursor.execute(f"CREATE TABLE IF NOT EXISTS {util.TABLE_BACKUP_PREFIX}{table} AS SELECT * FROM {table};")
+            if table not in MDB_TABLE_KEYS:
+                # Tables without a key mapping aren't imported, since their
+                # changed rows can't be backed up and restored individually.
+                continue
+
+            # Prepare an empty backup table. Only rows we change are copied into it.
+            backup_table = util.TABLE_BACKUP_PREFIX + table
+            key_columns = ", ".join(MDB_TABLE_KEYS[table])
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {backup_table} AS SELECT * FROM {table} WHERE 0;")
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {backup_table}_key ON {backup_table} ({key_columns});")
 
             # print(f"Importing {table} {category}")
             data = util.load_json(mdb_json)
@@ -217,23 +342,50 @@ def import_mdb():
                     # TODO: Implement other tables
                     case "text_data":
                         category = key[1]
+                        cursor.execute(
+                            f"""INSERT OR IGNORE INTO {backup_table} SELECT * FROM {table} WHERE category = ? and `index` = ?;""",
+                            (category, index)
+                        )
                         cursor.execute(
                             f"""UPDATE {table} SET text = ? WHERE category = ? and `index` = ?;""",
                             (text, category, index)
                         )
                     case "race_jikkyo_message":
+                        cursor.execute(
+                            f"""INSERT OR IGNORE INTO {backup_table} SELECT * FROM {table} WHERE id = ?;""",
+                            (index,)
+                        )
                         cursor.execute(
                             f"""UPDATE {table} SET message = ? WHERE id = ?;""",
                             (text, index)
                         )
 
         conn.commit()
-        cursor.execute("VACUUM;")
-        conn.commit()
+        vacuum_if_fragmented(conn, cursor)
 
     print("Import complete.")
 
 
+def _replay_meta_undo():
+    with util.MetaConnection() as (conn, cursor):
+        cursor.execute("ATTACH DATABASE ? AS undo;", (util.META_UNDO_PATH,))
+        cursor.execute("SELECT DISTINCT c FROM undo.u;")
+        columns = [row[0] for row in cursor.fetchall()]
+
+        for column in columns:
+            cursor.execute(
+                f"""UPDATE a SET {column} = (SELECT u.v FROM undo.u WHERE u.r = a.rowid AND u.c = ?)
+                WHERE rowid IN (SELECT u.r FROM undo.u WHERE u.c = ?);""",
+                (column, column)
+            )
+        conn.commit()
+        cursor.execute("DETACH DATABASE undo;")
+
+def _restore_meta_backup():
+    # Full backups were made by older versions of the patcher.
+    with util.MetaBackupConnection() as (bak_conn, _), util.MetaConnection() as (conn, _):
+        bak_conn.backup(conn)
+
 def revert_meta_db():
     print("Reverting meta DB")
 
@@ -242,18 +394,35 @@ def revert_meta_db():
     
     meta_is_updated = _is_meta_updated()
 
-    if not meta_is_updated:
-        shutil.copy(util.META_PATH + util.META_BACKUP_SUFFIX, util.META_PATH)
-    
-    os.remove(util.META_PATH + util.META_BACKUP_SUFFIX)
+    if os.path.exists(util.META_UNDO_PATH):
+        if not meta_is_updated:
+            _replay_meta_undo()
+        os.remove(util.META_UNDO_PATH)
+
+    bak_path = util.META_PATH + util.META_BACKUP_SUFFIX
+    if os.path.exists(bak_path):
+        if not meta_is_updated:
+            _restore_meta_backup()
+        os.remove(bak_path)
+
+    _remove_meta_status()
 
 def backup_meta_db():
     print("Backing up meta DB")
-    shutil.copy(util.META_PATH, util.META_PATH + util.META_BACKUP_SUFFIX)
+    util.create_meta_undo()
+
+    # Keep the asset hashes, to tell later whether the game replaced assets.
+    with util.MetaConnection() as (conn, cursor):
+        util.attach_meta_undo(cursor)
+        cursor.execute("CREATE TABLE undo.h AS SELECT h FROM main.a;")
+        conn.commit()
+        cursor.execute("DETACH DATABASE undo;")
+
+    save_meta_status()
 
 
 def clean_asset_backups():
-    asset_backups = glob.glob(util.DATA_PATH + "\\**\\*.bak", recursive=True)
+    asset_backups = glob.glob(os.path.join(util.DATA_PATH, "**", "*.bak"), recursive=True)
     print(f"Amount of backups to revert: {len(asset_backups)}")
     for asset_backup in asset_backups:
         asset_path = asset_backup.rsplit(".", 1)[0]
@@ -292,9 +461,13 @@ def create_new_image_from_path_id(asset_bundle, path_id, diff_path):
 def set_group_0(metadatas):
     # Change asset group so it doesn't get deleted.
     with util.MetaConnection() as (conn, cursor):
+        log_changes = util.attach_meta_undo(cursor)
+
         # Change group to 0 if it's currently 1.
         for metadata in metadatas:
             asset_hash = metadata['hash']
+            if log_changes:
+                util.log_meta_change(cursor, "g", "h = ? AND g = 1", (asset_hash,))
             cursor.execute("UPDATE a SET g = 0 WHERE h = ? AND g = 1;", (asset_hash,))
         conn.commit()
 
@@ -324,6 +497,177 @@ def handle_backup(asset_hash, force=False):
 
     return asset_path
 
+def _chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+def _get_meta_rows(column, values, select="h, l"):
+    # Look up meta rows in chunks to stay below SQLite's variable limit.
+    rows = []
+    with util.MetaConnection() as (conn, cursor):
+        for chunk in _chunks(values):
+            cursor.execute(f"SELECT {column}, {select} FROM a WHERE {column} IN ({','.join(['?'] * len(chunk))});", chunk)
+            rows += cursor.fetchall()
+    return rows
+
+PREFETCH_THREADS = 4
+# Downloads run at most this many bundles ahead of the imports.
+PREFETCH_AHEAD = 32
+
+class AssetPrefetcher:
+    # Downloads missing bundles on a few threads, in the order they are imported.
+    # Imports take their items from iter_ready as soon as the bundles are on disk,
+    # so downloading and the CPU work of the pool workers overlap.
+    # The download threads only write files. The meta DB is marked by iter_ready,
+    # in one transaction per import.
+    def __init__(self, hashes):
+        hashes = list(dict.fromkeys(hashes))
+        self.pending = set(hashes)
+        self.fetched = {}  # Downloaded, not yet imported: {hash: bytes}
+        self.completed = []  # Every finished hash, in order
+        self.downloaded_bytes = 0
+        self.cond = threading.Condition()
+        self.slots = threading.Semaphore(PREFETCH_AHEAD)
+        self.stopped = False
+        self.start_time = time.perf_counter()
+
+        self.executor = ThreadPoolExecutor(max_workers=PREFETCH_THREADS)
+        threading.Thread(target=self._submit_all, args=(hashes,), name="AssetPrefetcher", daemon=True).start()
+
+    def _submit_all(self, hashes):
+        for asset_hash in hashes:
+            self.slots.acquire()
+            if self.stopped:
+                return
+            try:
+                self.executor.submit(self._fetch, asset_hash)
+            except RuntimeError:
+                # Stopped in the meantime.
+                return
+
+    def _fetch(self, asset_hash):
+        n_bytes = 0
+        try:
+            util.download_asset(asset_hash, no_progress=True, mark_downloaded=False)
+            n_bytes = os.path.getsize(util.get_asset_path(asset_hash))
+        except Exception as e:
+            # The worker will try again through handle_backup.
+            print(f"\nPrefetching {asset_hash} failed: {e}")
+
+        with self.cond:
+            self.pending.discard(asset_hash)
+            self.fetched[asset_hash] = n_bytes
+            self.completed.append(asset_hash)
+            self.downloaded_bytes += n_bytes
+            self.cond.notify_all()
+
+    def _take(self, asset_hash, downloaded):
+        # Call with the lock held, once an item that needs the hash is handed out.
+        n_bytes = self.fetched.pop(asset_hash, None)
+        if n_bytes is None:
+            return
+        self.slots.release()
+        if n_bytes:
+            downloaded.append(asset_hash)
+
+    def iter_ready(self, items, get_hashes):
+        # Yield items once every bundle they need is on disk.
+        ready = []
+        waiting = {}  # {hash: [item index]}
+        missing = {}  # {item index: hashes left}
+        downloaded = []
+
+        with self.cond:
+            seen = len(self.completed)
+            for i, item in enumerate(items):
+                hashes = set(get_hashes(item))
+                for asset_hash in hashes:
+                    self._take(asset_hash, downloaded)
+
+                hashes &= self.pending
+                if not hashes:
+                    ready.append(item)
+                    continue
+
+                missing[i] = len(hashes)
+                for asset_hash in hashes:
+                    waiting.setdefault(asset_hash, []).append(i)
+
+        yield from ready
+
+        while missing:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.completed) > seen)
+                new = self.completed[seen:]
+                seen = len(self.completed)
+
+                new_ready = []
+                for asset_hash in new:
+                    if asset_hash not in waiting:
+                        # Needed by a later import.
+                        continue
+                    self._take(asset_hash, downloaded)
+                    for i in waiting.pop(asset_hash):
+                        missing[i] -= 1
+                        if not missing[i]:
+                            del missing[i]
+                            new_ready.append(items[i])
+
+            yield from new_ready
+
+        if downloaded:
+            util.mark_assets_downloaded(downloaded)
+
+    def stop(self):
+        # Drops the queued downloads and waits for the running ones,
+        # so nothing is written to the game folder after this returns.
+        self.stopped = True
+        self.slots.release()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+        seconds = time.perf_counter() - self.start_time
+        if self.downloaded_bytes and not self.pending and seconds > 0:
+            _save_throughput('download', self.downloaded_bytes / seconds)
+
+def _get_missing_hashes(items, get_hashes):
+    # Bundles to download for items, in item order. Only the ones the meta DB knows about, handle_backup skips the rest.
+    hashes = []
+    for item in items:
+        hashes += [h for h in get_hashes(item) if not os.path.exists(util.get_asset_path(h))]
+
+    known = set(row[0] for row in _get_meta_rows("h", set(hashes), select="i"))
+    return [h for h in hashes if h in known]
+
+# Shared by the imports of a patch, see _start_prefetch.
+_prefetcher = None
+
+def stop_prefetch():
+    # Has to run however a patch ends, or the download threads keep writing bundles.
+    global _prefetcher
+    if _prefetcher:
+        _prefetcher.stop()
+        _prefetcher = None
+
+def prefetch_assets(items, get_hashes):
+    # Yield items once every bundle they need is on disk.
+    # Missing bundles are downloaded on a few threads while
+    # the items that are already available get processed.
+    items = list(items)
+
+    prefetcher = _prefetcher
+    if not prefetcher:
+        prefetcher = AssetPrefetcher(_get_missing_hashes(items, get_hashes))
+
+    try:
+        yield from prefetcher.iter_ready(items, get_hashes)
+    finally:
+        if prefetcher is not _prefetcher:
+            prefetcher.stop()
+
+def _get_bundle_hash(asset_metadata):
+    return [asset_metadata['hash']]
+
 def _import_texture(asset_metadata):
     hash = asset_metadata['hash']
     asset_path = handle_backup(hash)
@@ -360,8 +704,10 @@ def import_textures(texture_asset_metadatas):
     print(f"Replacing {len(texture_asset_metadatas)} textures.")
     texture_asset_metadatas = [a[0] for a in texture_asset_metadatas]
 
+    texture_iter = prefetch_assets(texture_asset_metadatas, _get_bundle_hash)
+
     with util.UmaPool() as pool:
-        _ = list(util.tqdm(pool.imap_unordered(_import_texture, texture_asset_metadatas, chunksize=16), total=len(texture_asset_metadatas), desc="Importing textures"))
+        _ = list(util.tqdm(pool.imap_unordered(_import_texture, texture_iter, chunksize=16), total=len(texture_asset_metadatas), desc="Importing textures"))
 
 
 def _import_flash(flash_metadata):
@@ -399,7 +745,9 @@ def import_flash(flash_metadatas):
     print(f"Replacing {len(flash_metadatas)} flash files.")
     flash_metadatas = [a[0] for a in flash_metadatas]
 
-    for flash_metadata in util.tqdm(flash_metadatas, desc="Import. flash TLs"):
+    flash_iter = prefetch_assets(flash_metadatas, _get_bundle_hash)
+
+    for flash_metadata in util.tqdm(flash_iter, total=len(flash_metadatas), desc="Import. flash TLs"):
         _import_flash(flash_metadata)
 
 def set_clip_length(root, clip_asset_path_id, length_diff):
@@ -409,6 +757,9 @@ def set_clip_length(root, clip_asset_path_id, length_diff):
     clip_asset.save_typetree(clip_tree)
 
 
+def get_ruby_file_name(file_name):
+    return file_name.replace("storytimeline", "ast_ruby").replace("hometimeline_", "ast_ruby_hometimeline_")
+
 def _import_story(story_data):
     hash = story_data['hash']
     bundle_path = handle_backup(hash, force=True)
@@ -510,7 +861,7 @@ def _import_story(story_data):
         f.write(asset_bundle.file.save(packer="original"))
     
     # Handle ruby text.
-    ruby_file_name = file_name.replace("storytimeline", "ast_ruby").replace("hometimeline_", "ast_ruby_hometimeline_")
+    ruby_file_name = get_ruby_file_name(file_name)
     with util.MetaConnection() as (conn, cursor):
         cursor.execute("SELECT h FROM a WHERE n = ?;", (ruby_file_name,))
         ruby_hash = cursor.fetchone()
@@ -533,11 +884,28 @@ def _import_story(story_data):
         f.write(ruby_bundle.file.save(packer="original"))
 
 
+def _get_story_hash_getter(story_datas):
+    # Stories also need their ruby bundle.
+    ruby_names = [get_ruby_file_name(story_data['file_name']) for story_data in story_datas]
+    ruby_hashes = dict(_get_meta_rows("n", ruby_names, select="h"))
+
+    def get_story_hashes(story_data):
+        hashes = [story_data['hash']]
+        ruby_hash = ruby_hashes.get(get_ruby_file_name(story_data['file_name']))
+        if ruby_hash:
+            hashes.append(ruby_hash)
+        return hashes
+
+    return get_story_hashes
+
 def import_stories(story_datas):
     #TODO: Increase chunk size (maybe 16?) when more stories are added.
     story_datas = [a[0] for a in story_datas]
+
+    story_iter = prefetch_assets(story_datas, _get_story_hash_getter(story_datas))
+
     with util.UmaPool() as pool:
-        _ = list(util.tqdm(pool.imap_unordered(_import_story, story_datas, chunksize=8), total=len(story_datas), desc="Importing stories"))
+        _ = list(util.tqdm(pool.imap_unordered(_import_story, story_iter, chunksize=8), total=len(story_datas), desc="Importing stories"))
 
     # print(f"Replacing {len(story_datas)} stories.")
     # for story_data in story_datas:
@@ -573,33 +941,177 @@ def import_movies(movie_metadatas):
 
     set_group_0(movie_datas)
 
+    movie_iter = prefetch_assets(movie_datas, _get_bundle_hash)
+
     with util.UmaPool() as pool:
-        _ = list(util.tqdm(pool.imap_unordered(_import_xor, movie_datas, chunksize=16), total=len(movie_datas), desc="Patching videos"))
+        _ = list(util.tqdm(pool.imap_unordered(_import_xor, movie_iter, chunksize=16), total=len(movie_datas), desc="Patching videos"))
 
     # print(f"Replacing {len(xor_datas)} xor files.")
     # for xor_data in xor_datas:
     #     _import_xor(xor_data)
 
-def import_assets():
-    clean_asset_backups()
-    revert_meta_db()
-    backup_meta_db()
+# Asset types in patch order: (customization key, asset type, restored from backup)
+PATCH_ASSET_TYPES = (
+    ("flash", "flash", False),
+    ("textures", "texture", False),
+    ("story", "story", True),
+    ("videos", "movie", True),
+)
+
+# Bytes per second, used until a patch on this machine has been timed.
+DEFAULT_THROUGHPUT = {
+    'download': 5 * 1024**2,
+    'flash': 20 * 1024**2,
+    'texture': 4 * 1024**2,
+    'story': 8 * 1024**2,
+    'movie': 100 * 1024**2,
+}
+
+def load_patch_stats():
+    stats = dict(DEFAULT_THROUGHPUT)
+
+    if os.path.exists(util.PATCH_STATS_PATH):
+        try:
+            stats.update(util.load_json(util.PATCH_STATS_PATH))
+        except json.JSONDecodeError:
+            pass
+
+    return stats
+
+def _save_throughput(kind, bytes_per_second):
+    stats = load_patch_stats()
+    stats[kind] = bytes_per_second
+    util.save_json(util.PATCH_STATS_PATH, stats)
+
+def record_throughput(plan, asset_type, seconds):
+    # Only time types that didn't have to wait for downloads.
+    if not plan or seconds <= 0:
+        return
 
-    if not pc("flash") and not pc("textures") and not pc("story") and not pc("videos"):
-        print("Skipping assets.")
+    type_plan = plan['types'].get(asset_type)
+    if not type_plan or not type_plan['bytes'] or type_plan['downloads']:
         return
 
-    asset_dict = util.get_assets_type_dict()
+    _save_throughput(asset_type, type_plan['bytes'] / seconds)
+
+def plan_patch(asset_dict=None):
+    if asset_dict is None:
+        asset_dict = util.get_assets_type_dict()
+
+    targets = {}
+    for cust_key, asset_type, force in PATCH_ASSET_TYPES:
+        if not pc(cust_key):
+            continue
+
+        hashes = [a[0]['hash'] for a in asset_dict.get(asset_type, [])]
+
+        if asset_type == "story":
+            # Stories also patch their ruby asset.
+            ruby_names = [get_ruby_file_name(a[0]['file_name']) for a in asset_dict.get(asset_type, [])]
+            hashes += [row[1] for row in _get_meta_rows("n", ruby_names, select="h")]
+
+        targets[asset_type] = (hashes, force)
+
+    all_hashes = set()
+    for hashes, _ in targets.values():
+        all_hashes.update(hashes)
+
+    meta_sizes = {row[0]: row[2] or 0 for row in _get_meta_rows("h", all_hashes)}
+
+    stats = load_patch_stats()
+
+    plan = {
+        'types': {},
+        'download': [],
+        'missing': [],
+        'cached': [],
+        'backup': [],
+        'download_bytes': 0,
+        'read_bytes': 0,
+        'write_bytes': 0,
+        'disk_bytes': 0,
+        'seconds': 0.,
+    }
+    seen = set()
+
+    for asset_type, (hashes, force) in targets.items():
+        type_plan = {'targets': 0, 'bytes': 0, 'downloads': 0}
+
+        for asset_hash in hashes:
+            if asset_hash not in meta_sizes:
+                plan['missing'].append(asset_hash)
+                continue
+
+            asset_path = util.get_asset_path(asset_hash)
+            exists = os.path.exists(asset_path)
+            size = os.path.getsize(asset_path) if exists else meta_sizes[asset_hash]
+
+            type_plan['targets'] += 1
+            type_plan['bytes'] += size
+
+            if not exists:
+                type_plan['downloads'] += 1
+
+            if asset_hash in seen:
+                continue
+            seen.add(asset_hash)
+
+            if exists:
+                plan['cached'].append(asset_hash)
+            else:
+                plan['download'].append(asset_hash)
+                plan['download_bytes'] += size
+                plan['disk_bytes'] += size
 
-    if pc("flash"):
-        import_flash(asset_dict.get('flash', []))
-    if pc("textures"):
-        import_textures(asset_dict.get('texture', []))
-    if pc("story"):
-        import_stories(asset_dict.get('story', []))
-    if pc("videos"):
-        import_movies(asset_dict.get('movie', []))
+            # Old backups are moved back in place before patching, so every target gets a new one.
+            plan['backup'].append(asset_hash)
+            plan['disk_bytes'] += size
+            if os.path.exists(asset_path + ".bak"):
+                plan['disk_bytes'] -= os.path.getsize(asset_path + ".bak")
 
+            copies = 2 if force else 1
+            plan['read_bytes'] += size * (copies + 1)
+            plan['write_bytes'] += size * (copies + 1)
+
+        plan['types'][asset_type] = type_plan
+        plan['seconds'] += type_plan['bytes'] / stats[asset_type]
+
+    plan['seconds'] += plan['download_bytes'] / stats['download']
+    plan['disk_bytes'] = max(plan['disk_bytes'], 0)
+
+    return plan
+
+def format_plan(plan):
+    def gb(n):
+        return f"{n / 1024**3:.2f} GB"
+
+    lines = []
+    for asset_type, type_plan in plan['types'].items():
+        lines.append(f"{asset_type}: {type_plan['targets']} bundles, {gb(type_plan['bytes'])}")
+
+    lines.append(f"To download: {len(plan['download'])} bundles, {gb(plan['download_bytes'])}")
+    lines.append(f"Already downloaded: {len(plan['cached'])} bundles")
+    lines.append(f"To back up: {len(plan['backup'])} bundles")
+    if plan['missing']:
+        lines.append(f"Not in meta DB (skipped): {len(plan['missing'])} bundles")
+    lines.append(f"Read: {gb(plan['read_bytes'])}, written: {gb(plan['write_bytes'])}")
+    lines.append(f"Extra disk space: {gb(plan['disk_bytes'])}")
+    lines.append(f"Estimated time: {math.ceil(plan['seconds'] / 60)} min")
+
+    return "\n".join(lines)
+
+
+def _timed_import(plan, asset_type, func, metadatas):
+    start = time.perf_counter()
+    func(metadatas)
+    record_throughput(plan, asset_type, time.perf_counter() - start)
+
+ASSET_IMPORTERS = {
+    'flash': import_flash,
+    'texture': import_textures,
+    'story': import_stories,
+    'movie': import_movies,
+}
 
 def _import_jpdict():
     jpdict_path = os.path.join(util.ASSEMBLY_FOLDER, "JPDict.json")
@@ -1017,8 +1529,10 @@ def upgrade():
         print("Upgrade complete.")
 
 
-def main(dl_latest=False, dll_name='carotenify.dll', ignore_filesize=False):
+def _start_patch(state, dl_latest, ignore_filesize):
     print("=== Patching ===")
+    # Left over from a cancelled patch.
+    stop_prefetch()
 
     if not os.path.exists(util.MDB_PATH):
         raise SqliteError(f"MDB not found: {util.MDB_PATH}")
@@ -1029,29 +1543,102 @@ def main(dl_latest=False, dll_name='carotenify.dll', ignore_filesize=False):
     if dl_latest:
         ver = util.download_latest(ignore_filesize, settings.prerelease)
 
-    settings.client_version = version.VERSION
-    settings.install_started = True
-    settings.customization_changed = False
+    state['asset_dict'] = util.get_assets_type_dict()
+    state['plan'] = plan_patch(state['asset_dict'])
+    print(format_plan(state['plan']))
 
-    mark_mdb_translated(ver)
+    if not ignore_filesize:
+        enough, err = util.check_enough_game_space(state['plan']['disk_bytes'])
+        if not enough:
+            raise util.NotEnoughSpaceException(err)
+
+    with settings.transaction():
+        settings.client_version = version.VERSION
+        settings.install_started = True
+        settings.customization_changed = False
 
-    import_mdb()
+    mark_mdb_translated(ver)
 
+def _import_assembly_task():
     if pc("assembly"):
         import_assembly()
-    
-    download_dll(dl_latest, dll_name)
 
-    import_assets()
+def _prepare_asset_import():
+    clean_asset_backups()
+    revert_meta_db()
+    backup_meta_db()
+
+def _start_prefetch(state):
+    # Work out every bundle the asset imports need, and start downloading the missing ones.
+    global _prefetcher
+    stop_prefetch()
+
+    hashes = []
+    for cust_key, asset_type, _ in PATCH_ASSET_TYPES:
+        if not pc(cust_key):
+            continue
+
+        items = [a[0] for a in state['asset_dict'].get(asset_type, [])]
+        get_hashes = _get_story_hash_getter(items) if asset_type == "story" else _get_bundle_hash
+        hashes += _get_missing_hashes(items, get_hashes)
+
+    print(f"Downloading {len(hashes)} missing bundles in the background.")
+    _prefetcher = AssetPrefetcher(hashes)
+
+def _import_asset_type(state, cust_key, asset_type):
+    if not pc(cust_key):
+        return
+
+    metadatas = state['asset_dict'].get(asset_type, [])
+    _timed_import(state['plan'], asset_type, ASSET_IMPORTERS[asset_type], metadatas)
+
+def _finish_patch(dl_latest):
+    stop_prefetch()
+    touch_meta_status()
 
     if dl_latest:
         util.clean_download()
     
-    settings.install_started = False
-    settings.installed = True
+    with settings.transaction():
+        settings.install_started = False
+        settings.installed = True
 
     print("=== Patching complete! ===\n")
 
+def get_tasks(dl_latest=False, dll_name='carotenify.dll', ignore_filesize=False):
+    # The patch as (label, function) tasks, so a job can be cancelled between them.
+    # A cancelled patch stays marked as started and shows up as unfinished.
+    # The tasks share the asset dict and plan from the first task.
+    state = {}
+
+    tasks = [
+        ("Preparing", lambda: _start_patch(state, dl_latest, ignore_filesize)),
+        ("Importing MDB", import_mdb),
+        ("Importing assembly", _import_assembly_task),
+        ("Installing DLL", lambda: download_dll(dl_latest, dll_name)),
+        ("Backing up meta DB", _prepare_asset_import),
+        ("Starting downloads", lambda: _start_prefetch(state)),
+    ]
+
+    for cust_key, asset_type, _ in PATCH_ASSET_TYPES:
+        tasks.append((f"Importing {cust_key}", lambda cust_key=cust_key, asset_type=asset_type: _import_asset_type(state, cust_key, asset_type)))
+
+    tasks.append(("Marking patched", lambda: _finish_patch(dl_latest)))
+    return tasks
+
+def main(dl_latest=False, dll_name='carotenify.dll', ignore_filesize=False, plan_only=False):
+    if plan_only:
+        # Dry run against the local translation files.
+        plan = plan_patch()
+        print(format_plan(plan))
+        return plan
+
+    try:
+        for _, task in get_tasks(dl_latest, dll_name, ignore_filesize):
+            task()
+    finally:
+        stop_prefetch()
+
 
 if __name__ == "__main__":
-    main(dl_latest=False)
+    main(dl_latest=False, plan_only=settings.args.plan)
@@ -6,16 +6,22 @@ import _unpatch
 import postprocess
 import hachimi
 
+# (label, function) steps, so the GUI can run them as a job.
+TASKS = [
+    *_unpatch.TASKS,
+    # ("Filling duplicates", _fill_duplicates.main),
+    ("Autofilling MDB", autofill_mdb.run),
+    ("Autofilling assets", autofill_assets.run),
+    ("Converting MDB", intermediate.mdb_from_intermediate),
+    ("Converting assets", intermediate.assets_from_intermediate),
+    ("Converting assembly", intermediate.assembly_from_intermediate),
+    ("Postprocessing", postprocess.do_postprocess),
+    ("Converting to Hachimi", hachimi.convert),
+]
+
 def main():
-    _unpatch.main()
-    # _fill_duplicates.main()
-    autofill_mdb.run()
-    autofill_assets.run()
-    intermediate.mdb_from_intermediate()
-    intermediate.assets_from_intermediate()
-    intermediate.assembly_from_intermediate()
-    postprocess.do_postprocess()
-    hachimi.convert()
+    for _, task in TASKS:
+        task()
 
 if __name__ == "__main__":
     main()
@@ -17,10 +17,6 @@ def revert_mdb():
         for table in tables:
             table = table[0]
             print(f"Restoring {table}")
-            # Copy the backup table to the original table
-            cursor.execute(f"SELECT * FROM {table};")
-            rows = cursor.fetchall()
-            
             normal_table = table[len(util.TABLE_BACKUP_PREFIX):]
 
             # Check if the table exists
@@ -29,20 +25,17 @@ def revert_mdb():
                 print(f"Table {normal_table} does not exist. Skipping.")
                 continue
 
-            # Chunk the rows
-            for i in range(0, len(rows), 1000):
-                chunk = rows[i:i+1000]
-                cursor.executemany(f"INSERT OR REPLACE INTO {normal_table} VALUES ({','.join(['?']*len(chunk[0]))});", chunk)
+            # The backup table only holds the rows that were changed.
+            cursor.execute(f"INSERT OR REPLACE INTO {normal_table} SELECT * FROM {table};")
 
             # Delete the backup table
             cursor.execute(f"DROP TABLE {table};")
 
         conn.commit()
-        cursor.execute("VACUUM;")
-        conn.commit()
+        _patch.vacuum_if_fragmented(conn, cursor)
 
 def revert_assets():
-    asset_backups = glob.glob(util.DATA_PATH + "\\**\\*.bak", recursive=True)
+    asset_backups = glob.glob(os.path.join(util.DATA_PATH, "**", "*.bak"), recursive=True)
     print(f"Reverting {len(asset_backups)} assets")
     for asset_backup in asset_backups:
         asset_path = asset_backup.rsplit(".", 1)[0]
@@ -138,20 +131,32 @@ def revert_assembly(dl_latest=False):
         print(f"Keeping dll")
 
 
-def main(dl_latest=False):
-    print("=== Unpatching ===")
-    settings.customization_changed = False
-
-    revert_mdb()
-    revert_assets()
-    revert_assembly(dl_latest)
-    _patch.revert_meta_db()
+def _finish_unpatch():
     _patch.mark_mdb_untranslated()
-    settings.install_started = False
-    settings.installed_version = None
-    settings.dll_version = None
-    settings.installed = False
+    with settings.transaction():
+        settings.customization_changed = False
+        settings.install_started = False
+        settings.installed_version = None
+        settings.dll_version = None
+        settings.installed = False
     print("=== Unpatch complete! ===\n")
 
+def get_tasks(dl_latest=False):
+    # The revert as (label, function) tasks, so a job can be cancelled between them.
+    return [
+        ("Reverting MDB", revert_mdb),
+        ("Reverting assets", revert_assets),
+        ("Reverting assembly", lambda: revert_assembly(dl_latest)),
+        ("Reverting meta DB", _patch.revert_meta_db),
+        ("Marking unpatched", _finish_unpatch),
+    ]
+
+TASKS = get_tasks()
+
+def main(dl_latest=False):
+    print("=== Unpatching ===")
+    for _, task in get_tasks(dl_latest):
+        task()
+
 if __name__ == "__main__":
     main(dl_latest=False)
@@ -2,13 +2,19 @@ import index
 import _unpatch
 import hachimi
 
+# (label, function) steps, so the GUI can run them as a job.
+TASKS = [
+    *_unpatch.TASKS,
+    ("Backporting", hachimi.backport_before),
+    ("Indexing MDB", index.index_mdb),
+    ("Indexing assets", index.index_assets),
+    ("Indexing assembly", index.index_assembly),
+    ("Backporting", hachimi.backport_after),
+]
+
 def main():
-    _unpatch.main()
-    hachimi.backport_before()
-    index.index_mdb()
-    index.index_assets()
-    index.index_assembly()
-    hachimi.backport_after()
+    for _, task in TASKS:
+        task()
 
 if __name__ == "__main__":
     main()
@@ -6,12 +6,14 @@ import math
 import glob
 import json
 import os
+import hashlib
+import numpy as np
+from functools import cache, lru_cache
 from tqdm import tqdm
-from multiprocessing import Pool
-import filecmp
+from PIL.PngImagePlugin import PngInfo
 import shutil
 
-FONT_PATH = util.MDB_FOLDER_EDITING + "\\font\\dynamic01.otf"
+FONT_PATH = util.FONT_PATH
 GACHA_NAME_FONT_SIZE = 180
 GACHA_NAME_MAX_WIDTH = 1450
 GACHA_NAME_IMG_SIZE = (2048, 512)
@@ -40,24 +42,76 @@ GACHA_COMMENT_COLORS = (
 )
 
 
+# Bump when the rendered images change, so cached renders are redone.
+GACHA_RENDER_VERSION = 1
+GACHA_RENDER_KEY = "carotene_render_key"
+GACHA_RENDER_CACHE_FOLDER = os.path.join(util.APP_DIR, "gacha_render_cache", "")
+
+# Shadows never spread further than this from the text, so blurs only run on that area.
+GACHA_BLUR_MARGIN = 128
+
+
+@cache
+def _get_font(size):
+    # Cached per worker process.
+    return ImageFont.truetype(FONT_PATH, size)
+
+def _threshold_lut(value):
+    return [0] + [value] * 255
+
+@lru_cache(maxsize=64)
+def _get_gradient_strip(width, palette):
+    return img_util.horz_gradient_strip(width, palette)
+
+def _make_gradient_bg(box, bg_bbox, palette):
+    # The area box of a black image with a horizontal gradient over bg_bbox.
+    strip = _get_gradient_strip(bg_bbox[2] - bg_bbox[0], palette)
+    row = np.zeros((box[2] - box[0], 3), dtype=np.uint8)
+
+    start = max(bg_bbox[0], box[0])
+    end = min(bg_bbox[2] + 1, box[2])
+    if start < end:
+        row[start - box[0]:end - box[0]] = strip[start - bg_bbox[0]:end - bg_bbox[0]]
+
+    return Image.fromarray(np.ascontiguousarray(np.broadcast_to(row, (box[3] - box[1], box[2] - box[0], 3))), "RGB")
+
+def _get_blur_box(text_layer):
+    bbox = text_layer.getchannel("A").getbbox()
+    if not bbox:
+        return (0, 0, text_layer.width, text_layer.height)
+
+    return (
+        max(bbox[0] - GACHA_BLUR_MARGIN, 0),
+        max(bbox[1] - GACHA_BLUR_MARGIN, 0),
+        min(bbox[2] + GACHA_BLUR_MARGIN, text_layer.width),
+        min(bbox[3] + GACHA_BLUR_MARGIN, text_layer.height),
+    )
+
+def _compose_layers(size, box, layers):
+    final = Image.new("RGBA", size, (255, 255, 255, 0))
+    area = final.crop(box)
+    for layer in layers:
+        area = Image.alpha_composite(area, layer)
+    final.paste(area, box[:2])
+    return final
+
+
 def generate_gacha_name_img(name: str, rarity: int=1):
     palette1 = GACHA_NAME_COLORS[rarity - 1][0]
     palette2 = GACHA_NAME_COLORS[rarity - 1][1]
 
     # First, determine the width of the text at default font size.
-    # print("Scaling font")
-    font = ImageFont.truetype(FONT_PATH, GACHA_NAME_FONT_SIZE)
+    font = _get_font(GACHA_NAME_FONT_SIZE)
     text_bbox = font.getbbox(name)
     text_width = text_bbox[2] - text_bbox[0]
 
     # If the text is too wide, reduce the font size.
     if text_width > GACHA_NAME_MAX_WIDTH:
-        font = ImageFont.truetype(FONT_PATH, math.floor(GACHA_NAME_FONT_SIZE * GACHA_NAME_MAX_WIDTH / text_width))
+        font = _get_font(math.floor(GACHA_NAME_FONT_SIZE * GACHA_NAME_MAX_WIDTH / text_width))
         text_bbox = font.getbbox(name)
         text_width = text_bbox[2] - text_bbox[0]
 
     # Draw the text.
-    # print("Draw text")
     text_layer = Image.new("RGBA", GACHA_NAME_IMG_SIZE, (255, 255, 255, 0))
     draw = ImageDraw.Draw(text_layer)
     midpoint = (GACHA_NAME_IMG_SIZE[0] / 2, GACHA_NAME_IMG_SIZE[1] / 2)
@@ -65,7 +119,6 @@ def generate_gacha_name_img(name: str, rarity: int=1):
     draw.text(midpoint, name, font=font, fill=(255, 255, 255, 255), anchor=anchor)
 
     # Squeeze the text vertically to 90% of the original height.
-    # print("Squeeze text")
     text_layer = text_layer.resize((GACHA_NAME_IMG_SIZE[0], math.floor(GACHA_NAME_IMG_SIZE[1] * 0.9)), Image.Resampling.BICUBIC)
     new_layer = Image.new("RGBA", GACHA_NAME_IMG_SIZE, (255, 255, 255, 0))
     new_layer.paste(text_layer, (0, math.floor(GACHA_NAME_IMG_SIZE[1] * 0.05)))
@@ -74,59 +127,35 @@ def generate_gacha_name_img(name: str, rarity: int=1):
     text_layer = new_new_layer
 
     # Apply horizontal sheering
-    # print("Sheer text")
     text_layer = text_layer.transform((text_layer.width, text_layer.height), Image.AFFINE, (1, GACHA_NAME_SHEER_FACTOR, -50, 0, 1, 0))
-    text_layer = text_layer.filter(ImageFilter.GaussianBlur(1))
 
+    # Only the area around the text is blurred and composited.
+    box = _get_blur_box(text_layer)
+    text_layer = text_layer.crop(box).filter(ImageFilter.GaussianBlur(1))
 
     # Create masks for the drop shadows.
-    # print("Create masks")
-    mask1 = text_layer.copy().split()[3]
-    mask2 = text_layer.copy().split()[3]
-
     # Mask 1 is the more opaque shadow.
-    # Apply gaussian blur.
-    # mask1 = mask1.filter(ImageFilter.GaussianBlur(2))
-    mask2 = mask2.filter(ImageFilter.GaussianBlur(10))
+    mask1 = text_layer.getchannel("A")
+    mask2 = mask1.filter(ImageFilter.GaussianBlur(10))
 
-    mask1 = mask1.point(lambda p: 255 if p > 0 else 0)
-    mask2 = mask2.point(lambda p: 200 if p > 0 else 0)
+    mask1 = mask1.point(_threshold_lut(255))
+    mask2 = mask2.point(_threshold_lut(200))
 
     mask1 = mask1.filter(ImageFilter.GaussianBlur(4))
     mask2 = mask2.filter(ImageFilter.GaussianBlur(15))
 
     # Let's assume 100px is the maximum the shadow can spread.
-    # print("Create backgrounds")
     safezone = 70
     bg_bbox = (math.floor(midpoint[0] - text_bbox[2] / 2 - safezone), 0, math.ceil(midpoint[0] + text_bbox[2] / 2 + safezone), GACHA_NAME_IMG_SIZE[1])
 
-    # Create backgrounds
-    mask1_bg = Image.new("RGB", GACHA_NAME_IMG_SIZE, (0, 0, 0))
-    mask1_bg_draw = ImageDraw.Draw(mask1_bg)
-    mask2_bg = Image.new("RGB", GACHA_NAME_IMG_SIZE, (0, 0, 0))
-    mask2_bg_draw = ImageDraw.Draw(mask2_bg)
-
-    img_util.horz_gradient(mask1_bg_draw, img_util.Rect(*bg_bbox), img_util.gradient_color, palette1)
-    img_util.horz_gradient(mask2_bg_draw, img_util.Rect(*bg_bbox), img_util.gradient_color, palette2)
-
-    # Apply the alpha layers of the masks onto the backgrounds.
+    # Create backgrounds and apply the alpha layers of the masks onto them.
+    mask1_bg = _make_gradient_bg(box, bg_bbox, palette1)
+    mask2_bg = _make_gradient_bg(box, bg_bbox, palette2)
     mask1_bg.putalpha(mask1)
     mask2_bg.putalpha(mask2)
 
-    # Debug: Save the layers.
-    # print("Save images")
-    # text_layer.save("text_layer.png")
-    # mask1_bg.save("mask1.png")
-    # mask2_bg.save("mask2.png")
-
     # Combine the layers.
-    # print("Combine images")
-    final = Image.new("RGBA", GACHA_NAME_IMG_SIZE, (255, 255, 255, 0))
-    final = Image.alpha_composite(final, mask2_bg)
-    final = Image.alpha_composite(final, mask1_bg)
-    final = Image.alpha_composite(final, text_layer)
-    
-    return final
+    return _compose_layers(GACHA_NAME_IMG_SIZE, box, (mask2_bg, mask1_bg, text_layer))
 
 
 def fetch_gacha_name_data(type_folder: str, mdb_id: int):
@@ -141,14 +170,14 @@ def fetch_gacha_name_data(type_folder: str, mdb_id: int):
         list: List of tuples - (asset_path, name, rarity)
     """
     out = []
-    files = glob.glob(util.ASSETS_FOLDER_EDITING + f"\\gacha\\{type_folder}\\**\\*.json", recursive=True)
+    files = glob.glob(os.path.join(util.ASSETS_FOLDER_EDITING, "gacha", type_folder, "**", "*.json"), recursive=True)
     for file in files:
         data = util.load_json(file)
         name_id, rarity = data['file_name'].rsplit("/", 1)[1].rsplit("_", 2)[1:]
         rarity = int(rarity)
         name_id = int(name_id)
 
-        mdb_data = util.load_json(util.MDB_FOLDER_EDITING + f"\\text_data\\{mdb_id}.json")
+        mdb_data = util.load_json(os.path.join(util.MDB_FOLDER_EDITING, "text_data", f"{mdb_id}.json"))
         name = ""
         for entry in mdb_data:
             keys = json.loads(entry['keys'])
@@ -169,72 +198,45 @@ def fetch_gacha_name_data(type_folder: str, mdb_id: int):
 def generate_gacha_name_images():
     # Index all gacha name images and generate them.
     # Fetch names from the correct mdb files.
-    # Compare mdb name to name already in translation folder.
-    # Only generate if different or not present.
     print("Generating gacha name images")
 
     data = fetch_gacha_name_data("charaname", "170")
     data += fetch_gacha_name_data("supportname", "77")
 
-    # Filter out names that don't need to be generated.
-    names_path = util.ASSETS_FOLDER + "\\gacha\\names.json"
-    existing_names = {}
+    names_path = os.path.join(util.ASSETS_FOLDER, "gacha", "names.json")
     new_names = {}
-    if os.path.exists(names_path):
-        existing_names = util.load_json(names_path)
-    
-    # TODO: Remove this
-    # existing_names = {}
-    # data = data[:10]
-    
-    filtered_data = []
-    for name_data in data:
-        asset_path, name, rarity = name_data
+    jobs = []
+    for asset_path, name, rarity in data:
         asset_basename = os.path.basename(asset_path).replace(".json", "")
         new_names[asset_basename] = name
-        if asset_basename in existing_names and existing_names[asset_basename] == name:
-            if not filecmp.cmp(asset_path.replace(".json", ".png"), asset_path.replace(".json", ".org.png")):
-                continue
-        filtered_data.append(name_data)
-    
-    # Generate the images.
-    with Pool() as pool:
-        list(tqdm(pool.imap_unordered(_generate_gacha_name_image, filtered_data, chunksize=16), total=len(filtered_data), desc="Generating images"))
+        jobs.append((asset_path.replace(".json", ".png"), "name", name, rarity))
 
+    render_keys = render_gacha_images(jobs)
 
-    # for name_data in filtered_data:
-    #     pool_generate_gacha_name_image(name_data)
-    
     # Save the names to the names.json file.
     os.makedirs(os.path.dirname(names_path), exist_ok=True)
     util.save_json(names_path, new_names)
 
-def _generate_gacha_name_image(name_data):
-    asset_path, name, rarity = name_data
-    # print(f"\nGenerating image for {name} - {rarity}")
-    img = generate_gacha_name_img(name, rarity)
-    img.save(asset_path.replace(".json", ".png"))
+    return render_keys
 
 def generate_gacha_comment_img(comment: str):
     palette1 = GACHA_COMMENT_COLORS[0]
     palette2 = GACHA_COMMENT_COLORS[1]
     
     # Draw the text.
-    # print("Draw text")
     text_layer = Image.new("RGBA", GACHA_COMMENT_IMG_SIZE, (255, 255, 255, 0))
     draw = ImageDraw.Draw(text_layer)
 
-    # print("Scaling font")
     anchor = 'mm'
     spacing = 40
     align = 'center'
-    font = ImageFont.truetype(FONT_PATH, GACHA_COMMENT_FONT_SIZE)
+    font = _get_font(GACHA_COMMENT_FONT_SIZE)
     text_bbox = draw.multiline_textbbox((0, 0), comment, font=font, anchor=anchor, spacing=spacing, align=align)
     text_width = text_bbox[2] - text_bbox[0]
 
     # If the text is too wide, reduce the font size.
     if text_width > GACHA_COMMENT_MAX_WIDTH:
-        font = ImageFont.truetype(FONT_PATH, math.floor(GACHA_COMMENT_FONT_SIZE * GACHA_COMMENT_MAX_WIDTH / text_width))
+        font = _get_font(math.floor(GACHA_COMMENT_FONT_SIZE * GACHA_COMMENT_MAX_WIDTH / text_width))
         spacing *= math.floor(GACHA_COMMENT_FONT_SIZE / font.size)
         text_bbox = draw.multiline_textbbox((0, 0), comment, font=font, anchor=anchor, spacing=spacing, align=align)
         text_width = text_bbox[2] - text_bbox[0]
@@ -242,56 +244,34 @@ def generate_gacha_comment_img(comment: str):
     midpoint = (GACHA_COMMENT_IMG_SIZE[0] / 2, GACHA_COMMENT_IMG_SIZE[1] / 2)
     draw.multiline_text(midpoint, comment, font=font, fill=(255, 255, 255, 255), anchor=anchor, spacing=spacing, align=align)
 
-    # Create masks for the drop shadows.
-    # print("Create masks")
-    mask1 = text_layer.copy().split()[3]
-    mask2 = text_layer.copy().split()[3]
+    # Only the area around the text is blurred and composited.
+    box = _get_blur_box(text_layer)
+    text_layer = text_layer.crop(box)
 
+    # Create masks for the drop shadows.
     # Mask 1 is the more opaque shadow.
-    # Apply gaussian blur.
+    mask1 = text_layer.getchannel("A")
+    mask2 = mask1.filter(ImageFilter.GaussianBlur(10))
     mask1 = mask1.filter(ImageFilter.GaussianBlur(1))
-    mask2 = mask2.filter(ImageFilter.GaussianBlur(10))
 
-    mask1 = mask1.point(lambda p: 255 if p > 0 else 0)
-    mask2 = mask2.point(lambda p: 180 if p > 0 else 0)
+    mask1 = mask1.point(_threshold_lut(255))
+    mask2 = mask2.point(_threshold_lut(180))
 
     mask1 = mask1.filter(ImageFilter.GaussianBlur(4))
     mask2 = mask2.filter(ImageFilter.GaussianBlur(15))
 
-    # print("Create backgrounds")
     safezone = 70
     bg_bbox = (math.floor(midpoint[0] - text_width / 2 - safezone), 0, math.ceil(midpoint[0] + text_width / 2 + safezone), GACHA_COMMENT_IMG_SIZE[1])
 
-    # Create backgrounds
-    mask1_bg = Image.new("RGB", GACHA_COMMENT_IMG_SIZE, (0, 0, 0))
-    mask1_bg_draw = ImageDraw.Draw(mask1_bg)
-    mask2_bg = Image.new("RGB", GACHA_COMMENT_IMG_SIZE, (0, 0, 0))
-    mask2_bg_draw = ImageDraw.Draw(mask2_bg)
-
-    img_util.horz_gradient(mask1_bg_draw, img_util.Rect(*bg_bbox), img_util.gradient_color, palette1)
-    img_util.horz_gradient(mask2_bg_draw, img_util.Rect(*bg_bbox), img_util.gradient_color, palette2)
-
-    # Apply the alpha layers of the masks onto the backgrounds.
+    # Create backgrounds and apply the alpha layers of the masks onto them.
+    mask1_bg = _make_gradient_bg(box, bg_bbox, palette1)
+    mask2_bg = _make_gradient_bg(box, bg_bbox, palette2)
     mask1_bg.putalpha(mask1)
     mask2_bg.putalpha(mask2)
 
-    # Debug: Save the layers.
-    # print("Save images")
-    # text_layer.save("text_layer.png")
-    # mask1_bg.save("mask1.png")
-    # mask2_bg.save("mask2.png")
-
     # Combine the layers.
-    # print("Combine images")
-    final = Image.new("RGBA", GACHA_COMMENT_IMG_SIZE, (255, 255, 255, 0))
-    final = Image.alpha_composite(final, mask2_bg)
-    final = Image.alpha_composite(final, mask1_bg)
     text_layer = text_layer.filter(ImageFilter.GaussianBlur(1))
-    final = Image.alpha_composite(final, text_layer)
-
-    # final.save("final.png")
-
-    return final
+    return _compose_layers(GACHA_COMMENT_IMG_SIZE, box, (mask2_bg, mask1_bg, text_layer))
 
 
 def generate_gacha_comment_images():
@@ -300,48 +280,120 @@ def generate_gacha_comment_images():
     existing_path = util.GACHA_COMMENT_TL_PATH
 
     new_dict = {}
-    existing_dict = {}
-    
     if os.path.exists(new_path):
         new_dict = util.load_json(new_path)
-    
-    if os.path.exists(existing_path):
-        existing_dict = util.load_json(existing_path)
-    
-    # Filter out comments that don't need to be generated.
-    filtered_data = {}
 
+    jobs = []
     for key, comment in new_dict.items():
-        if key in existing_dict and existing_dict[key] == comment:
-            new_png = util.ASSETS_FOLDER_EDITING + make_gacha_comment_path(key) + ".png"
-            org_png = util.ASSETS_FOLDER_EDITING + make_gacha_comment_path(key) + ".org.png"
-            if not filecmp.cmp(new_png, org_png):
-                continue
-        filtered_data[key] = comment
-    
-    # Generate the images.
-    comment_data_list = [(key, comment) for key, comment in filtered_data.items()]
+        jobs.append((os.path.join(util.ASSETS_FOLDER_EDITING, make_gacha_comment_path(key) + ".png"), "comment", comment, None))
+
+    render_keys = render_gacha_images(jobs)
 
-    with Pool() as pool:
-        list(tqdm(pool.imap_unordered(_generate_gacha_comment_image, comment_data_list, chunksize=16), total=len(comment_data_list), desc="Generating images"))
-    # for comment_data in comment_data_list:
-    #     _generate_gacha_comment_image(comment_data)
-    
     shutil.copy(new_path, existing_path)
 
-def _generate_gacha_comment_image(comment_data):
-    key, comment = comment_data
-    img = generate_gacha_comment_img(comment)
-    path = util.ASSETS_FOLDER_EDITING + make_gacha_comment_path(key) + ".png"
-    img.save(path)
+    return render_keys
+
+
+def _get_render_key(kind, text, rarity):
+    palettes = GACHA_NAME_COLORS[rarity - 1] if kind == "name" else GACHA_COMMENT_COLORS
+    key = json.dumps([GACHA_RENDER_VERSION, kind, text, rarity, palettes, util.get_font_hash()], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def _get_png_render_key(path):
+    try:
+        with Image.open(path) as img:
+            return img.text.get(GACHA_RENDER_KEY)
+    except (OSError, AttributeError):
+        return None
+
+def _get_render_cache_path(render_key):
+    return GACHA_RENDER_CACHE_FOLDER + render_key + ".png"
+
+def _render_gacha_image(job):
+    out_path, kind, text, rarity, render_key = job
+    if kind == "name":
+        img = generate_gacha_name_img(text, rarity)
+    else:
+        img = generate_gacha_comment_img(text)
+
+    png_info = PngInfo()
+    png_info.add_text(GACHA_RENDER_KEY, render_key)
+
+    cache_path = _get_render_cache_path(render_key)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    img.save(tmp_path, "PNG", pnginfo=png_info)
+    os.replace(tmp_path, cache_path)
+    shutil.copyfile(cache_path, out_path)
+
+def render_gacha_images(jobs):
+    # jobs: [(png_path, "name" or "comment", text, rarity), ...]
+    # Renders are cached by their content, so a text is only rendered once per font and renderer version.
+    os.makedirs(GACHA_RENDER_CACHE_FOLDER, exist_ok=True)
+
+    # Returns the render keys of all jobs, see prune_gacha_render_cache.
+    render_keys = set()
+    to_render = {}
+    cached = 0
+    unchanged = 0
+    for out_path, kind, text, rarity in jobs:
+        render_key = _get_render_key(kind, text, rarity)
+        render_keys.add(render_key)
+
+        if _get_png_render_key(out_path) == render_key:
+            unchanged += 1
+            continue
+
+        cache_path = _get_render_cache_path(render_key)
+        if os.path.exists(cache_path):
+            shutil.copyfile(cache_path, out_path)
+            cached += 1
+            continue
+
+        if render_key in to_render:
+            # Same image used more than once. Render it once, copy the rest.
+            to_render[render_key][1].append(out_path)
+            continue
+        to_render[render_key] = ((out_path, kind, text, rarity, render_key), [])
+
+    render_jobs = [job for job, _ in to_render.values()]
+    if render_jobs:
+        with util.UmaPool() as pool:
+            list(tqdm(pool.imap_unordered(_render_gacha_image, render_jobs, chunksize=4), total=len(render_jobs), desc="Generating images"))
+
+    for render_key, (_, copies) in to_render.items():
+        for out_path in copies:
+            shutil.copyfile(_get_render_cache_path(render_key), out_path)
+            cached += 1
+
+    print(f"Rendered {len(render_jobs)}, copied {cached} from cache, {unchanged} unchanged")
+
+    return render_keys
+
+def prune_gacha_render_cache(render_keys):
+    # Remove cached renders of texts that are no longer used.
+    if not os.path.exists(GACHA_RENDER_CACHE_FOLDER):
+        return
+
+    removed = 0
+    for file_name in os.listdir(GACHA_RENDER_CACHE_FOLDER):
+        # Also removes temp files left by an interrupted render.
+        render_key = file_name.split(".", 1)[0]
+        if render_key in render_keys and not file_name.endswith(".tmp"):
+            continue
+        os.remove(os.path.join(GACHA_RENDER_CACHE_FOLDER, file_name))
+        removed += 1
+
+    if removed:
+        print(f"Removed {removed} unused renders from the cache")
 
 def make_gacha_comment_path(id):
     id = str(id)
-    return f"\\gacha\\comment\\gacha_comment_{id}\\gacha_comment_{id}"
+    return os.path.join("gacha", "comment", f"gacha_comment_{id}", f"gacha_comment_{id}")
 
 def run():
-    generate_gacha_name_images()
-    generate_gacha_comment_images()
+    render_keys = generate_gacha_name_images()
+    render_keys |= generate_gacha_comment_images()
+    prune_gacha_render_cache(render_keys)
 
 def main():
     # generate_gacha_name_img("Special Week", 1)
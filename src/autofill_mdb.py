@@ -1,13 +1,11 @@
 import util
 import os
 import unicodedata
-import json
+from text_catalog import TextDataCatalog
 
-def autofill_birthdays():
-    json_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "157.json")
-
-    if not os.path.exists(json_path):
-        print(f"File {json_path} does not exist. Skipping.")
+def autofill_birthdays(catalog):
+    if not catalog.exists(157):
+        print(f"File {catalog.get_path(157)} does not exist. Skipping.")
         return
     
     months = {
@@ -25,9 +23,7 @@ def autofill_birthdays():
         "12": "December"
     }
 
-    json_data = util.load_json(json_path)
-
-    for entry in json_data:
+    for entry in catalog.entries(157):
         birthday_jp = entry["source"]
         month, day = birthday_jp.split("月")
         day = unicodedata.normalize('NFKC', day[:-1])
@@ -36,51 +32,18 @@ def autofill_birthdays():
             continue
 
         month = unicodedata.normalize('NFKC', month)
-        entry["text"] = f"{months[month]} {day}"
-    
-    util.save_json(json_path, json_data)
-
-INDEX_CACHE = {}
-def index_category(cat_id, no_cache=False):
-    global INDEX_CACHE
-
-    if not no_cache and cat_id in INDEX_CACHE:
-        return INDEX_CACHE[cat_id]
-
-    json_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", f"{cat_id}.json")
-    if not os.path.exists(json_path):
-        raise FileNotFoundError(f"File {json_path} does not exist.")
-    
-    index = {}
-
-    json_data = util.load_json(json_path)
-    for entry in json_data:
-        for key in json.loads(entry["keys"]):
-            if entry["text"]:
-                index[key[-1]] = entry["text"]
-    
-    if not no_cache:
-        INDEX_CACHE[cat_id] = index
-
-    return index
+        catalog.update(157, entry, text=f"{months[month]} {day}")
 
-def autofill_outfit_combos():
+def autofill_outfit_combos(catalog):
     print("Autofilling outfit combos (text_data/4.json)")
 
     # Index outfits and characters
-    outfit_index = index_category(5)
-    chara_name_index = index_category(170)
-
-    # Load outfit combos
-    json_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "4.json")
-    if not os.path.exists(json_path):
-        raise FileNotFoundError(f"File {json_path} does not exist.")
-    
-    json_data = util.load_json(json_path)
+    outfit_index = catalog.text_index(5)
+    chara_name_index = catalog.text_index(170)
 
     # Fill in outfit combos
-    for entry in json_data:
-        key = str(json.loads(entry["keys"])[0][-1])
+    for keys, entry in catalog.items(4):
+        key = str(keys[0][-1])
         outfit_id = int(key[-6:])
         chara_id = int(key[-6:-2])
 
@@ -91,25 +54,17 @@ def autofill_outfit_combos():
             print(f"Character {chara_id} not found in character index. Skipping.")
             continue
         
-        entry["text"] = f"{outfit_index[outfit_id]} {chara_name_index[chara_id]}"
-    
-    util.save_json(json_path, json_data)
+        catalog.update(4, entry, text=f"{outfit_index[outfit_id]} {chara_name_index[chara_id]}")
 
-def autofill_support_combos():
+def autofill_support_combos(catalog):
     print("Autofilling support combos (text_data/75.json)")
 
     # Index supports and characters
-    support_index = index_category(76)
-    chara_name_index = index_category(77)
-
-    json_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "75.json")
-    if not os.path.exists(json_path):
-        raise FileNotFoundError(f"File {json_path} does not exist.")
-    
-    json_data = util.load_json(json_path)
+    support_index = catalog.text_index(76)
+    chara_name_index = catalog.text_index(77)
 
-    for entry in json_data:
-        key = str(json.loads(entry["keys"])[0][-1])
+    for keys, entry in catalog.items(75):
+        key = str(keys[0][-1])
         
         support_name = support_index.get(int(key))
         if not support_name:
@@ -121,61 +76,43 @@ def autofill_support_combos():
             print(f"Character {key} not found in character index 77. Skipping.")
             continue
         
-        entry["text"] = f"{support_name} {chara_name}"
-
-    util.save_json(json_path, json_data)
+        catalog.update(75, entry, text=f"{support_name} {chara_name}")
 
 
 
-def autofill_pieces():
+def autofill_pieces(catalog):
     print("Autofilling pieces (text_data/113.json)")
 
-    chara_name_index = index_category(170)
-    
-    json_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "113.json")
-    if not os.path.exists(json_path):
-        raise FileNotFoundError(f"File {json_path} does not exist.")
-    
-    json_data = util.load_json(json_path)
+    chara_name_index = catalog.text_index(170)
 
-    for entry in json_data:
-        key = str(json.loads(entry["keys"])[0][-1])
+    for keys, entry in catalog.items(113):
+        key = str(keys[0][-1])
         chara_id = int(key[:4])
 
         if not chara_id in chara_name_index:
             print(f"Character {chara_id} not found in character index. Skipping.")
             continue
 
-        entry["text"] = f"{chara_name_index[chara_id]} Piece"
-    
-    util.save_json(json_path, json_data)
-
-def autofill_chara_secret_headers():
-    chara_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "6.json")
+        catalog.update(113, entry, text=f"{chara_name_index[chara_id]} Piece")
 
-    if not os.path.exists(chara_path):
-        print(f"File {chara_path} does not exist. Skipping.")
+def autofill_chara_secret_headers(catalog):
+    if not catalog.exists(6):
+        print(f"File {catalog.get_path(6)} does not exist. Skipping.")
         return
 
-    chara_name_data = util.load_json(chara_path)
-
     char_dict = {}
-    for entry in chara_name_data:
+    for entry in catalog.entries(6):
         jp = entry["source"]
         en = entry["text"]
         if not en:
             continue
         char_dict[jp] = en
     
-    json_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "68.json")
-
-    if not os.path.exists(json_path):
-        print(f"File {json_path} does not exist. Skipping.")
+    if not catalog.exists(68):
+        print(f"File {catalog.get_path(68)} does not exist. Skipping.")
         return
-    
-    json_data = util.load_json(json_path)
 
-    for entry in json_data:
+    for entry in catalog.entries(68):
         source = entry["source"]
 
         num = source[-1]
@@ -203,18 +140,13 @@ def autofill_chara_secret_headers():
         
         out += f"#{num}"
 
-        entry["text"] = out
-
-    util.save_json(json_path, json_data)
+        catalog.update(68, entry, text=out)
 
 
-def autofill_factor_descriptions():
+def autofill_factor_descriptions(catalog):
     # Prepare skill dict
     skill_name_dict = {}
-    path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "47.json")
-    data = util.load_json(path)
-    for entry in data:
-        keys = json.loads(entry["keys"])
+    for keys, entry in catalog.items(47):
         name = entry["text"]
         if not name:
             name = entry["source"]
@@ -247,11 +179,8 @@ def autofill_factor_descriptions():
     }
 
 
-    path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "172.json")
-    data = util.load_json(path)
-
-    for entry in data:
-        key = json.loads(entry["keys"])[0][-1]
+    for keys, entry in catalog.items(172):
+        key = keys[0][-1]
         factor_group_id = str(key)[:-2]
 
         # Fetch factor effects
@@ -319,22 +248,17 @@ def autofill_factor_descriptions():
         if getties_part:
             getties_part = getties_part[0].upper() + getties_part[1:]
         
-        entry["text"] = uppies_part + getties_part
-
-    util.save_json(path, data)
+        catalog.update(172, entry, text=uppies_part + getties_part)
 
-def autofill_chara_story_chapters():
+def autofill_chara_story_chapters(catalog):
     print("Autofilling chara story chapters (text_data/92.json)")
-    path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "92.json")
 
-    if not os.path.exists(path):
-        print(f"File {path} does not exist. Skipping.")
+    if not catalog.exists(92):
+        print(f"File {catalog.get_path(92)} does not exist. Skipping.")
         return
-    
-    data = util.load_json(path)
 
-    for entry in data:
-        key = json.loads(entry["keys"])[0][-1]
+    for keys, entry in catalog.items(92):
+        key = keys[0][-1]
         grp = '04'
         chara = str(key)[1:5]
         chpt = str(key)[5:]
@@ -353,23 +277,18 @@ def autofill_chara_story_chapters():
             # No translation or translation is the same as the original
             continue
 
-        entry['text'] = tl_title
-
-    util.save_json(path, data)
+        catalog.update(92, entry, text=tl_title)
 
 
-def autofill_support_effects():
+def autofill_support_effects(catalog):
     print("Autofilling support effects (text_data/78.json)")
-    path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "151.json")
 
-    if not os.path.exists(path):
-        print(f"File {path} does not exist. Skipping.")
+    if not catalog.exists(151):
+        print(f"File {catalog.get_path(151)} does not exist. Skipping.")
         return
-    
-    data = util.load_json(path)
 
     effect_dict = {}
-    for entry in data:
+    for entry in catalog.entries(151):
         if not entry.get('text'):
             continue
 
@@ -381,38 +300,37 @@ def autofill_support_effects():
     ]
 
     for id in fill_ids:
-        path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", f"{id}.json")
-
-        if not os.path.exists(path):
-            print(f"File {path} does not exist. Skipping.")
+        if not catalog.exists(id):
+            print(f"File {catalog.get_path(id)} does not exist. Skipping.")
             continue
 
-        data = util.load_json(path)
-
-        for entry in data:
+        for entry in catalog.entries(id):
             new_text = effect_dict.get(entry['source'])
             if not new_text:
                 continue
 
-            entry['text'] = new_text
+            catalog.update(id, entry, text=new_text)
+
 
-        util.save_json(path, data)
 
+def run(catalog=None):
+    catalog = catalog or TextDataCatalog()
 
+    autofill_birthdays(catalog)
+    autofill_outfit_combos(catalog)
+    autofill_support_combos(catalog)
+    autofill_pieces(catalog)
+    autofill_chara_secret_headers(catalog)
+    autofill_factor_descriptions(catalog)
+    autofill_chara_story_chapters(catalog)
+    autofill_support_effects(catalog)
 
-def run():
-    autofill_birthdays()
-    autofill_outfit_combos()
-    autofill_support_combos()
-    autofill_pieces()
-    autofill_chara_secret_headers()
-    autofill_factor_descriptions()
-    autofill_chara_story_chapters()
-    autofill_support_effects()
+    print(f"Autofill changed {catalog.save()} text_data files")
 
 def main():
-    autofill_support_effects()
-    pass
+    catalog = TextDataCatalog()
+    autofill_support_effects(catalog)
+    catalog.save()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,644 @@
+import os
+import sys
+import time
+import json
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import platform
+import statistics
+import tempfile
+import datetime
+import numpy as np
+from PIL import Image
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+import util
+import version
+import startup
+
+# Times the hot paths of the translation pipeline against generated fixtures, without a game install.
+# Every path the pipeline uses is pointed into the fixture folder, and results are written as JSON
+# so runs of different releases can be compared with --compare.
+
+# Imported after the arguments are parsed, settings parses sys.argv when it is loaded.
+_patch = startup.lazy_import("_patch")
+hachimi = startup.lazy_import("hachimi")
+index = startup.lazy_import("index")
+intermediate = startup.lazy_import("intermediate")
+postprocess = startup.lazy_import("postprocess")
+settings_module = startup.lazy_import("settings")
+
+# Set for pool workers, so they use the fixture paths too.
+FIXTURE_ROOT_ENV = "CAROTENE_BENCH_ROOT"
+
+RESULTS_VERSION = 1
+
+# A benchmark that got this much slower than in the compared run is a regression.
+REGRESSION_RATIO = 1.25
+
+# Fixture sizes at scale 1.0
+TEXT_DATA_CATEGORIES = (5, 6, 16, 47, 48, 66, 76, 144, 147, 189)
+TEXT_DATA_ROWS = 300
+OTHER_TABLE_ROWS = 200
+TRANSLATED_RATIO = 0.8
+META_ROWS = 5000
+STORY_FILES = 400
+STORY_BLOCKS = 30
+TEXTURE_FILES = 100
+FLASH_FILES = 50
+HASHED_ENTRIES = 3000
+TEXTURE_PAIRS = 4
+XOR_BLOBS = 8
+XOR_BLOB_SIZE = 1024 * 1024
+WRAP_TEXTS = 2000
+
+WORDS = (
+    "the", "a", "race", "horse", "girl", "trainer", "speed", "stamina", "power", "guts", "wisdom",
+    "turf", "dirt", "sprint", "mile", "medium", "long", "front", "pace", "late", "end", "closer",
+    "victory", "training", "summer", "camp", "debut", "classic", "senior", "derby", "oaks", "cup",
+    "stakes", "championship", "unbelievable", "determination", "friendship", "recreation",
+)
+
+
+def _make_text(rng, min_words=2, max_words=20):
+    return " ".join(rng.choice(WORDS, rng.integers(min_words, max_words + 1)))
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _scaled(count, scale):
+    return max(1, round(count * scale))
+
+
+def _get_fixture_paths(root):
+    editing = os.path.join(root, "editing", "")
+    translations = os.path.join(root, "translations", "")
+    game = os.path.join(root, "game", "")
+    return {
+        "APP_DIR": os.path.join(root, "app", ""),
+        "SETTINGS_PATH": os.path.join(root, "app", "patcher_settings.json"),
+        "PATCH_STATS_PATH": os.path.join(root, "app", "patch_stats.json"),
+        "GAME_DATA_PATH": game,
+        "MDB_PATH": os.path.join(game, "master", "master.mdb"),
+        "META_PATH": os.path.join(game, "meta"),
+        "META_STATUS_PATH": os.path.join(game, "meta.carotene.status"),
+        "META_UNDO_PATH": os.path.join(game, "meta.carotene.undo"),
+        "DATA_PATH": os.path.join(game, "dat"),
+        "TMP_FOLDER": os.path.join(root, "tmp", ""),
+        "TL_PREFIX": translations,
+        "INTERMEDIATE_PREFIX": editing,
+        "MDB_FOLDER": os.path.join(translations, "mdb", ""),
+        "MDB_FOLDER_EDITING": os.path.join(editing, "mdb", ""),
+        "FONT_PATH": os.path.join(editing, "mdb", "font", "dynamic01.otf"),
+        "ASSETS_FOLDER": os.path.join(translations, "assets", ""),
+        "ASSETS_FOLDER_EDITING": os.path.join(editing, "assets", ""),
+        "FLASH_FOLDER": os.path.join(translations, "flash", ""),
+        "FLASH_FOLDER_EDITING": os.path.join(editing, "flash", ""),
+        "ASSEMBLY_FOLDER": os.path.join(translations, "assembly", ""),
+        "ASSEMBLY_FOLDER_EDITING": os.path.join(editing, "assembly", ""),
+        "DIFF_FOLDER": os.path.join(translations, "diff", ""),
+    }
+
+def use_fixture_paths(root):
+    # Point util at the fixture folder. Also done in pool workers, see FIXTURE_ROOT_ENV.
+    for name, path in _get_fixture_paths(root).items():
+        setattr(util, name, path)
+
+    util.MDBConnection.DB_PATH = util.MDB_PATH
+    util.MetaConnection.DB_PATH = util.META_PATH
+    util.MetaBackupConnection.DB_PATH = util.META_PATH + util.META_BACKUP_SUFFIX
+    util.MetaUndoConnection.DB_PATH = util.META_UNDO_PATH
+
+if os.environ.get(FIXTURE_ROOT_ENV):
+    use_fixture_paths(os.environ[FIXTURE_ROOT_ENV])
+
+def _use_fixture_paths_in_modules(root):
+    # Paths that other modules copied from util when they were loaded.
+    # This also loads the lazy modules, so their import time isn't counted in the first benchmark.
+    for module in (_patch, hachimi, index, intermediate):
+        module.__name__
+
+    paths = _get_fixture_paths(root)
+    settings_module.Settings._path = paths["SETTINGS_PATH"]
+    postprocess.PP_CACHE_PATH = os.path.join(paths["APP_DIR"], "postprocess_cache.db")
+    postprocess.get_font.cache_clear()
+    postprocess.compile_pipeline.cache_clear()
+    util.get_font_hash.cache_clear()
+
+
+def _make_mdb(path, scale, rng):
+    # master.mdb with the tables in index.json. Returns {table: [row, ...]}.
+    tables = {
+        "text_data": [],
+        "character_system_text": [],
+        "race_jikkyo_comment": [],
+        "race_jikkyo_message": [],
+    }
+
+    for category in TEXT_DATA_CATEGORIES:
+        for i in range(_scaled(TEXT_DATA_ROWS, scale)):
+            tables["text_data"].append((category, i + 1, _make_text(rng)))
+
+    for i in range(_scaled(OTHER_TABLE_ROWS, scale)):
+        tables["character_system_text"].append((1001 + i % 50, i + 1, _make_text(rng)))
+        tables["race_jikkyo_comment"].append((i + 1, _make_text(rng)))
+        tables["race_jikkyo_message"].append((i + 1, _make_text(rng)))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE text_data (id INTEGER, category INTEGER, `index` INTEGER, text TEXT, PRIMARY KEY (category, `index`));")
+    conn.execute("CREATE TABLE character_system_text (character_id INTEGER, voice_id INTEGER, text TEXT, PRIMARY KEY (character_id, voice_id));")
+    conn.execute("CREATE TABLE race_jikkyo_comment (id INTEGER PRIMARY KEY, message TEXT);")
+    conn.execute("CREATE TABLE race_jikkyo_message (id INTEGER PRIMARY KEY, message TEXT);")
+    conn.executemany("INSERT INTO text_data VALUES (?, ?, ?, ?);", [(i, *row) for i, row in enumerate(tables["text_data"])])
+    conn.executemany("INSERT OR REPLACE INTO character_system_text VALUES (?, ?, ?);", tables["character_system_text"])
+    conn.executemany("INSERT INTO race_jikkyo_comment VALUES (?, ?);", tables["race_jikkyo_comment"])
+    conn.executemany("INSERT INTO race_jikkyo_message VALUES (?, ?);", tables["race_jikkyo_message"])
+    conn.commit()
+    conn.close()
+
+    return tables
+
+def _make_meta(path, scale, rng, font_hash):
+    # Meta db with the same 'a' table columns as the game's.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE a (i INTEGER PRIMARY KEY, n TEXT, d TEXT, g INTEGER, l INTEGER, c INTEGER, h TEXT, m TEXT, k INTEGER, s INTEGER, p INTEGER, e INTEGER);")
+
+    rows = [(1, "font/dynamic01.otf", "", 0, 0, 0, font_hash, "font", 0, 0, 0, 0)]
+    kinds = ("story", "home", "atlas", "bg", "movie", "sound")
+    for i in range(_scaled(META_ROWS, scale)):
+        kind = kinds[i % len(kinds)]
+        asset_hash = hashlib.sha1(f"asset{i}".encode("utf-8")).hexdigest().upper()[:32]
+        rows.append((i + 2, f"{kind}/data/{i // 100:02}/{i:06}", "", int(rng.integers(0, 2)), int(rng.integers(1000, 10_000_000)), 0, asset_hash, kind, 0, 0, 0, 0))
+
+    conn.executemany("INSERT INTO a VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", rows)
+    conn.commit()
+    conn.close()
+
+    return len(rows)
+
+def _make_font(path, rng):
+    # A font with glyph widths for printable ASCII, enough for the text measurements.
+    codepoints = list(range(32, 127))
+    glyph_order = [".notdef"] + [f"uni{codepoint:04X}" for codepoint in codepoints]
+
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_order)
+    builder.setupCharacterMap({codepoint: f"uni{codepoint:04X}" for codepoint in codepoints})
+    builder.setupGlyf({name: TTGlyphPen(None).glyph() for name in glyph_order})
+    builder.setupHorizontalMetrics({name: (int(rng.integers(250, 750)), 0) for name in glyph_order})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": "Carotene Bench", "styleName": "Regular"})
+    builder.setupOS2()
+    builder.setupPost()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    builder.save(path)
+
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest().upper()
+
+def _make_mdb_translations(folder, tables, rng):
+    # Translation files as made by mdb_from_intermediate, for part of the rows.
+    out = {}
+    for table, rows in tables.items():
+        for row in rows:
+            if rng.random() > TRANSLATED_RATIO:
+                continue
+            *keys, source = row
+            util.add_nested_dict(out, [table] + [str(key) for key in keys], {"text": _make_text(rng), "hash": _sha256(source)})
+
+    count = 0
+    for table, data in out.items():
+        if table in ("race_jikkyo_comment", "race_jikkyo_message"):
+            util.save_json(os.path.join(folder, table + ".json"), data)
+            count += 1
+            continue
+
+        for category, category_data in data.items():
+            util.save_json(os.path.join(folder, table, category + ".json"), category_data)
+            count += 1
+
+    return count
+
+def _make_story(rng, i, block_count):
+    file_name = f"story/data/{i // 100:02}/{i // 10:04}/storytimeline_{i:09}"
+    blocks = []
+    for j in range(block_count):
+        block = {
+            "text": _make_text(rng, 5, 40),
+            "source": _make_text(rng, 5, 40),
+            "name": _make_text(rng, 1, 2),
+            "source_name": _make_text(rng, 1, 2),
+            "path_id": int(rng.integers(1, 2**62)),
+            "clip_length": int(rng.integers(50, 500)),
+            "block_id": j + 1,
+        }
+        if rng.random() < 0.1:
+            block["choices"] = [{"text": _make_text(rng), "source": _make_text(rng)} for _ in range(2)]
+        blocks.append(block)
+
+    return file_name, {
+        "type": "story",
+        "version": version.VERSION,
+        "file_name": file_name,
+        "hash": hashlib.sha1(file_name.encode("utf-8")).hexdigest().upper()[:32],
+        "title": _make_text(rng, 2, 5),
+        "source_title": _make_text(rng, 2, 5),
+        "data": blocks,
+    }
+
+def _make_asset_jsons(scale, rng):
+    count = 0
+    for i in range(_scaled(STORY_FILES, scale)):
+        file_name, data = _make_story(rng, i, STORY_BLOCKS)
+        util.save_json(os.path.join(util.ASSETS_FOLDER, *file_name.split("/")) + ".json", data)
+        count += 1
+
+    for i in range(_scaled(TEXTURE_FILES, scale)):
+        file_name = f"atlas/bench/tex_bench_{i:04}"
+        data = {
+            "type": "texture",
+            "version": version.VERSION,
+            "file_name": file_name,
+            "hash": hashlib.sha1(file_name.encode("utf-8")).hexdigest().upper()[:32],
+            "data": [{"path_id": int(rng.integers(1, 2**62)), "diff": f"{file_name}.diff.png"}],
+        }
+        util.save_json(os.path.join(util.ASSETS_FOLDER, *file_name.split("/")) + ".json", data)
+        count += 1
+
+    for i in range(_scaled(FLASH_FILES, scale)):
+        file_name = f"uianimation/flash/bench/pf_fl_bench_{i:04}"
+        data = {
+            "type": "flash",
+            "version": version.VERSION,
+            "file_name": file_name,
+            "hash": hashlib.sha1(file_name.encode("utf-8")).hexdigest().upper()[:32],
+            "data": {
+                str(int(rng.integers(1, 2**62))): {
+                    str(j): {
+                        "txt_bench": {"source": {"_text": _make_text(rng)}, "tl": {"_text": _make_text(rng)}}
+                    } for j in range(4)
+                }
+            },
+        }
+        util.save_json(os.path.join(util.FLASH_FOLDER, *file_name.split("/")) + ".json", data)
+        count += 1
+
+    return count
+
+def _make_hashed(path, scale, rng):
+    entries = [{"source": _make_text(rng), "text": _make_text(rng)} for _ in range(_scaled(HASHED_ENTRIES, scale))]
+    util.save_json(path, entries)
+    return len(entries)
+
+def _make_texture_pair(folder, size, seed=0, name="bench_tex"):
+    # Original and edited texture, with edited text, erased pixels and real magenta pixels.
+    rng = np.random.default_rng(seed)
+
+    org = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+    org[..., 3] = 255
+    new = org.copy()
+
+    block = size // 8
+    new[block:block*3, block:block*6] = rng.integers(0, 256, (block*2, block*5, 4), dtype=np.uint8)
+    new[block*4:block*5, block:block*3, 3] = 0
+    new[block*6:block*7, block*2:block*4] = (255, 0, 255, 255)
+
+    os.makedirs(folder, exist_ok=True)
+    org_path = os.path.join(folder, f"{name}.org.png")
+    new_path = os.path.join(folder, f"{name}.png")
+    Image.fromarray(org, "RGBA").save(org_path)
+    Image.fromarray(new, "RGBA").save(new_path)
+
+    return org_path, new_path
+
+def _make_xor_blobs(folder, scale, rng):
+    # Source and edited blobs, the edited ones are a bit longer or shorter like re-encoded movies.
+    os.makedirs(folder, exist_ok=True)
+    pairs = []
+    for i in range(_scaled(XOR_BLOBS, scale)):
+        source = rng.bytes(XOR_BLOB_SIZE)
+        edited = rng.bytes(XOR_BLOB_SIZE + int(rng.integers(-XOR_BLOB_SIZE // 10, XOR_BLOB_SIZE // 10)))
+        source_path = os.path.join(folder, f"blob_{i:02}.org")
+        edited_path = os.path.join(folder, f"blob_{i:02}")
+        util.write_bytes(source, source_path)
+        util.write_bytes(edited, edited_path)
+        pairs.append((source_path, edited_path))
+    return pairs
+
+
+class Fixtures:
+    def __init__(self, root, scale=1.0, texture_size=1024, seed=0):
+        self.root = root
+        self.scale = scale
+        self.texture_size = texture_size
+        self.seed = seed
+        self.counts = {}
+        self.texture_pairs = []
+        self.xor_pairs = []
+        self.wrap_texts = []
+        self.tables = {}
+
+    def generate(self):
+        # Run with the fixture paths in use.
+        rng = np.random.default_rng(self.seed)
+
+        index_json = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.json")
+        shutil.copy(index_json, os.path.join(self.root, "src", "index.json"))
+
+        font_hash = _make_font(util.FONT_PATH, rng)
+        font_data_path = util.get_asset_path(font_hash)
+        os.makedirs(os.path.dirname(font_data_path), exist_ok=True)
+        shutil.copy(util.FONT_PATH, font_data_path)
+
+        self.tables = _make_mdb(util.MDB_PATH, self.scale, rng)
+        self.counts["mdb_rows"] = sum(len(rows) for rows in self.tables.values())
+        self.counts["meta_rows"] = _make_meta(util.META_PATH, self.scale, rng, font_hash)
+        self.counts["mdb_translation_files"] = _make_mdb_translations(util.MDB_FOLDER, self.tables, rng)
+        self.counts["asset_files"] = _make_asset_jsons(self.scale, rng)
+        self.counts["hashed_entries"] = _make_hashed(os.path.join(util.ASSEMBLY_FOLDER_EDITING, "hashed.json"), self.scale, rng)
+
+        for i in range(_scaled(TEXTURE_PAIRS, self.scale)):
+            self.texture_pairs.append(_make_texture_pair(os.path.join(self.root, "textures"), self.texture_size, seed=self.seed + i, name=f"tex_{i:02}"))
+        self.counts["texture_pairs"] = len(self.texture_pairs)
+
+        self.xor_pairs = _make_xor_blobs(os.path.join(self.root, "xor"), self.scale, rng)
+        self.counts["xor_blobs"] = len(self.xor_pairs)
+
+        self.wrap_texts = [_make_text(rng, 5, 60) for _ in range(_scaled(WRAP_TEXTS, self.scale))]
+        self.counts["wrap_texts"] = len(self.wrap_texts)
+
+
+# Benchmarks run in this order, later ones use the output of earlier ones.
+# Each returns the number of items it handled.
+
+def bench_index_mdb(fixtures):
+    index.index_mdb()
+    return fixtures.counts["mdb_rows"]
+
+def bench_mdb_to_intermediate(fixtures):
+    intermediate.mdb_to_intermediate()
+    return fixtures.counts["mdb_rows"]
+
+def bench_mdb_from_intermediate(fixtures):
+    intermediate.mdb_from_intermediate()
+    return len(util.get_tl_mdb_jsons())
+
+def bench_fix_mdb(fixtures):
+    postprocess.fix_mdb()
+    return len(util.get_tl_mdb_jsons())
+
+def bench_import_mdb(fixtures):
+    _patch.import_mdb()
+    return len(util.get_tl_mdb_jsons())
+
+def bench_convert_hashed(fixtures):
+    hachimi.convert_hashed()
+    return fixtures.counts["hashed_entries"]
+
+def bench_make_diff(fixtures):
+    size = 0
+    for source_path, edited_path in fixtures.xor_pairs:
+        diff = util.make_diff(util.read_bytes(edited_path), util.read_bytes(source_path))
+        util.write_bytes(diff, edited_path + ".diff")
+        size += len(diff)
+    return size
+
+def bench_apply_diff(fixtures):
+    size = 0
+    for source_path, edited_path in fixtures.xor_pairs:
+        patched = util.apply_diff(util.read_bytes(source_path), util.read_bytes(edited_path + ".diff"))
+        size += len(patched)
+    return size
+
+def bench_make_png_diff(fixtures):
+    for _, new_path in fixtures.texture_pairs:
+        out_path = os.path.join(util.DIFF_FOLDER, os.path.basename(new_path).replace(".png", ".diff.png"))
+        if os.path.exists(out_path):
+            # Time making the diff, not skipping it.
+            os.remove(out_path)
+        hachimi.make_png_diff(new_path, out_path, "bench/" + os.path.basename(new_path)[:-4])
+    return fixtures.counts["texture_pairs"] * fixtures.texture_size ** 2
+
+def bench_text_width(fixtures):
+    font = postprocess.get_font()
+    for text in fixtures.wrap_texts:
+        util.get_text_width(text, font)
+    return len(fixtures.wrap_texts)
+
+def bench_wrap_text(fixtures):
+    font = postprocess.get_font()
+    for text in fixtures.wrap_texts:
+        util.wrap_text_to_width(text, 18630, font)
+    return len(fixtures.wrap_texts)
+
+def bench_get_assets_type_dict(fixtures):
+    asset_dict = util.get_assets_type_dict()
+    return sum(len(assets) for assets in asset_dict.values())
+
+BENCHMARKS = {
+    "index_mdb": bench_index_mdb,
+    "mdb_to_intermediate": bench_mdb_to_intermediate,
+    "mdb_from_intermediate": bench_mdb_from_intermediate,
+    "fix_mdb": bench_fix_mdb,
+    "import_mdb": bench_import_mdb,
+    "convert_hashed": bench_convert_hashed,
+    "make_diff": bench_make_diff,
+    "apply_diff": bench_apply_diff,
+    "make_png_diff": bench_make_png_diff,
+    "text_width": bench_text_width,
+    "wrap_text": bench_wrap_text,
+    "get_assets_type_dict": bench_get_assets_type_dict,
+}
+
+
+def _reference_png_diff(org_path, new_path):
+    # The original per-pixel implementation, used to check the output.
+    old_img = Image.open(org_path).convert("RGBA")
+    new_img = Image.open(new_path).convert("RGBA")
+
+    old_pixels = old_img.load()
+    new_pixels = new_img.load()
+
+    out_img = Image.new("RGBA", (old_img.width, old_img.height), None)
+    out_pixels = out_img.load()
+    for x in range(old_img.width):
+        for y in range(old_img.height):
+            old_pixel = old_pixels[x,y]
+            new_pixel = new_pixels[x,y]
+            if old_pixel != new_pixel:
+                if new_pixel[3] == 0 and old_pixel[3] != 0:
+                    new_pixel = (255, 0, 255, 255)
+                elif new_pixel == (255, 0, 255, 255):
+                    new_pixel = (255, 0, 255, 254)
+                out_pixels[x,y] = new_pixel
+    return out_img
+
+def check_png_diff(fixtures):
+    # Compare make_png_diff against the per-pixel implementation, for the first texture.
+    org_path, new_path = fixtures.texture_pairs[0]
+    out_path = os.path.join(util.DIFF_FOLDER, os.path.basename(new_path).replace(".png", ".diff.png"))
+    hachimi.make_png_diff(new_path, out_path, "bench/check")
+
+    start = time.perf_counter()
+    ref_img = _reference_png_diff(org_path, new_path)
+    ref_time = time.perf_counter() - start
+
+    with Image.open(out_path) as out_img:
+        identical = np.array_equal(np.asarray(out_img.convert("RGBA")), np.asarray(ref_img))
+
+    print(f"Reference loop {fixtures.texture_size}x{fixtures.texture_size}: {ref_time:.3f}s, pixel-identical: {identical}")
+    return identical
+
+
+def run_benchmark(name, fixtures, repeat):
+    seconds = []
+    items = None
+    error = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            items = BENCHMARKS[name](fixtures)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"{name} failed: {error}")
+            break
+        seconds.append(time.perf_counter() - start)
+
+    return {
+        "name": name,
+        "seconds": seconds,
+        "best": min(seconds) if seconds else None,
+        "median": statistics.median(seconds) if seconds else None,
+        "items": items,
+        "error": error,
+    }
+
+
+def format_results(results, previous=None):
+    previous = {result["name"]: result for result in (previous or {}).get("results", [])}
+
+    lines = [f"{'benchmark':<24}{'best':>10}{'median':>10}{'items':>12}{'change':>10}"]
+    for result in results["results"]:
+        if result["error"]:
+            lines.append(f"{result['name']:<24}{'failed':>10}  {result['error']}")
+            continue
+
+        change = ""
+        old = previous.get(result["name"])
+        if old and old.get("best"):
+            change = f"{result['best'] / old['best']:.2f}x"
+
+        lines.append(f"{result['name']:<24}{result['best']:>9.3f}s{result['median']:>9.3f}s{result['items'] or 0:>12}{change:>10}")
+
+    return "\n".join(lines)
+
+def get_regressions(results, previous):
+    previous = {result["name"]: result for result in previous.get("results", [])}
+    regressions = []
+    for result in results["results"]:
+        old = previous.get(result["name"])
+        if not result["best"] or not old or not old.get("best"):
+            continue
+        if result["best"] / old["best"] > REGRESSION_RATIO:
+            regressions.append(result["name"])
+    return regressions
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Benchmark the translation pipeline against generated fixtures.")
+    p.add_argument('-s', '--scale', type=float, default=1.0, help="Fixture size, relative to the defaults")
+    p.add_argument('-t', '--texture-size', type=int, default=1024, help="Width and height of the test textures")
+    p.add_argument('-r', '--repeat', type=int, default=1, help="Runs per benchmark, the best and median are reported")
+    p.add_argument('-o', '--out', help="Write the results to this JSON file")
+    p.add_argument('-c', '--compare', help="Results JSON of an earlier run to compare against. Exits with 1 on regressions")
+    p.add_argument('--only', nargs='+', choices=BENCHMARKS.keys(), help="Only run these benchmarks")
+    p.add_argument('--keep', help="Generate the fixtures in this folder and keep them")
+    p.add_argument('--check', action='store_true', help="Check make_png_diff against the per-pixel reference")
+    p.add_argument('--seed', type=int, default=0)
+    return p.parse_args()
+
+
+def main():
+    args = _parse_args()
+    # Keep our arguments away from the settings parser.
+    sys.argv = sys.argv[:1]
+
+    if args.keep:
+        root = os.path.abspath(args.keep)
+        if os.path.exists(root):
+            shutil.rmtree(root)
+    else:
+        root = tempfile.mkdtemp(prefix="carotene_bench_")
+    os.makedirs(os.path.join(root, "src"), exist_ok=True)
+
+    os.environ[FIXTURE_ROOT_ENV] = root
+    use_fixture_paths(root)
+    _use_fixture_paths_in_modules(root)
+
+    # index_mdb and mdb_to_intermediate use paths relative to the repo root.
+    cwd = os.getcwd()
+    os.chdir(root)
+
+    try:
+        fixtures = Fixtures(root, args.scale, args.texture_size, args.seed)
+        start = time.perf_counter()
+        fixtures.generate()
+        print(f"Generated fixtures in {time.perf_counter() - start:.2f}s: {fixtures.counts}")
+
+        names = [name for name in BENCHMARKS if not args.only or name in args.only]
+        results = {
+            "results_version": RESULTS_VERSION,
+            "carotene_version": util.version_to_string(version.VERSION),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": args.scale,
+            "texture_size": args.texture_size,
+            "repeat": args.repeat,
+            "fixtures": fixtures.counts,
+            "results": [run_benchmark(name, fixtures, args.repeat) for name in names],
+        }
+
+        if args.check:
+            results["png_diff_identical"] = check_png_diff(fixtures)
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    previous = None
+    if args.compare:
+        previous = util.load_json(args.compare)
+
+    print(format_results(results, previous))
+
+    if args.out:
+        util.save_json(args.out, results)
+
+    failed = [result["name"] for result in results["results"] if result["error"]]
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        return 1
+
+    if previous and previous.get("fixtures") != results["fixtures"]:
+        print("The compared run used different fixtures, its times can't be compared.")
+    elif previous:
+        regressions = get_regressions(results, previous)
+        if regressions:
+            print(f"Slower than {REGRESSION_RATIO}x the compared run: {', '.join(regressions)}")
+            return 1
+
+    if args.check and not results["png_diff_identical"]:
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import startup
+
+# Where the patcher finds the game and keeps its files, and which platform features it can use.
+# Folders can be set with CAROTENE_<NAME> environment variables, or <name> keys in config.json,
+# so the build steps also run without the game, without Windows and without a display.
+#
+# Names: app_dir, game_data_dir, game_folder, dmm_config, temp_dir, translations_dir, editing_dir,
+# tmp_dir, hachimi_export_dir, headless
+
+ENV_PREFIX = "CAROTENE_"
+
+# CAROTENE_CONFIG can point to another config file, e.g. one per build machine.
+CONFIG_PATH = os.environ.get(ENV_PREFIX + "CONFIG") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+IS_WINDOWS = sys.platform == "win32"
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def _load_config():
+    if not os.path.exists(CONFIG_PATH):
+        return {}
+
+    with open(CONFIG_PATH, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+_config = _load_config()
+
+
+def get_value(name, default=None):
+    # Environment variable first, then config.json. Empty values count as not set.
+    value = os.environ.get(ENV_PREFIX + name.upper())
+    if value:
+        return value
+
+    value = _config.get(name)
+    if value not in (None, ""):
+        return value
+
+    return default
+
+def get_path(name, default=None):
+    path = get_value(name)
+    if not path:
+        return default
+    return os.path.abspath(os.path.expandvars(os.path.expanduser(path)))
+
+def get_flag(name):
+    value = get_value(name, False)
+    if isinstance(value, str):
+        return value.lower() in TRUE_VALUES
+    return bool(value)
+
+
+def get_appdata_folder():
+    # %AppData% on Windows, the XDG data folder elsewhere.
+    if os.environ.get("APPDATA"):
+        return os.environ["APPDATA"]
+    return os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+
+def get_default_game_data_folder():
+    # Same layout under the home folder on other platforms, e.g. inside a Wine prefix's user folder.
+    return os.path.join(os.path.expanduser("~"), "AppData", "LocalLow", "Cygames", "umamusume")
+
+
+def optional_import(name):
+    # The module, loaded on first use. None if it isn't installed.
+    try:
+        return startup.lazy_import(name)
+    except ModuleNotFoundError:
+        return None
+
+# Only available on Windows, needed to find the game's window.
+try:
+    import win32gui
+    import win32process
+    import win32api
+    import win32con
+    HAS_WIN32 = True
+except ImportError:
+    win32gui = win32process = win32api = win32con = None
+    HAS_WIN32 = False
+
+QtWidgets = optional_import("PyQt5.QtWidgets")
+QtGui = optional_import("PyQt5.QtGui")
+
+
+def is_headless():
+    # Messages are printed instead of shown in dialogs.
+    if get_flag("headless") or not QtWidgets:
+        return True
+
+    if IS_WINDOWS or sys.platform == "darwin":
+        return False
+
+    return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY") or os.environ.get("QT_QPA_PLATFORM"))
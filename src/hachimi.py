@@ -1,18 +1,30 @@
 import util
 import os
+import environment
 import re
 import shutil
 import glob
 import unity
 from UnityPy.enums import ClassIDType
 import fnv
+import markup
+import hachimi_api
+import requests
 from PIL import Image
-from tqdm import tqdm
-from multiprocessing import Pool
+from PIL.PngImagePlugin import PngInfo
+import numpy as np
+import hashlib
 import json
+from functools import cache
 
-HACHIMI_ROOT = "tl-en\\localized_data\\"
-HACHIMI_LIVE_ROOT = os.path.join(util.get_game_folder(), "hachimi", "localized_data")
+HACHIMI_ROOT = os.path.join(environment.get_path("hachimi_export_dir", os.path.join("tl-en", "localized_data")), "")
+
+@cache
+def get_live_root():
+    # Looking up the game folder is slow, so it's only done when needed.
+    return os.path.join(util.get_game_folder(), "hachimi", "localized_data")
+
+SYNC_CACHE_PATH = util.APP_DIR + "hachimi_sync_cache.json"
 
 DIFF_SKIP = (
     "gacha/",
@@ -20,46 +32,12 @@ DIFF_SKIP = (
 )
 
 def convert_tags(text: str) -> str:
-    if "<p=" in text:
-        return ""
-    text =  text.replace("<nb>", "$(nb)")\
-                .replace("<force>", "")\
-                .replace("<ho>", "$(ho 1)")\
-                .replace("<vo>", "$(vo 1)")\
-                .replace("<nho>", "$(ho 0)")\
-                .replace("<nvo>", "$(vo 0)")\
-                .replace("<rbr>", "")\
-                .replace("<br>", "")\
-                .replace("<fit>", "")\
-                .replace("<mon>10", "$(month 10)")\
-                .replace("<mon>11", "$(month 11)")\
-                .replace("<mon>12", "$(month 12)")\
-                .replace("<mon>1", "$(month 1)")\
-                .replace("<mon>2", "$(month 2)")\
-                .replace("<mon>3", "$(month 3)")\
-                .replace("<mon>4", "$(month 4)")\
-                .replace("<mon>5", "$(month 5)")\
-                .replace("<mon>6", "$(month 6)")\
-                .replace("<mon>7", "$(month 7)")\
-                .replace("<mon>8", "$(month 8)")\
-                .replace("<mon>9", "$(month 9)")\
-                .replace("<mon>{0}", "$(month {0})")\
-                .replace("<mon>{1}", "$(month {1})")\
-                .replace("{0}<ord={0}>", "$(ordinal {0})")\
-                .replace("{1}<ord={1}>", "$(ordinal {1})")
-
-    regex = re.compile(r"<sc=(\d+)>")
-    text = regex.sub(r"$(scale \1)", text)
-
-    regex = re.compile(r"<a(\d+)>")
-    text = regex.sub(r"$(anchor \1)", text)
-
-    return text
+    return markup.to_hachimi(text)
 
 
 def convert_jpdict():
     print("JPDict")
-    jpdict_path = util.ASSEMBLY_FOLDER + "jpdict.json"
+    jpdict_path = os.path.join(util.ASSEMBLY_FOLDER, "JPDict.json")
     jpdict = util.load_json(jpdict_path)
     in_dict = {}
     for key, entry in jpdict.items():
@@ -78,7 +56,7 @@ def convert_jpdict():
     dict_keys.sort(key=lambda x: x.lower())
     out_dict = {key: out_dict[key] for key in dict_keys}
 
-    util.save_json(out_path, out_dict)
+    return util.save_json_if_changed(out_path, out_dict)
 
 
 def backport_jdict():
@@ -138,15 +116,24 @@ def convert_hashed():
     dict_keys = [int(key) for key in out_dict.keys()]
     dict_keys.sort()
     out_dict = {str(key): out_dict[str(key)] for key in dict_keys}
-    
 
-    util.save_json(out_path, out_dict)
+    return util.save_json_if_changed(out_path, out_dict)
+
+
+def _print_counts(desc: str, results: list):
+    written = results.count(True)
+    unchanged = results.count(False)
+    print(f"{desc}: {written} written, {unchanged} unchanged")
+    return written, unchanged
 
 
 def convert_assembly():
     print("==Assembly==")
-    convert_jpdict()
-    convert_hashed()
+    results = [
+        convert_jpdict(),
+        convert_hashed(),
+    ]
+    return _print_counts("Assembly", results)
 
 
 def convert_mdb_nested(json_folder: str, out_path: str):
@@ -181,7 +168,7 @@ def convert_mdb_nested(json_folder: str, out_path: str):
     dict_keys.sort()
     out_dict = {str(key): out_dict[str(key)] for key in dict_keys}
     
-    util.save_json(out_path, out_dict)
+    return util.save_json_if_changed(out_path, out_dict)
 
 
 def convert_mdb_single(json_path: str, out_path: str):
@@ -190,7 +177,7 @@ def convert_mdb_single(json_path: str, out_path: str):
 
     if not os.path.exists(data_path):
         print(f"File {data_path} does not exist")
-        return
+        return None
 
     data = util.load_json(data_path)
 
@@ -210,32 +197,55 @@ def convert_mdb_single(json_path: str, out_path: str):
     dict_keys.sort()
     out_dict = {str(key): out_dict[str(key)] for key in dict_keys}
 
-    util.save_json(out_path, out_dict)
+    return util.save_json_if_changed(out_path, out_dict)
 
 
 def convert_text_data():
     print("text_data")
-    convert_mdb_nested(os.path.join(util.MDB_FOLDER, "text_data"), os.path.join(HACHIMI_ROOT, "text_data_dict.json"))
+    return convert_mdb_nested(os.path.join(util.MDB_FOLDER, "text_data"), os.path.join(HACHIMI_ROOT, "text_data_dict.json"))
 
 
 def convert_character_system_text():
     print("character_system_text")
-    convert_mdb_nested(os.path.join(util.MDB_FOLDER, "character_system_text"), os.path.join(HACHIMI_ROOT, "character_system_text_dict.json"))
+    return convert_mdb_nested(os.path.join(util.MDB_FOLDER, "character_system_text"), os.path.join(HACHIMI_ROOT, "character_system_text_dict.json"))
 
 
 def convert_race_jikkyo():
     print("jikkyo")
     
     # TODO: Remove wrap because it should be handled by Hachimi.
-    convert_mdb_single(os.path.join(util.MDB_FOLDER, "race_jikkyo_message.json"), os.path.join(HACHIMI_ROOT, "race_jikkyo_message_dict.json"))
-    convert_mdb_single(os.path.join(util.MDB_FOLDER, "race_jikkyo_comment.json"), os.path.join(HACHIMI_ROOT, "race_jikkyo_comment_dict.json"))
+    return [
+        convert_mdb_single(os.path.join(util.MDB_FOLDER, "race_jikkyo_message.json"), os.path.join(HACHIMI_ROOT, "race_jikkyo_message_dict.json")),
+        convert_mdb_single(os.path.join(util.MDB_FOLDER, "race_jikkyo_comment.json"), os.path.join(HACHIMI_ROOT, "race_jikkyo_comment_dict.json")),
+    ]
 
 
 def convert_mdb():
     print("==MDB==")
-    convert_text_data()
-    convert_character_system_text()
-    convert_race_jikkyo()
+    results = [
+        convert_text_data(),
+        convert_character_system_text(),
+    ]
+    results += convert_race_jikkyo()
+    return _print_counts("MDB", results)
+
+# Bump when the diff output changes, so existing diffs get regenerated.
+PNG_DIFF_VERSION = b"1"
+PNG_DIFF_HASH_KEY = "carotene_src_hash"
+
+def _hash_png_diff_inputs(source_path: str, new_path: str) -> str:
+    h = hashlib.sha256(PNG_DIFF_VERSION)
+    for path in (source_path, new_path):
+        with open(path, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+def _get_png_diff_hash(out_path: str):
+    try:
+        with Image.open(out_path) as img:
+            return img.text.get(PNG_DIFF_HASH_KEY)
+    except (OSError, AttributeError):
+        return None
 
 def make_png_diff(new_path: str, out_path: str, file_name: str) -> bool:
     source_path = new_path.replace(".png", ".org.png")
@@ -250,19 +260,14 @@ def make_png_diff(new_path: str, out_path: str, file_name: str) -> bool:
     if file_name.startswith(DIFF_SKIP):
         if os.path.exists(out_path):
             os.remove(out_path)
-        shutil.copy(new_path, out_path.replace(".diff.png", ".png"))
-        return True
+        return util.copy_if_changed(new_path, out_path.replace(".diff.png", ".png"))
     
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
 
-    # Crude way to skip unchanged files
-    if os.path.exists(out_path):
-        diff_time = os.path.getmtime(out_path)
-        new_time = os.path.getmtime(new_path)
-
-        # If the new file was not modified after the diff file was generated, skip
-        if diff_time > new_time:
-            return False
+    # Skip if the diff was made from the exact same images.
+    src_hash = _hash_png_diff_inputs(source_path, new_path)
+    if os.path.exists(out_path) and _get_png_diff_hash(out_path) == src_hash:
+        return False
 
     old_img = Image.open(source_path).convert("RGBA")
     new_img = Image.open(new_path).convert("RGBA")
@@ -271,92 +276,101 @@ def make_png_diff(new_path: str, out_path: str, file_name: str) -> bool:
     if width != new_img.width or height != new_img.height:
         print("[Error] Image size mismatch")
 
-    old_pixels = old_img.load()
-    new_pixels = new_img.load()
+    old_pixels = np.asarray(old_img)
+    new_pixels = np.asarray(new_img)[:height, :width]
 
-    out_img = Image.new("RGBA", (width, height), None)
-    out_pixels = out_img.load()
-    for x in range(width):
-        for y in range(height):
-            old_pixel = old_pixels[x,y]
-            new_pixel = new_pixels[x,y]
-            if old_pixel != new_pixel:
-                if new_pixel[3] == 0 and old_pixel[3] != 0:
-                    new_pixel = (255, 0, 255, 255)
-                elif new_pixel == (255, 0, 255, 255):
-                    new_pixel = (255, 0, 255, 254)
-                out_pixels[x,y] = new_pixel
+    # Pixels outside of the new image are left empty.
+    out_pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    h, w = new_pixels.shape[:2]
+    old_pixels = old_pixels[:h, :w]
 
-    out_img.save(out_path, "PNG", compress_level=9)
+    changed = np.any(old_pixels != new_pixels, axis=2)
+    out_view = out_pixels[:h, :w]
+    out_view[changed] = new_pixels[changed]
 
-    return True
+    # Pixels that became transparent are marked with magenta.
+    # Real magenta pixels get an alpha of 254 so they aren't mistaken for the marker.
+    made_transparent = changed & (new_pixels[..., 3] == 0) & (old_pixels[..., 3] != 0)
+    is_magenta = changed & np.all(new_pixels == (255, 0, 255, 255), axis=2)
+    out_view[made_transparent] = (255, 0, 255, 255)
+    out_view[is_magenta] = (255, 0, 255, 254)
 
+    png_info = PngInfo()
+    png_info.add_text(PNG_DIFF_HASH_KEY, src_hash)
 
-def convert_flash(flash_metadata: list):
-    print("Flash")
+    out_img = Image.fromarray(out_pixels, "RGBA")
+    out_img.save(out_path, "PNG", compress_level=9, pnginfo=png_info)
 
-    for meta in flash_metadata:
-        meta = meta[0]
+    return True
 
-        bundle_path = util.get_asset_path(meta['hash'])
-        if not os.path.exists(bundle_path): 
-            print(f"Assetbundle {bundle_path} does not exist")
-            continue
 
-        asset, root = unity.load_assetbundle(bundle_path, meta['hash'])
+def _convert_flash(meta):
+    meta = meta[0]
 
-        motion_parameter_list = []
+    bundle_path = util.get_asset_path(meta['hash'])
+    if not os.path.exists(bundle_path): 
+        print(f"Assetbundle {bundle_path} does not exist")
+        return None
 
-        for obj in asset.objects:
-            tree = obj.read_typetree()
-            if not tree.get("_motionParameterGroup"):
-                continue
-            
-            motion_parameter_list = tree['_motionParameterGroup'].get('_motionParameterList')
-            break
-        
-        if not motion_parameter_list:
-            print(f"No motion parameter list found in {meta['file_name']}")
-            continue
+    asset, root = unity.load_assetbundle(bundle_path, meta['hash'])
+
+    motion_parameter_list = []
 
-        out_params = {}
-
-        for params_dict in meta['data'].values():
-            for param_id, param_data in params_dict.items():
-                param_idx = [param_dict['_id'] for param_dict in motion_parameter_list].index(param_id)
-                for txt_param_name, txt_param_data in param_data.items():
-                    txt_param_idx = [param_dict['_objectName'] for param_dict in motion_parameter_list[param_idx]['_textParamList']].index(txt_param_name)
-
-                    entry = {}
-                    if '_text' in txt_param_data:
-                        entry['text'] = txt_param_data['_text']
-                    if '_positionOffset' in txt_param_data:
-                        entry['position_offset'] = txt_param_data['_positionOffset']
-                    if '_scale' in txt_param_data:
-                        entry['scale'] = txt_param_data['_scale']
-
-                    if not param_idx in out_params:
-                        out_params[param_idx] = {"text_param_list": {}}
-                    
-                    if not txt_param_idx in out_params[param_idx]["text_param_list"]:
-                        out_params[param_idx]["text_param_list"][txt_param_idx] = {}
-                    
-                    out_params[param_idx]["text_param_list"][txt_param_idx] = entry
+    for obj in asset.objects:
+        tree = obj.read_typetree()
+        if not tree.get("_motionParameterGroup"):
+            continue
         
-        out_params = {
-            "windows": {"bundle_name": meta['hash']},
-            "data": {"motion_parameter_list": out_params}
-            }
+        motion_parameter_list = tree['_motionParameterGroup'].get('_motionParameterList')
+        break
+    
+    if not motion_parameter_list:
+        print(f"No motion parameter list found in {meta['file_name']}")
+        return None
+
+    out_params = {}
+
+    for params_dict in meta['data'].values():
+        for param_id, param_data in params_dict.items():
+            param_idx = [param_dict['_id'] for param_dict in motion_parameter_list].index(param_id)
+            for txt_param_name, txt_param_data in param_data.items():
+                txt_param_idx = [param_dict['_objectName'] for param_dict in motion_parameter_list[param_idx]['_textParamList']].index(txt_param_name)
+
+                entry = {}
+                if '_text' in txt_param_data:
+                    entry['text'] = txt_param_data['_text']
+                if '_positionOffset' in txt_param_data:
+                    entry['position_offset'] = txt_param_data['_positionOffset']
+                if '_scale' in txt_param_data:
+                    entry['scale'] = txt_param_data['_scale']
+
+                if not param_idx in out_params:
+                    out_params[param_idx] = {"text_param_list": {}}
+                
+                if not txt_param_idx in out_params[param_idx]["text_param_list"]:
+                    out_params[param_idx]["text_param_list"][txt_param_idx] = {}
+                
+                out_params[param_idx]["text_param_list"][txt_param_idx] = entry
+    
+    out_params = {
+        "windows": {"bundle_name": meta['hash']},
+        "data": {"motion_parameter_list": out_params}
+        }
 
-        out_path = os.path.join(HACHIMI_ROOT, "assets", meta['file_name'] + ".json")
-        out_json = {}
+    out_path = os.path.join(HACHIMI_ROOT, "assets", meta['file_name'] + ".json")
+    out_json = {}
 
-        if os.path.exists(out_path):
-            out_json = util.load_json(out_path)
-        
-        out_json.update(out_params)
+    if os.path.exists(out_path):
+        out_json = util.load_json(out_path)
+    
+    out_json.update(out_params)
 
-        util.save_json(out_path, out_json)
+    return util.save_json_if_changed(out_path, out_json)
+
+
+def convert_flash(flash_metadata: list, pool=None):
+    print("Flash")
+    return _run_converter(_convert_flash, flash_metadata, "Flash", pool, chunksize=4)
 
 
 def get_atlas_bundle_hash(file_name: str) -> str:
@@ -374,11 +388,12 @@ def convert_texture_atlas(meta: dict):
         # There should not be more, otherwise things will break in Hachimi.
         print(f"More than 1 texture in {meta['file_name']}!!")
     
+    replaced = None
     for texture in meta['textures']:
         png_path = os.path.join(folder, texture['name'] + ".png")
         if not os.path.exists(png_path):
             print(f"File {png_path} does not exist")
-            return
+            return None
 
         # There should only be 1 texture here! If there are more, it will be overwritten!
         atlas_name = meta['file_name'].split("/")[1]
@@ -389,7 +404,7 @@ def convert_texture_atlas(meta: dict):
 
         replaced = make_png_diff(png_path, out_file, meta['file_name'])
         if not replaced:
-            return
+            return False
         # shutil.copy(png_path, out_file)
 
         out_json_path = out_file[:-9] + ".json"
@@ -402,7 +417,9 @@ def convert_texture_atlas(meta: dict):
             out_json = util.load_json(out_json_path)
 
         out_json.update(new_json)
-        util.save_json(out_json_path, out_json)
+        util.save_json_if_changed(out_json_path, out_json)
+
+    return replaced
 
 
 def convert_texture_flash(meta: dict):
@@ -411,7 +428,7 @@ def convert_texture_flash(meta: dict):
     bundle_path = util.get_asset_path(meta['hash'])
     if not os.path.exists(bundle_path):
         print(f"Assetbundle {bundle_path} does not exist")
-        return
+        return None
 
     asset, root = unity.load_assetbundle(bundle_path, meta['hash'])
 
@@ -429,9 +446,9 @@ def convert_texture_flash(meta: dict):
             meshparam_group_list += tree['_meshParameterGroupList']
     
     if not meshparam_group_list:
-        convert_texture_texture2d(meta)
-        return
+        return convert_texture_texture2d(meta)
 
+    replaced = None
     for meshparam_group in meshparam_group_list:
         path_id = meshparam_group.get("_textureSetColor", {}).get("m_PathID")
         if not path_id or path_id not in textures:
@@ -453,9 +470,11 @@ def convert_texture_flash(meta: dict):
         out_folder = os.path.dirname(out_path)
         os.makedirs(out_folder, exist_ok=True)
 
-        make_png_diff(texture_path, out_path, meta['file_name'])
+        replaced = make_png_diff(texture_path, out_path, meta['file_name']) or bool(replaced)
         # shutil.copy(texture_path, out_path)
 
+    return replaced
+
 
 def convert_texture_texture2d(meta: dict):
     folder = os.path.join(util.ASSETS_FOLDER_EDITING, meta['file_name'])
@@ -464,6 +483,7 @@ def convert_texture_texture2d(meta: dict):
         # There should not be more, otherwise things will break in Hachimi.
         print(f"More than 1 texture in {meta['file_name']}!!")
 
+    replaced = None
     for texture in meta['textures']:
         png_path = os.path.join(folder, texture['name'] + ".png")
         if not os.path.exists(png_path):
@@ -475,114 +495,242 @@ def convert_texture_texture2d(meta: dict):
         out_folder = os.path.dirname(out_file)
         os.makedirs(out_folder, exist_ok=True)
 
-        make_png_diff(png_path, out_file, meta['file_name'])
+        replaced = make_png_diff(png_path, out_file, meta['file_name']) or bool(replaced)
         # shutil.copy(png_path, out_file)
 
+    return replaced
+
 def _convert_texture(meta):
     meta = meta[0]
 
     folder = os.path.join(util.ASSETS_FOLDER_EDITING, meta['file_name'])
     if not os.path.exists(folder):
         print(f"Folder {folder} does not exist")
-        return
+        return None
 
     if meta['file_name'].startswith("atlas/"):
         # Atlas
-        convert_texture_atlas(meta)
+        return convert_texture_atlas(meta)
 
     elif meta['file_name'].startswith(("uianimation/flash/", "sourceresources/flash/")):
         # Flash
-        convert_texture_flash(meta)
+        return convert_texture_flash(meta)
     else:
         # Texture2D
-        convert_texture_texture2d(meta)
+        return convert_texture_texture2d(meta)
 
-def convert_textures(texture_metadata: list):
+def convert_textures(texture_metadata: list, pool=None):
     print("Textures")
-
-    with Pool() as p:
-        list(tqdm(p.imap_unordered(_convert_texture, texture_metadata, chunksize=16), total=len(texture_metadata)))
+    return _run_converter(_convert_texture, texture_metadata, "Textures", pool)
     
     # for meta in texture_metadata:
     #     _convert_texture(meta)
 
 
-def convert_stories(story_data: list):
-    print("Stories")
-    for data in story_data:
-        data = data[0]
+def _convert_story(data):
+    data = data[0]
 
-        out_path = os.path.join(HACHIMI_ROOT, "assets", data['file_name'] + ".json")
-        out_block_list = []
+    out_path = os.path.join(HACHIMI_ROOT, "assets", data['file_name'] + ".json")
+    out_block_list = []
 
-        for block in data['data']:
-            if not out_block_list and not block.get('text'):
-                continue
+    for block in data['data']:
+        if not out_block_list and not block.get('text'):
+            continue
 
-            block_dict = {}
+        block_dict = {}
 
-            block_dict['text'] = block.get('text', "")
+        block_dict['text'] = block.get('text', "")
 
-            name = block.get('name')
-            if name:
-                block_dict['name'] = name
-            
-            choices = block.get('choices')
-            if choices:
-                block_dict['choice_data_list'] = [convert_tags(choice.get('processed', choice.get('text', ""))) for choice in choices]
-            
-            out_block_list.append(block_dict)
+        name = block.get('name')
+        if name:
+            block_dict['name'] = name
         
-        out_dict = {
-            "no_wrap": True,
-            "text_block_list": out_block_list
-        }
-        util.save_json(out_path, out_dict)
+        choices = block.get('choices')
+        if choices:
+            block_dict['choice_data_list'] = [convert_tags(choice.get('processed', choice.get('text', ""))) for choice in choices]
+        
+        out_block_list.append(block_dict)
+    
+    out_dict = {
+        "no_wrap": True,
+        "text_block_list": out_block_list
+    }
+    return util.save_json_if_changed(out_path, out_dict)
 
 
-def convert_movies(movie_metadata: list):
-    print("Movies")
-    for meta in movie_metadata:
-        meta = meta[0]
+def convert_stories(story_data: list, pool=None):
+    print("Stories")
+    return _run_converter(_convert_story, story_data, "Stories", pool, chunksize=8)
+
 
-        file_name = meta['file_name']
+def _convert_movie(meta):
+    meta = meta[0]
 
-        local_file = os.path.join(util.ASSETS_FOLDER_EDITING, file_name)
-        hachimi_file = os.path.join(HACHIMI_ROOT, "assets", "movies", file_name.replace("movie/m/", ""))
+    file_name = meta['file_name']
 
-        if not os.path.exists(local_file):
-            print(f"Movie {local_file} does not exist")
-            continue
+    local_file = os.path.join(util.ASSETS_FOLDER_EDITING, file_name)
+    hachimi_file = os.path.join(HACHIMI_ROOT, "assets", "movies", file_name.replace("movie/m/", ""))
 
-        os.makedirs(os.path.dirname(hachimi_file), exist_ok=True)
-        shutil.copy(local_file, hachimi_file)
+    if not os.path.exists(local_file):
+        print(f"Movie {local_file} does not exist")
+        return None
+
+    os.makedirs(os.path.dirname(hachimi_file), exist_ok=True)
+    return util.copy_if_changed(local_file, hachimi_file)
+
+
+def convert_movies(movie_metadata: list, pool=None):
+    print("Movies")
+    return _run_converter(_convert_movie, movie_metadata, "Movies", pool)
+
+
+# Below this many items, converting inline is faster than handing them to the pool.
+INLINE_CONVERT_LIMIT = 8
+
+def _run_converter(func, metadata: list, desc: str, pool=None, chunksize=16):
+    # Runs a converter over all metadata, in the shared worker pool if one is given.
+    # Without one (e.g. the story editor converting a single chapter), it runs inline
+    # rather than starting a pool of its own.
+    # Converters return True if they wrote output, False if it was unchanged.
+    if pool is None or len(metadata) <= INLINE_CONVERT_LIMIT:
+        results = [func(item) for item in util.tqdm(metadata, desc=desc)]
+    else:
+        results = list(util.tqdm(pool.imap_unordered(func, metadata, chunksize=chunksize), total=len(metadata), desc=desc))
+    return _print_counts(desc, results)
 
 
 def convert_assets():
     print("==Assets==")
     asset_dict = util.get_assets_type_dict()
-    convert_flash(asset_dict.get('flash', []))
-    convert_textures(asset_dict.get('texture', []))
-    convert_stories(asset_dict.get('story', []))
-    convert_movies(asset_dict.get('movie', []))
+
+    counts = []
+    with util.UmaPool() as pool:
+        counts.append(convert_flash(asset_dict.get('flash', []), pool))
+        counts.append(convert_textures(asset_dict.get('texture', []), pool))
+        counts.append(convert_stories(asset_dict.get('story', []), pool))
+        counts.append(convert_movies(asset_dict.get('movie', []), pool))
+
+    written = sum(c[0] for c in counts)
+    unchanged = sum(c[1] for c in counts)
+    print(f"Assets: {written} written, {unchanged} unchanged")
+    return written, unchanged
+
+
+def _list_files(folder: str) -> dict:
+    files = {}
+    for root, _, file_names in os.walk(folder):
+        for file_name in file_names:
+            path = os.path.join(root, file_name)
+            files[os.path.relpath(path, folder)] = path
+    return files
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _file_stat(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def sync_data(from_folder: str, to_folder: str) -> tuple:
+    # Make to_folder match from_folder, only touching files that changed.
+    # Hashes are cached by file stat, so unchanged files aren't read again.
+    cache = {}
+    if os.path.exists(SYNC_CACHE_PATH):
+        try:
+            cache = util.load_json(SYNC_CACHE_PATH)
+        except json.JSONDecodeError:
+            cache = {}
+    cache_root = cache.get(to_folder, {})
+    new_cache = {}
+
+    src_files = _list_files(from_folder)
+    dst_files = _list_files(to_folder) if os.path.exists(to_folder) else {}
+
+    copied = 0
+    unchanged = 0
+
+    for rel_path, src_path in util.tqdm(src_files.items(), total=len(src_files), desc="Syncing"):
+        dst_path = os.path.join(to_folder, rel_path)
+        cached = cache_root.get(rel_path, {})
+
+        src_stat = _file_stat(src_path)
+        if cached.get('src') == src_stat:
+            src_hash = cached['hash']
+        else:
+            src_hash = _hash_file(src_path)
+
+        is_same = False
+        if rel_path in dst_files:
+            dst_stat = _file_stat(dst_path)
+            if cached.get('dst') == dst_stat and cached.get('hash') == src_hash:
+                is_same = True
+            elif dst_stat[0] == src_stat[0]:
+                is_same = _hash_file(dst_path) == src_hash
+
+        if is_same:
+            unchanged += 1
+        else:
+            # Copy next to the target and swap it in, so the game never sees a partial file.
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            tmp_path = dst_path + ".carotene.tmp"
+            shutil.copy2(src_path, tmp_path)
+            os.replace(tmp_path, dst_path)
+            copied += 1
+
+        new_cache[rel_path] = {
+            'src': src_stat,
+            'dst': _file_stat(dst_path),
+            'hash': src_hash,
+        }
+
+    # Remove files that no longer exist in the source.
+    deleted = 0
+    for rel_path, dst_path in dst_files.items():
+        if rel_path in src_files:
+            continue
+        os.remove(dst_path)
+        deleted += 1
+
+    if deleted:
+        for root, dirs, files in os.walk(to_folder, topdown=False):
+            if root != to_folder and not os.listdir(root):
+                os.rmdir(root)
+
+    cache[to_folder] = new_cache
+    util.save_json(SYNC_CACHE_PATH, cache)
+
+    print(f"Synced: {copied} copied, {deleted} deleted, {unchanged} unchanged")
+    return copied, deleted, unchanged
 
 
 def copy_data():
     print("==Copying data==")
-    from_folder = HACHIMI_ROOT
-    to_folder = HACHIMI_LIVE_ROOT
+    copied, deleted, _ = sync_data(HACHIMI_ROOT, get_live_root())
 
-    if os.path.exists(to_folder):
-        shutil.rmtree(to_folder)
-    
-    shutil.copytree(from_folder, to_folder, dirs_exist_ok=True)
+    if not copied and not deleted:
+        return
+
+    # Let a running game pick up the changes.
+    try:
+        hachimi_api.reload_localized_data(blocking=True)
+    except requests.exceptions.RequestException:
+        print("Hachimi is not running. Changes will be loaded on the next start.")
 
 
 def convert():
     print("Starting conversion to Hachimi")
-    convert_assembly()
-    convert_mdb()
-    convert_assets()
+    counts = [
+        convert_assembly(),
+        convert_mdb(),
+        convert_assets(),
+    ]
+    written = sum(c[0] for c in counts)
+    unchanged = sum(c[1] for c in counts)
+    print(f"Conversion done: {written} written, {unchanged} unchanged")
 
     # copy_data()
     # print("Done")
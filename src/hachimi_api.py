@@ -1,45 +1,171 @@
 import requests
 from enum import Enum
-import asyncio
+import threading
+import time
 
 HACHIMI_API_URL = "http://localhost:50433"
 
+# Connecting fails fast when the game isn't running, responses can take a while.
+CONNECT_TIMEOUT = 1
+READ_TIMEOUT = 60
+
+# Wait before the next request after a failure, doubling up to the max.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+
 class RequestType(Enum):
     ReloadLocalizedData = "ReloadLocalizedData"
     StoryGotoBlock = "StoryGotoBlock"
 
+# Only the latest queued request of these types is sent.
+COALESCED_TYPES = {RequestType.StoryGotoBlock}
 
-def send_request(type: RequestType, fields: dict, blocking: bool=False) -> requests.Response:
-    headers = {
-        "content-type": "application/json"
-    }
 
+class HachimiBackoffException(requests.ConnectionError):
+    pass
+
+
+class HachimiClient:
+    # Sends requests over one keep-alive session.
+    # Non-blocking requests are queued and sent in order on a worker thread.
+    # Callbacks get (response, error) and are run through dispatch, e.g. to get back on the UI thread.
+    def __init__(self, url=HACHIMI_API_URL, dispatch=None):
+        self.url = url
+        self.dispatch = dispatch
+
+        self.session = requests.Session()
+        self.session.headers["content-type"] = "application/json"
+        self.session_lock = threading.Lock()
+
+        self.queue = {}
+        self.cond = threading.Condition()
+        self.thread = None
+        self.closed = False
+
+        self.failures = 0
+        self.backoff_until = 0
+
+    def _post(self, data):
+        print("Hachimi API request: ", data)
+        with self.session_lock:
+            return self.session.post(self.url, json=data, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+
+    def _post_tracked(self, data):
+        # Post and update the backoff, raising the request's error.
+        try:
+            response = self._post(data)
+        except requests.RequestException as e:
+            with self.cond:
+                self.failures += 1
+                self.backoff_until = time.monotonic() + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+            print(f"Hachimi API request failed: {e}")
+            raise
+
+        with self.cond:
+            self.failures = 0
+            self.backoff_until = 0
+        return response
+
+    def request(self, data) -> requests.Response:
+        # Blocking. Fails right away while backing off from an earlier failure.
+        with self.cond:
+            wait = self.backoff_until - time.monotonic()
+        if wait > 0:
+            raise HachimiBackoffException(f"Hachimi API unreachable, retrying in {wait:.1f}s")
+
+        return self._post_tracked(data)
+
+    def send(self, data, callback=None, coalesce=False):
+        # Queue a request. A coalesced request replaces the queued one of the same type.
+        key = data["type"] if coalesce else object()
+
+        with self.cond:
+            if self.closed:
+                return
+
+            self.queue.pop(key, None)
+            self.queue[key] = (data, callback)
+
+            if not self.thread:
+                self.thread = threading.Thread(target=self._run, name="HachimiClient", daemon=True)
+                self.thread.start()
+
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+
+                if self.closed:
+                    return
+
+                wait = self.backoff_until - time.monotonic()
+                if wait > 0:
+                    # Newer requests can still replace the queued ones while waiting.
+                    self.cond.wait(wait)
+                    continue
+
+                key = next(iter(self.queue))
+                data, callback = self.queue.pop(key)
+
+            response = None
+            error = None
+            try:
+                response = self._post_tracked(data)
+            except requests.RequestException as e:
+                error = e
+
+            if callback:
+                self._call(lambda: callback(response, error))
+
+    def _call(self, func):
+        if self.dispatch:
+            self.dispatch(func)
+        else:
+            func()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.queue = {}
+            self.cond.notify()
+
+        if self.thread:
+            self.thread.join()
+        self.session.close()
+
+
+_client = None
+def get_client() -> HachimiClient:
+    global _client
+    if not _client:
+        _client = HachimiClient()
+    return _client
+
+
+def send_request(type: RequestType, fields: dict, blocking: bool=False, callback=None) -> requests.Response:
     data = {
         "type": type.value,
     }
     data.update(fields)
 
-    print("Hachimi API request: ", data)
-
     if blocking:
-        return requests.post(HACHIMI_API_URL, headers=headers, json=data, timeout=60)
-    
-    event_loop = asyncio.get_event_loop()
-    event_loop.run_in_executor(None, lambda: requests.post(HACHIMI_API_URL, headers=headers, json=data, timeout=60))
-    return None
+        return get_client().request(data)
 
-    # response = requests.post(HACHIMI_API_URL, headers=headers, json=data, timeout=60)
-    # return response
+    get_client().send(data, callback, coalesce=type in COALESCED_TYPES)
+    return None
 
-def reload_localized_data(blocking: bool = False) -> requests.Response:
-    return send_request(RequestType.ReloadLocalizedData, {}, blocking)
+def reload_localized_data(blocking: bool = False, callback=None) -> requests.Response:
+    return send_request(RequestType.ReloadLocalizedData, {}, blocking, callback)
 
-def story_goto_block(block_id: int, incremental: bool = True, blocking: bool = False) -> requests.Response:
+def story_goto_block(block_id: int, incremental: bool = True, blocking: bool = False, callback=None) -> requests.Response:
     fields = {
         "block_id": block_id,
         "incremental": incremental
     }
-    return send_request(RequestType.StoryGotoBlock, fields, blocking)
+    return send_request(RequestType.StoryGotoBlock, fields, blocking, callback)
 
 def hello_world() -> requests.Response:
     return requests.get(HACHIMI_API_URL)
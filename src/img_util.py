@@ -1,3 +1,7 @@
+import numpy as np
+import os
+from PIL import Image
+
 BLACK, DARKGRAY, GRAY = ((0,0,0), (63,63,63), (127,127,127))
 LIGHTGRAY, WHITE = ((191,191,191), (255,255,255))
 BLUE, GREEN, RED = ((0, 0, 255), (0, 255, 0), (255, 0, 0))
@@ -58,4 +62,43 @@ def for_each_pixel(img, func):
     """ Apply a function to each pixel in an image. """
     for y in range(img.height):
         for x in range(img.width):
-            img.putpixel((x, y), func(img.getpixel((x, y))))
\ No newline at end of file
+            img.putpixel((x, y), func(img.getpixel((x, y))))
+
+def horz_gradient_strip(width, color_palette):
+    """ Same colors as horz_gradient with gradient_color over width + 1 columns,
+        as a (width + 1, 3) uint8 array.
+    """
+    minval, maxval = 1, len(color_palette)
+    delta = maxval - minval
+    max_index = len(color_palette) - 1
+    palette = np.array(color_palette, dtype=np.float64)
+
+    f = np.arange(width + 1) / float(width)
+    val = minval + f * delta
+    v = (val - minval) / (delta or 1) * max_index
+    i1 = v.astype(np.int64)
+    i2 = np.minimum(i1 + 1, max_index)
+    f = (v - i1)[:, None]
+    c1 = palette[i1]
+    c2 = palette[i2]
+    return (c1 + f * (c2 - c1)).astype(np.uint8)
+
+
+# Only opaque pixels are shown.
+ALPHA_THRESHOLD_LUT = [0] * 255 + [255]
+
+def make_thumbnail(args):
+    # Black and white half-size thumbnail of an image's opaque pixels.
+    # Takes a (file_path, thumbnail_path) tuple, to be used in a pool.
+    file_path, thumbnail_path = args
+
+    with Image.open(file_path) as image:
+        image = image.getchannel("A")  # Get alpha channel only
+    image = image.point(ALPHA_THRESHOLD_LUT)  # Convert to black and white
+
+    # Scale image down 50%
+    image = image.resize((image.width // 2, image.height // 2), Image.Resampling.BICUBIC)
+
+    tmp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+    image.save(tmp_path, "PNG")
+    os.replace(tmp_path, thumbnail_path)
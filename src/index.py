@@ -13,10 +13,23 @@ import shutil
 from itertools import repeat
 import UnityPy
 import _patch
-from win32com.client import Dispatch
+import environment
 import copy
 import hachimi
 
+# Only available on Windows.
+win32com_client = environment.optional_import("win32com.client")
+
+def create_shortcut(shortcut_out, target_path):
+    # The shortcuts only make the asset bundles easier to find while editing, they're skipped without win32.
+    if not win32com_client:
+        return
+
+    shell = win32com_client.Dispatch('WScript.Shell')
+    shortcut = shell.CreateShortCut(shortcut_out)
+    shortcut.Targetpath = target_path.replace("/", "\\")
+    shortcut.save()
+
 def add_to_dict(parent_dict, values_list):
     if len(values_list) == 2:
         parent_dict[str(values_list[0])] = {"text": "", "hash": hashlib.sha256(str(values_list[1]).encode("utf-8")).hexdigest()}
@@ -505,10 +518,7 @@ def index_textures_from_assetbundle(metadata):
         asset_path = util.get_asset_path(existing_meta['hash'])
 
         if not os.path.exists(shortcut_out):
-            shell = Dispatch('WScript.Shell')
-            shortcut = shell.CreateShortCut(shortcut_out)
-            shortcut.Targetpath = asset_path.replace("/", "\\")
-            shortcut.save()
+            create_shortcut(shortcut_out, asset_path)
 
         if existing_meta['hash'] == hash:
             # Already indexed and no change in hash.
@@ -579,10 +589,7 @@ def index_textures_from_assetbundle(metadata):
         shortcut_out = os.path.join(util.ASSETS_FOLDER_EDITING, file_name, hash + ".lnk")
         asset_path = util.get_asset_path(hash)
 
-        shell = Dispatch('WScript.Shell')
-        shortcut = shell.CreateShortCut(shortcut_out)
-        shortcut.Targetpath = asset_path.replace("/", "\\")
-        shortcut.save()
+        create_shortcut(shortcut_out, asset_path)
 
 def backup_texture(file_name, texture):
     texture_path = os.path.join(util.ASSETS_FOLDER_EDITING, file_name, texture['name'] + ".png")
@@ -916,7 +923,7 @@ def index_jpdict():
     else:
         tl_data = util.load_json(tl_file)
 
-    string_dump_file = os.path.join(hachimi.HACHIMI_LIVE_ROOT, "..", "localize_dump.json")
+    string_dump_file = os.path.join(hachimi.get_live_root(), "..", "localize_dump.json")
     # string_dump_file = os.path.join(util.get_game_folder(), "assembly_dump.json")
 
     if not os.path.exists(string_dump_file):
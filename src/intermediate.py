@@ -9,12 +9,14 @@ import tqdm
 from PIL import Image
 import numpy as np
 import time
-import UnityPy
+import startup
 from itertools import repeat
 import filecmp
 import hashlib
 import copy
 
+UnityPy = startup.lazy_import("UnityPy")
+
 def write_recursive(cur_path, cur_dict, overwrite=False):
     if "hash" not in cur_dict[list(cur_dict.keys())[0]]:
         for key, value in cur_dict.items():
@@ -497,7 +499,7 @@ def _convert_texture(metadata):
 
 def convert_textures():
     print("=== TEXTURES ===")
-    json_list = glob.glob(util.ASSETS_FOLDER_EDITING + "\\**\\*.json", recursive=True)
+    json_list = glob.glob(os.path.join(util.ASSETS_FOLDER_EDITING, "**", "*.json"), recursive=True)
 
     with util.UmaPool() as pool:
         results = list(tqdm.tqdm(pool.imap_unordered(util.test_for_type, zip(json_list, repeat("texture")), chunksize=128), total=len(json_list), desc="Looking for textures"))
@@ -774,6 +776,138 @@ def convert_movies():
         _handle_one_xor(path)
 
 
+MDB_SUMMARY_PATH = util.APP_DIR + "mdb_summary.json"
+
+def summarize_mdb_entries(entries):
+    return {
+        "count": len(entries),
+        "new": sum(1 for entry in entries if entry.get('new')),
+        "edited": sum(1 for entry in entries if entry.get('edited')),
+        "untranslated": sum(1 for entry in entries if not entry.get('text')),
+    }
+
+def _load_summaries(summary_path):
+    if not os.path.exists(summary_path):
+        return {}
+    try:
+        return util.load_json(summary_path)
+    except json.JSONDecodeError:
+        return {}
+
+def _make_mdb_summary(path, entries):
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, **summarize_mdb_entries(entries)}
+
+def get_mdb_summaries(json_paths):
+    # Entry counts per MDB json, cached by file mtime and size.
+    # Only files that changed since the last call are loaded.
+    cached = _load_summaries(MDB_SUMMARY_PATH)
+    summaries = {}
+    changed = False
+
+    for path in json_paths:
+        stat = os.stat(path)
+        summary = cached.get(path)
+        if not summary or summary["mtime"] != stat.st_mtime or summary["size"] != stat.st_size:
+            summary = _make_mdb_summary(path, util.load_json(path))
+            changed = True
+        summaries[path] = summary
+
+    if changed or len(summaries) != len(cached):
+        util.save_json(MDB_SUMMARY_PATH, summaries)
+
+    return summaries
+
+def update_mdb_summary(path, entries):
+    # Call after saving an MDB json, so it doesn't have to be loaded again.
+    summaries = _load_summaries(MDB_SUMMARY_PATH)
+    summaries[path] = _make_mdb_summary(path, entries)
+    util.save_json(MDB_SUMMARY_PATH, summaries)
+    return summaries[path]
+
+def get_mdb_summary_status(summary):
+    if summary["new"]:
+        return 'new'
+    if summary["edited"]:
+        return 'edited'
+    return None
+
+STORY_PROGRESS_PATH = util.APP_DIR + "story_progress.json"
+
+def summarize_story(chapter):
+    # Translated counts and the first untranslated block/choice of a story chapter.
+    summary = {
+        "blocks": 0,
+        "translated": 0,
+        "choices": 0,
+        "choices_translated": 0,
+        "first_block": None,
+        "first_choice": None,
+    }
+
+    if not isinstance(chapter, dict) or chapter.get("type") != "story":
+        return summary
+
+    for i, block in enumerate(chapter.get("data", [])):
+        if block.get("source"):
+            summary["blocks"] += 1
+            if block.get("text"):
+                summary["translated"] += 1
+            elif summary["first_block"] is None:
+                summary["first_block"] = i
+
+        for choice in block.get("choices") or []:
+            if not choice.get("source"):
+                continue
+            summary["choices"] += 1
+            if choice.get("text"):
+                summary["choices_translated"] += 1
+            elif summary["first_choice"] is None:
+                summary["first_choice"] = i
+
+    return summary
+
+def _make_story_progress(path, chapter):
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, **summarize_story(chapter)}
+
+def get_story_progress(folders):
+    # Story progress for every json in folders, cached by file mtime and size like the MDB summaries.
+    cached = _load_summaries(STORY_PROGRESS_PATH)
+    progress = {}
+    changed = False
+
+    for folder in folders:
+        for root, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                if not file_name.endswith(".json"):
+                    continue
+
+                path = os.path.normpath(os.path.join(root, file_name))
+                stat = os.stat(path)
+                summary = cached.get(path)
+                if not summary or summary["mtime"] != stat.st_mtime or summary["size"] != stat.st_size:
+                    try:
+                        chapter = util.load_json(path)
+                    except json.JSONDecodeError:
+                        chapter = None
+                    summary = _make_story_progress(path, chapter)
+                    changed = True
+                progress[path] = summary
+
+    if changed or progress.keys() != cached.keys():
+        util.save_json(STORY_PROGRESS_PATH, progress)
+
+    return progress
+
+def update_story_progress(path, chapter):
+    # Call after saving a story chapter.
+    path = os.path.normpath(path)
+    progress = _load_summaries(STORY_PROGRESS_PATH)
+    progress[path] = _make_story_progress(path, chapter)
+    util.save_json(STORY_PROGRESS_PATH, progress)
+    return progress[path]
+
 def get_mdb_structure():
     jsons = glob.glob(util.MDB_FOLDER_EDITING + "/**/*.json", recursive=True)
 
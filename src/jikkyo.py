@@ -1,5 +1,9 @@
 import util
 import os
+import re
+import unicodedata
+
+TEMPLATES_PATH = "jikkyo_templates.json"
 
 titles = {
     "三冠ウマ娘": "Triple Crown winner",
@@ -51,7 +55,7 @@ def extract_templates():
     mdb_path = os.path.join(util.MDB_FOLDER_EDITING, "race_jikkyo_message.json")
     message_list = util.load_json(mdb_path)
 
-    out_path = "jikkyo_templates.json"
+    out_path = TEMPLATES_PATH
     if os.path.exists(out_path):
         print("Output file already exists. Exiting.")
         return
@@ -72,36 +76,172 @@ def extract_templates():
     
     util.save_json(out_path, out)
 
-def make_tl_dict():
-    templates_path = "jikkyo_templates.json"
-    templates = util.load_json(templates_path)
+# Typed template slots. Dict slots match one of their keys, pattern slots match a regex.
+# A slot is written as {type} in a template, optionally numbered like {title2}. {} is a title.
+ORDINAL_REGEX = re.compile(r"[0-9０-９]+")
 
-    tl_dict = {}
+def to_ordinal(number):
+    number = int(unicodedata.normalize("NFKC", number))
+    suffix = "th"
+    if not 10 <= number % 100 <= 20:
+        suffix = {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
 
-    for source, text in templates:
-        for title_jp, title_en in titles.items():
-            key = source.format(title_jp)
-            value = text.format(title_en)
-            tl_dict[key] = value
-    
-    return tl_dict
+SLOTS = {
+    "title": titles,
+    "ordinal": (ORDINAL_REGEX, to_ordinal),
+}
 
-def apply_tl_dict(tl_dict):
+SLOT_REGEX = re.compile(r"\{([^{}\d]*)(\d*)\}")
+TRIE_END = None
+
+
+def _add_to_trie(trie, key, value):
+    node = trie
+    for char in key:
+        node = node.setdefault(char, {})
+    node.setdefault(TRIE_END, []).append(value)
+
+def _walk_trie(trie, text, pos):
+    # All values whose key starts at pos, longest key first, as (end, value).
+    found = []
+    node = trie
+    for i in range(pos, len(text) + 1):
+        if TRIE_END in node:
+            found += [(i, value) for value in node[TRIE_END]]
+        if i == len(text) or text[i] not in node:
+            break
+        node = node[text[i]]
+    return reversed(found)
+
+
+def _find_slots(template):
+    # (match, slot name, slot type) for every slot. Unnamed slots are numbered in order: title, title2, ...
+    slots = []
+    unnamed = 0
+    for match in SLOT_REGEX.finditer(template):
+        slot_type = match.group(1)
+        number = match.group(2)
+        if not slot_type and not number:
+            unnamed += 1
+            number = str(unnamed) if unnamed > 1 else ""
+        slot_type = slot_type or "title"
+        slots.append((match, slot_type + number, slot_type))
+    return slots
+
+def _parse_template(template):
+    # Split a template into literal strings and (slot name, slot type) tuples.
+    parts = []
+    pos = 0
+    for match, slot_name, slot_type in _find_slots(template):
+        if match.start() > pos:
+            parts.append(template[pos:match.start()])
+        parts.append((slot_name, slot_type))
+        pos = match.end()
+    if pos < len(template):
+        parts.append(template[pos:])
+    return parts
+
+def _to_format_string(template):
+    # Name every slot, so the template can be filled by slot name.
+    out = []
+    pos = 0
+    for match, slot_name, _ in _find_slots(template):
+        out.append(template[pos:match.start()] + "{" + slot_name + "}")
+        pos = match.end()
+    out.append(template[pos:])
+    return "".join(out)
+
+
+class TemplateMatcher:
+    # Matches race_jikkyo_message sources against templates with typed slots.
+    # Templates are indexed by their leading text in a trie, and dict slots are tries of their keys,
+    # so memory grows with templates + slot values instead of their product.
+    def __init__(self, templates, slots=None):
+        self.slots = slots or SLOTS
+        self._slot_tries = {}
+        for slot_type, values in self.slots.items():
+            if isinstance(values, dict):
+                trie = {}
+                for jp, en in values.items():
+                    _add_to_trie(trie, jp, en)
+                self._slot_tries[slot_type] = trie
+
+        self._template_trie = {}
+        for source, text in templates:
+            parts = _parse_template(source)
+            prefix = parts[0] if parts and isinstance(parts[0], str) else ""
+            _add_to_trie(self._template_trie, prefix, (parts, _to_format_string(text)))
+
+    def _match_slot(self, slot_type, source, pos):
+        if slot_type in self._slot_tries:
+            return _walk_trie(self._slot_tries[slot_type], source, pos)
+
+        regex, convert = self.slots[slot_type]
+        match = regex.match(source, pos)
+        if not match:
+            return []
+        return [(end, convert(source[pos:end])) for end in range(match.end(), pos, -1)]
+
+    def _match_parts(self, parts, i, source, pos, values):
+        if i == len(parts):
+            return values if pos == len(source) else None
+
+        part = parts[i]
+        if isinstance(part, str):
+            if not source.startswith(part, pos):
+                return None
+            return self._match_parts(parts, i + 1, source, pos + len(part), values)
+
+        slot_name, slot_type = part
+        for end, value in self._match_slot(slot_type, source, pos):
+            result = self._match_parts(parts, i + 1, source, end, {**values, slot_name: value})
+            if result is not None:
+                return result
+        return None
+
+    def match(self, source):
+        # Returns (english template, slot values) or None.
+        for _, (parts, text) in _walk_trie(self._template_trie, source, 0):
+            values = self._match_parts(parts, 0, source, 0, {})
+            if values is not None:
+                return text, values
+        return None
+
+    def translate(self, source):
+        match = self.match(source)
+        if not match:
+            return None
+        text, values = match
+        return text.format(**values)
+
+
+def load_matcher(templates_path=TEMPLATES_PATH):
+    return TemplateMatcher(util.load_json(templates_path))
+
+def apply_templates(matcher):
     mdb_path = os.path.join(util.MDB_FOLDER_EDITING, "race_jikkyo_message.json")
     message_list = util.load_json(mdb_path)
 
+    # Many messages share a source, so each source is only matched once.
+    translations = {}
+    count = 0
     for message in message_list:
         source = message["source"]
+        if source not in translations:
+            translations[source] = matcher.translate(source)
 
-        if source in tl_dict:
-            message["text"] = tl_dict[source]
+        text = translations[source]
+        if text is not None and message["text"] != text:
+            message["text"] = text
+            count += 1
 
-    util.save_json(mdb_path, message_list)
+    if util.save_json_if_changed(mdb_path, message_list):
+        print(f"Filled {count} jikkyo messages")
 
 def main():
     # extract_templates()
-    tl_dict = make_tl_dict()
-    apply_tl_dict(tl_dict)
+    apply_templates(load_matcher())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,203 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Lexer for the game's <tag> markup.
+# Text is split once into tokens, and every output format is rendered from those tokens.
+# Text tokens have tag=None. Tag tokens keep their raw text so unknown tags can be passed through.
+Token = namedtuple("Token", ["raw", "tag", "arg", "closing"])
+
+CACHE_SIZE = 2**16
+
+TAG_REGEX = re.compile(r"<[^<>]*>")
+TAG_BODY_REGEX = re.compile(r"(/?)([^=]*)(?:=(.*))?", re.DOTALL)
+DIGITS_REGEX = re.compile(r"\d+")
+
+# Tags that map directly to a Hachimi command. Empty means the tag is removed.
+HACHIMI_SIMPLE_TAGS = {
+    "nb": "$(nb)",
+    "force": "",
+    "ho": "$(ho 1)",
+    "vo": "$(vo 1)",
+    "nho": "$(ho 0)",
+    "nvo": "$(vo 0)",
+    "rbr": "",
+    "br": "",
+    "fit": "",
+}
+
+MONTH_VALUES = ("10", "11", "12", "{0}", "{1}", "1", "2", "3", "4", "5", "6", "7", "8", "9")
+ORDINAL_VALUES = ("{0}", "{1}")
+
+
+def _make_tag(raw):
+    closing, tag, arg = TAG_BODY_REGEX.fullmatch(raw[1:-1]).groups()
+    return Token(raw, tag, arg, bool(closing))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def tokenize(text: str) -> tuple:
+    tokens = []
+    pos = 0
+
+    for match in TAG_REGEX.finditer(text):
+        if match.start() > pos:
+            tokens.append(Token(text[pos:match.start()], None, None, False))
+        tokens.append(_make_tag(match.group()))
+        pos = match.end()
+
+    if pos < len(text):
+        tokens.append(Token(text[pos:], None, None, False))
+
+    return tuple(tokens)
+
+
+def _merge_text(tokens):
+    merged = []
+    for token in tokens:
+        if token.tag is None and merged and merged[-1].tag is None:
+            merged[-1] = Token(merged[-1].raw + token.raw, None, None, False)
+        else:
+            merged.append(token)
+    return merged
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_hachimi(text: str) -> str:
+    tokens = tokenize(text)
+
+    if any(token.tag == "p" and token.arg is not None for token in tokens):
+        # Not supported by Hachimi.
+        return ""
+
+    # Drop removed tags first, so the text around them is joined like in the game.
+    tokens = _merge_text([
+        token for token in tokens
+        if not (token.arg is None and not token.closing and HACHIMI_SIMPLE_TAGS.get(token.tag) == "")
+    ])
+
+    out = []
+    skip_chars = 0
+
+    for i, token in enumerate(tokens):
+        if token.tag is None:
+            out.append(token.raw[skip_chars:])
+            skip_chars = 0
+            continue
+        skip_chars = 0
+
+        if token.closing:
+            out.append(token.raw)
+            continue
+
+        if token.arg is None and token.tag in HACHIMI_SIMPLE_TAGS:
+            out.append(HACHIMI_SIMPLE_TAGS[token.tag])
+            continue
+
+        if token.tag == "mon" and token.arg is None:
+            # The month number follows the tag.
+            next_text = tokens[i + 1].raw if i + 1 < len(tokens) and tokens[i + 1].tag is None else ""
+            month = next((m for m in MONTH_VALUES if next_text.startswith(m)), None)
+            if month:
+                out.append(f"$(month {month})")
+                skip_chars = len(month)
+                continue
+
+        if token.tag == "ord" and token.arg in ORDINAL_VALUES:
+            # The number precedes the tag.
+            if out and out[-1].endswith(token.arg):
+                out[-1] = out[-1][:-len(token.arg)]
+                out.append(f"$(ordinal {token.arg})")
+                continue
+
+        if token.tag == "sc" and token.arg and DIGITS_REGEX.fullmatch(token.arg):
+            out.append(f"$(scale {token.arg})")
+            continue
+
+        if token.arg is None and token.tag.startswith("a") and DIGITS_REGEX.fullmatch(token.tag[1:]):
+            out.append(f"$(anchor {token.tag[1:]})")
+            continue
+
+        out.append(token.raw)
+
+    return "".join(out)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def strip_tags(text: str) -> str:
+    return "".join(token.raw for token in tokenize(text) if token.tag is None)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def strip_size_tags(text: str) -> str:
+    out = []
+    for token in tokenize(text):
+        if token.tag == "size" and (token.closing or token.arg is not None):
+            continue
+        out.append(token.raw)
+    return "".join(out)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _extract_colors(text: str) -> tuple:
+    tokens = tokenize(text)
+    colors = []
+    used_text = set()
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+
+        if token.tag != "col" or token.closing or token.arg is None:
+            continue
+
+        # Everything up to the next </col> is colored. Colors don't span lines.
+        content = []
+        for j in range(i, len(tokens)):
+            if tokens[j].tag == "col" and tokens[j].closing:
+                break
+            content.append(tokens[j].raw)
+        else:
+            continue
+
+        content = "".join(content)
+        if "\n" in content:
+            continue
+
+        i = j + 1
+
+        # Skip if text has already been colored.
+        if content in used_text:
+            continue
+        used_text.add(content)
+
+        colors.append((content, int(token.arg)))
+
+    stripped = "".join(token.raw for token in tokens if token.tag != "col" or not (token.closing or token.arg is not None))
+
+    return stripped, tuple(colors)
+
+def extract_colors(text: str):
+    stripped, colors = _extract_colors(text)
+    return stripped, [{"text": content, "color_id": color_id} for content, color_id in colors]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_char_data(text: str) -> tuple:
+    # (char, is_bold, is_italic) for every visible character.
+    char_data = []
+    cur_tags = []
+
+    for token in tokenize(text):
+        if token.tag is not None:
+            if token.closing:
+                if cur_tags:
+                    cur_tags.pop()
+            else:
+                cur_tags.append(token.tag)
+            continue
+
+        is_bold = "b" in cur_tags
+        is_italic = "i" in cur_tags
+        char_data += [(char, is_bold, is_italic) for char in token.raw]
+
+    return tuple(char_data)
@@ -0,0 +1,205 @@
+import os
+import json
+import zlib
+import struct
+import hashlib
+import bisect
+
+# Packed translation files.
+# Layout: header, index, then the blobs in index order.
+#   header: magic, format version, flags, entry count, index length
+#   index:  utf-8 json list of [path, offset, length, size, compressed, sha256], sorted by path
+# Offsets are relative to the end of the index. Paths always use forward slashes.
+# Because the blobs follow the index in order, a pack can be installed while it downloads.
+
+MAGIC = b"CPAK"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+
+# Don't bother compressing entries that shrink less than this.
+MIN_COMPRESS_RATIO = 0.9
+
+# Index entry fields
+PATH, OFFSET, LENGTH, SIZE, COMPRESSED, HASH = range(6)
+
+
+class PackFormatException(Exception):
+    pass
+
+
+def _to_pack_path(rel_path):
+    return rel_path.replace("\\", "/")
+
+
+def _is_safe_path(path):
+    # Entry paths must stay inside the folder they are installed to:
+    # relative, no drive, no empty, "." or ".." segments.
+    if not path or os.path.isabs(path) or "\\" in path or ":" in path:
+        return False
+    return all(segment not in ("", ".", "..") for segment in path.split("/"))
+
+
+def write_pack(folder, out_path, compress=True):
+    # Pack every file in folder into out_path.
+    rel_paths = []
+    for root, _, file_names in os.walk(folder):
+        for file_name in file_names:
+            rel_paths.append(os.path.relpath(os.path.join(root, file_name), folder))
+    rel_paths.sort(key=_to_pack_path)
+
+    index = []
+    offset = 0
+    blob_path = out_path + ".blobs"
+
+    with open(blob_path, "wb") as blobs:
+        for rel_path in rel_paths:
+            with open(os.path.join(folder, rel_path), "rb") as f:
+                data = f.read()
+
+            blob = data
+            compressed = False
+            if compress and data:
+                packed = zlib.compress(data, 9)
+                if len(packed) < len(data) * MIN_COMPRESS_RATIO:
+                    blob = packed
+                    compressed = True
+
+            blobs.write(blob)
+            index.append([_to_pack_path(rel_path), offset, len(blob), len(data), compressed, hashlib.sha256(data).hexdigest()])
+            offset += len(blob)
+
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    with open(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(index), len(index_bytes)))
+        f.write(index_bytes)
+        with open(blob_path, "rb") as blobs:
+            while chunk := blobs.read(1024 * 1024):
+                f.write(chunk)
+
+    os.remove(blob_path)
+    return len(index)
+
+
+def _read_exact(stream, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise PackFormatException("Unexpected end of pack")
+        data += chunk
+    return bytes(data)
+
+
+def _read_header(stream):
+    magic, version, _, count, index_len = HEADER.unpack(_read_exact(stream, HEADER.size))
+    if magic != MAGIC:
+        raise PackFormatException("Not a Carotene pack")
+    if version > FORMAT_VERSION:
+        raise PackFormatException(f"Unsupported pack version {version}")
+
+    index = json.loads(_read_exact(stream, index_len).decode("utf-8"))
+    if len(index) != count:
+        raise PackFormatException("Pack index is corrupt")
+
+    for entry in index:
+        if not _is_safe_path(entry[PATH]):
+            raise PackFormatException(f"Entry {entry[PATH]} has an unsafe path")
+
+    return index, HEADER.size + index_len
+
+
+def _unpack_entry(entry, blob):
+    data = zlib.decompress(blob) if entry[COMPRESSED] else blob
+    if len(data) != entry[SIZE] or hashlib.sha256(data).hexdigest() != entry[HASH]:
+        raise PackFormatException(f"Entry {entry[PATH]} is corrupt")
+    return data
+
+
+class PackReader:
+    # Read single files from a pack without extracting it.
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        try:
+            self.index, self.data_start = _read_header(self.f)
+        except Exception:
+            self.f.close()
+            raise
+        self._paths = [entry[PATH] for entry in self.index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        self.f.close()
+
+    def _find(self, path):
+        path = _to_pack_path(path)
+        if not _is_safe_path(path):
+            return None
+        i = bisect.bisect_left(self._paths, path)
+        if i < len(self._paths) and self._paths[i] == path:
+            return self.index[i]
+        return None
+
+    def __contains__(self, path):
+        return self._find(path) is not None
+
+    def paths(self, prefix=""):
+        prefix = _to_pack_path(prefix)
+        start = bisect.bisect_left(self._paths, prefix)
+        for path in self._paths[start:]:
+            if not path.startswith(prefix):
+                break
+            yield path
+
+    def read(self, path):
+        entry = self._find(path)
+        if not entry:
+            raise FileNotFoundError(f"{path} not in pack")
+
+        self.f.seek(self.data_start + entry[OFFSET])
+        return _unpack_entry(entry, _read_exact(self.f, entry[LENGTH]))
+
+    def read_json(self, path):
+        return json.loads(self.read(path).decode("utf-8"))
+
+
+def install_stream(stream, out_folder, progress=None):
+    # Write every entry of a pack to out_folder as it is read from stream.
+    # Entries are written to a temp file first, so an aborted install never leaves half files.
+    index, data_start = _read_header(stream)
+    if progress:
+        progress(data_start)
+
+    real_out_folder = os.path.realpath(out_folder)
+    offset = 0
+    for entry in index:
+        if entry[OFFSET] != offset:
+            raise PackFormatException("Pack entries are out of order")
+
+        blob = _read_exact(stream, entry[LENGTH])
+        offset += entry[LENGTH]
+        data = _unpack_entry(entry, blob)
+
+        out_path = os.path.join(out_folder, *entry[PATH].split("/"))
+        if os.path.commonpath([os.path.realpath(out_path), real_out_folder]) != real_out_folder:
+            raise PackFormatException(f"Entry {entry[PATH]} is outside the install folder")
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp_path = out_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, out_path)
+
+        if progress:
+            progress(entry[LENGTH])
+
+    return len(index)
+
+
+def install_file(path, out_folder):
+    with open(path, "rb") as f:
+        return install_stream(f, out_folder)
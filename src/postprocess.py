@@ -1,11 +1,23 @@
+import os
 import math
+import json
+import sqlite3
+import hashlib
+import types
+from functools import cache
 import util
 from tqdm import tqdm
-from itertools import repeat
-import json
 
 
-FONT = util.prepare_font()
+@cache
+def get_font():
+    # Loaded on first use, it needs the meta db.
+    return util.prepare_font()
+
+# The cache fingerprint covers the bytecode of every step function, see _get_code_hash.
+# Bump when something a step calls (e.g. the text measuring in util) changes its output, so cached results are redone.
+POSTPROCESS_VERSION = 1
+PP_CACHE_PATH = util.APP_DIR + "postprocess_cache.db"
 
 
 def add_slogan_tag(text):
@@ -21,7 +33,7 @@ def add_nb_tag(text):
 def scale_to_width(text, max_width, def_size=None):
     tmp_text = util.filter_tags(text)
 
-    cur_width = util.get_text_width(tmp_text, FONT)
+    cur_width = util.get_text_width(tmp_text, get_font())
     if cur_width <= max_width:
         return text
     
@@ -37,7 +49,6 @@ def scale_to_box(text, max_width, lines, line_spacing=1.00):
     # Find text scaling so it fits in a box with wrapping on spaces.
     # TODO: Find a way to handle tags.
 
-    global FONT
     line_height = 1000 * line_spacing
     max_height = line_height * lines
 
@@ -45,7 +56,7 @@ def scale_to_box(text, max_width, lines, line_spacing=1.00):
     hyphenation = False
     while True:
         true_scale = scale / 100.
-        lines = util.wrap_text_to_width(text, max_width, FONT, true_scale, hyphenation)
+        lines = util.wrap_text_to_width(text, max_width, get_font(), true_scale, hyphenation)
         height = (1 + lines.count("\n")) * 1000 * true_scale
 
         if height <= max_height:
@@ -114,81 +125,161 @@ PP_FUNCS = {
 }
 
 
-def process_mdb(args):
-    entry, key, file_key = args
-    key = int(key)
+def _get_code_hash(code):
+    # Bytecode, constants and names a function uses, so editing a step also changes the fingerprint.
+    digest = hashlib.sha1(code.co_code)
+    digest.update(repr(code.co_names).encode("utf-8"))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            # Nested functions and comprehensions. Their repr contains a memory address.
+            digest.update(_get_code_hash(const).encode("utf-8"))
+        elif isinstance(const, frozenset):
+            # Set order changes between runs.
+            digest.update(repr(sorted(repr(item) for item in const)).encode("utf-8"))
+        else:
+            digest.update(repr(const).encode("utf-8"))
+    return digest.hexdigest()
+
+def _get_step_name(step):
+    pp_func, pp_args = step
+    if isinstance(pp_func, str):
+        name = [pp_func]
+    else:
+        name = [pp_func.__name__, _get_code_hash(pp_func.__code__)]
+    return [*name, list(pp_args) if pp_args else None]
+
+@cache
+def compile_pipeline(file_key):
+    # Split the rules of a category into stages at each key filter.
+    # Returns a list of (key range, steps, fingerprint). A stage only runs if its range contains the key.
+    # The fingerprint covers every step up to and including the stage, plus the font and engine version.
+    stages = []
+    key_range = None
+    steps = []
+    for step in PP_FUNCS[file_key]:
+        if step[0] == "filter":
+            stages.append((key_range, tuple(steps)))
+            key_range = step[1]
+            steps = []
+        else:
+            steps.append(step)
+    stages.append((key_range, tuple(steps)))
+
+    compiled = []
+    rules = [POSTPROCESS_VERSION, util.get_font_hash()]
+    for key_range, steps in stages:
+        rules.append([key_range, [_get_step_name(step) for step in steps]])
+        fingerprint = hashlib.sha1(json.dumps(rules).encode("utf-8")).hexdigest()
+        compiled.append((key_range, steps, fingerprint))
+
+    return compiled
+
+def get_pipeline(file_key, key):
+    # Steps and rule fingerprint that apply to a single entry.
+    steps = []
+    fingerprint = None
+    for key_range, stage_steps, stage_fingerprint in compile_pipeline(file_key):
+        if key_range and key not in range(key_range[0], key_range[1] + 1):
+            break
+        steps += stage_steps
+        fingerprint = stage_fingerprint
 
-    # Clean up any previous processed data
-    if 'processed' in entry:
-        del entry['processed']
+    return steps, fingerprint
 
-    if not entry.get('text'):
-        return entry
+def run_pipeline(steps, text):
+    for pp_func, pp_args in steps:
+        if pp_args:
+            text = pp_func(text, *pp_args)
+        else:
+            text = pp_func(text)
+    return text
 
-    if file_key in PP_FUNCS:
-        processed = entry['text']
-        for func in PP_FUNCS[file_key]:
-            pp_func, pp_args = func
 
-            # Filter keys
-            if pp_func == "filter":
-                start, end = pp_args
-                if key in range(start, end + 1):
-                    continue
-                else:
-                    break
-
-            if pp_args:
-                processed = pp_func(processed, *pp_args)
-            else:
-                processed = pp_func(processed)
-            
-        if processed != entry['text']:
-            entry['processed'] = processed
-    
-    return entry
+def _get_text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
 
+def _open_cache():
+    os.makedirs(os.path.dirname(PP_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(PP_CACHE_PATH)
+    # p is NULL when postprocessing doesn't change the text.
+    conn.execute("CREATE TABLE IF NOT EXISTS c (f TEXT, t TEXT, p TEXT, PRIMARY KEY (f, t)) WITHOUT ROWID;")
+    return conn
 
-def fix_mdb():
-    for mdb_json_path in tqdm(util.get_tl_mdb_jsons(), desc="Postprocessing MDB"):
-        key = util.split_mdb_path(mdb_json_path)
-        data = util.load_json(mdb_json_path)
+def _process_text(args):
+    cache_key, file_key, key, text = args
+    steps, _ = get_pipeline(file_key, key)
+    processed = run_pipeline(steps, text)
+    return cache_key, processed if processed != text else None
 
-        keys, values = zip(*data.items())
 
-        if key in PP_FUNCS:
-            with util.UmaPool() as p:
-                values = p.map(process_mdb, zip(values, keys, repeat(key)))
-            
-            data = dict(zip(keys, values))
-        
-        else:
-            for i, entry in enumerate(values):
-                data[keys[i]] = process_mdb((entry, keys[i], key))
-
-
-        # for entry in data.values():
-        #     # Clean up any previous processed data
-        #     if 'processed' in entry:
-        #         del entry['processed']
-
-        #     if not entry.get('text'):
-        #         continue
-
-        #     if key in PP_FUNCS:
-        #         processed = entry['text']
-        #         for func in PP_FUNCS[key]:
-        #             pp_func, pp_args = func
-
-        #             if pp_args:
-        #                 processed = pp_func(processed, *pp_args)
-        #             else:
-        #                 processed = pp_func(processed)
-                    
-        #         if processed != entry['text']:
-        #             entry['processed'] = processed
-        
-        util.save_json(mdb_json_path, data)
+def fix_mdb():
+    # Only texts whose (rule fingerprint, text hash) isn't cached yet are processed.
+    mdb_files = []
+    jobs = {}
+
+    for mdb_json_path in tqdm(util.get_tl_mdb_jsons(), desc="Loading MDB"):
+        file_key = util.split_mdb_path(mdb_json_path)
+        data = util.load_json(mdb_json_path)
+        entries = []
+
+        for key, entry in data.items():
+            # Clean up any previous processed data
+            if 'processed' in entry:
+                del entry['processed']
+
+            if not entry.get('text') or file_key not in PP_FUNCS:
+                continue
+
+            steps, fingerprint = get_pipeline(file_key, int(key))
+            if not steps:
+                continue
+
+            cache_key = (fingerprint, _get_text_hash(entry['text']))
+            entries.append((entry, cache_key))
+            if cache_key not in jobs:
+                jobs[cache_key] = (cache_key, file_key, int(key), entry['text'])
+
+        mdb_files.append((mdb_json_path, data, entries))
+
+    conn = _open_cache()
+    try:
+        results = {}
+        stale = []
+        fingerprints = {fingerprint for fingerprint, _ in jobs}
+
+        for fingerprint in fingerprints:
+            for text_hash, processed in conn.execute("SELECT t, p FROM c WHERE f = ?;", (fingerprint,)):
+                cache_key = (fingerprint, text_hash)
+                if cache_key in jobs:
+                    results[cache_key] = processed
+                else:
+                    stale.append(cache_key)
+
+        misses = [job for cache_key, job in jobs.items() if cache_key not in results]
+        if misses:
+            with util.UmaPool() as pool:
+                for cache_key, processed in tqdm(pool.imap_unordered(_process_text, misses, chunksize=64), total=len(misses), desc="Postprocessing MDB"):
+                    results[cache_key] = processed
+
+        # Drop results of old rules and texts that no longer exist.
+        conn.execute(f"DELETE FROM c WHERE f NOT IN ({','.join('?' * len(fingerprints))});", tuple(fingerprints))
+        conn.executemany("DELETE FROM c WHERE f = ? AND t = ?;", stale)
+        conn.executemany("INSERT OR REPLACE INTO c VALUES (?, ?, ?);", [(*job[0], results[job[0]]) for job in misses])
+        conn.commit()
+    finally:
+        conn.close()
+
+    changed = 0
+    for mdb_json_path, data, entries in mdb_files:
+        for entry, cache_key in entries:
+            processed = results[cache_key]
+            if processed is not None:
+                entry['processed'] = processed
+
+        if util.save_json_if_changed(mdb_json_path, data):
+            changed += 1
+
+    print(f"Postprocessed {len(misses)} of {len(jobs)} texts, {changed} files changed")
 
 def _fix_story(story_data):
     json_data, path = story_data
@@ -260,7 +351,7 @@ def main():
     # do_postprocess()
 
     a = "012345678901234"
-    b = util.get_text_width(a, FONT)
+    b = util.get_text_width(a, get_font())
     print(b)
     # d = scale_to_box(a, 15800, 2)
     # print(d)
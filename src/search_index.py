@@ -0,0 +1,343 @@
+import os
+import re
+import sqlite3
+from collections import namedtuple
+import util
+from tqdm import tqdm
+
+# Full-text index over all editable text, so the editors can search the whole game.
+# Every indexed file is stored with its mtime and size, and only changed files are read again.
+# Rows are (path, kind, key, source, text). The key says where in the file the text is.
+
+SEARCH_INDEX_VERSION = 1
+SEARCH_INDEX_PATH = util.APP_DIR + "search_index.db"
+
+# The trigram tokenizer lets MATCH find any substring of 3 or more characters.
+MIN_MATCH_LENGTH = 3
+
+# Changed files are read in a pool above this count.
+POOL_THRESHOLD = 256
+
+COLUMNS = ("source", "text")
+
+Hit = namedtuple("Hit", ["kind", "path", "key", "source", "text"])
+
+
+def _get_roots():
+    # (kind, folder) of every folder that is indexed.
+    return (
+        ("mdb", util.MDB_FOLDER_EDITING),
+        ("story", util.ASSETS_FOLDER_EDITING + "story"),
+        ("story", util.ASSETS_FOLDER_EDITING + "home"),
+        ("race", util.ASSETS_FOLDER_EDITING + "race"),
+        ("flash", util.FLASH_FOLDER_EDITING),
+        ("assembly", util.ASSEMBLY_FOLDER_EDITING),
+    )
+
+def get_kind(path):
+    path = os.path.normpath(path)
+    for kind, folder in _get_roots():
+        folder = os.path.normpath(folder)
+        if path.startswith(folder + os.sep):
+            return kind
+    return None
+
+
+def _extract_mdb(data):
+    for entry in data:
+        yield entry.get("keys", ""), entry.get("source", ""), entry.get("text", "")
+
+def _extract_story(data):
+    if data.get("type") not in ("story", "race"):
+        return
+
+    if data.get("source_title") or data.get("title"):
+        yield "title", data.get("source_title", ""), data.get("title", "")
+
+    for i, block in enumerate(data.get("data", [])):
+        if not isinstance(block, dict):
+            continue
+
+        if block.get("source_name") or block.get("name"):
+            yield f"{i}.name", block.get("source_name", ""), block.get("name", "")
+
+        yield str(i), block.get("source", ""), block.get("text", "")
+
+        for j, choice in enumerate(block.get("choices") or []):
+            yield f"{i}.choice{j}", choice.get("source", ""), choice.get("text", "")
+
+def _extract_flash(data):
+    for path_id, mpl_dict in data.get("data", {}).items():
+        for mpl_id, tpl_dict in mpl_dict.items():
+            for tp_name, tp_data in tpl_dict.items():
+                source = tp_data.get("source", {}).get("_text", "")
+                text = tp_data.get("tl", {}).get("_text", "")
+                yield f"{path_id}/{mpl_id}/{tp_name}", source, text if text != source else ""
+
+def _extract_assembly(data):
+    if isinstance(data, dict):
+        # JPDict.json
+        for text_id, entry in data.items():
+            yield text_id, entry.get("source", ""), entry.get("text", "")
+        return
+
+    # hashed.json
+    for i, entry in enumerate(data):
+        yield str(i), entry.get("source", ""), entry.get("text", "")
+
+EXTRACTORS = {
+    "mdb": _extract_mdb,
+    "story": _extract_story,
+    "race": _extract_story,
+    "flash": _extract_flash,
+    "assembly": _extract_assembly,
+}
+
+
+def _extract_file(args):
+    path, kind = args
+    try:
+        data = util.load_json(path)
+        rows = [(key, source or "", text or "") for key, source, text in EXTRACTORS[kind](data) if source or text]
+    except Exception as e:
+        print(f"Could not index {path}: {e}")
+        rows = []
+    return path, kind, rows
+
+
+def _open_index():
+    os.makedirs(os.path.dirname(SEARCH_INDEX_PATH), exist_ok=True)
+    conn = sqlite3.connect(SEARCH_INDEX_PATH)
+
+    if conn.execute("PRAGMA user_version;").fetchone()[0] != SEARCH_INDEX_VERSION:
+        conn.execute("DROP TABLE IF EXISTS f;")
+        conn.execute("DROP TABLE IF EXISTS t;")
+        conn.execute(f"PRAGMA user_version = {SEARCH_INDEX_VERSION};")
+
+    conn.execute("CREATE TABLE IF NOT EXISTS f (path TEXT PRIMARY KEY, kind TEXT, mtime REAL, size INTEGER) WITHOUT ROWID;")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS t USING fts5(path UNINDEXED, kind UNINDEXED, key UNINDEXED, source, text, tokenize='trigram');")
+    except sqlite3.OperationalError:
+        # SQLite older than 3.34 has no trigram tokenizer. Searches fall back to scanning.
+        conn.execute("CREATE TABLE IF NOT EXISTS t (path TEXT, kind TEXT, key TEXT, source TEXT, text TEXT);")
+        conn.execute("CREATE INDEX IF NOT EXISTS t_path ON t (path);")
+
+    conn.commit()
+    return conn
+
+def _is_fts(conn):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 't';").fetchone()[0]
+    return "fts5" in sql.lower()
+
+
+def _write_file(conn, path, kind, rows):
+    conn.execute("DELETE FROM t WHERE path = ?;", (path,))
+    conn.executemany("INSERT INTO t (path, kind, key, source, text) VALUES (?, ?, ?, ?, ?);", [(path, kind, *row) for row in rows])
+    stat = os.stat(path)
+    conn.execute("INSERT OR REPLACE INTO f VALUES (?, ?, ?, ?);", (path, kind, stat.st_mtime, stat.st_size))
+
+def _remove_file(conn, path):
+    conn.execute("DELETE FROM t WHERE path = ?;", (path,))
+    conn.execute("DELETE FROM f WHERE path = ?;", (path,))
+
+
+def update_index():
+    # Bring the index up to date with the editing folders. Returns the number of files that were (re)indexed.
+    conn = _open_index()
+    try:
+        known = {path: (mtime, size) for path, mtime, size in conn.execute("SELECT path, mtime, size FROM f;")}
+
+        found = set()
+        changed = []
+        for kind, folder in _get_roots():
+            for root, _, file_names in os.walk(folder):
+                for file_name in file_names:
+                    if not file_name.endswith(".json"):
+                        continue
+                    path = os.path.normpath(os.path.join(root, file_name))
+                    found.add(path)
+                    stat = os.stat(path)
+                    if known.get(path) != (stat.st_mtime, stat.st_size):
+                        changed.append((path, kind))
+
+        for path in known.keys() - found:
+            _remove_file(conn, path)
+
+        if len(changed) > POOL_THRESHOLD:
+            with util.UmaPool() as pool:
+                for path, kind, rows in tqdm(pool.imap_unordered(_extract_file, changed, chunksize=32), total=len(changed), desc="Indexing"):
+                    _write_file(conn, path, kind, rows)
+        else:
+            for job in changed:
+                _write_file(conn, *_extract_file(job))
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    return len(changed)
+
+
+def index_file(path, kind=None):
+    # Reindex a single file after it was saved.
+    path = os.path.normpath(path)
+    kind = kind or get_kind(path)
+    if not kind:
+        return
+
+    conn = _open_index()
+    try:
+        if os.path.exists(path):
+            _write_file(conn, *_extract_file((path, kind)))
+        else:
+            _remove_file(conn, path)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _required_literal(pattern):
+    # Longest run of plain characters that every match of the regex must contain.
+    # Used to narrow a regex search down with the index.
+    if "|" in pattern:
+        return ""
+
+    runs = []
+    run = ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        i += 1
+
+        if char == "\\" and i < len(pattern):
+            char = pattern[i]
+            i += 1
+            if char.isalnum():
+                # Character class or anchor
+                runs.append(run)
+                run = ""
+                continue
+        elif char == "[":
+            runs.append(run)
+            run = ""
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+            continue
+        elif char in "?*{":
+            # The previous character is optional.
+            runs.append(run[:-1])
+            run = ""
+            if char == "{":
+                i = pattern.find("}", i) + 1 or len(pattern)
+            continue
+        elif char in "()":
+            # Groups can be optional, so only top level text counts.
+            runs.append(run)
+            run = ""
+            depth += 1 if char == "(" else -1
+            continue
+        elif char in "+.^$":
+            runs.append(run)
+            run = ""
+            continue
+
+        if depth == 0:
+            run += char
+        elif run:
+            runs.append(run)
+            run = ""
+
+    runs.append(run)
+    return max(runs, key=len)
+
+
+def _fts_phrase(literal):
+    return '"' + literal.replace('"', '""') + '"'
+
+def _like_pattern(literal):
+    return "%" + literal.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _query(conn, literal, columns, kinds):
+    # Rows that contain literal (case-insensitive) in one of the columns.
+    # Rows of every requested kind are returned when literal is empty.
+    args = []
+    where = []
+
+    if literal:
+        if _is_fts(conn) and len(literal) >= MIN_MATCH_LENGTH:
+            where.append("t MATCH ?")
+            args.append("{" + " ".join(columns) + "} : " + _fts_phrase(literal))
+        else:
+            where.append("(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ")")
+            args += [_like_pattern(literal)] * len(columns)
+
+    if kinds:
+        where.append(f"kind IN ({','.join('?' * len(kinds))})")
+        args += list(kinds)
+
+    sql = "SELECT kind, path, key, source, text FROM t"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return conn.execute(sql + ";", args)
+
+
+def search(term, exact=False, columns=COLUMNS, kinds=None, limit=None):
+    # Same rules as the MDB filter: case-insensitive substring or regex match, or the exact text.
+    # The index narrows down the candidates, every hit is checked against the real text.
+    term = term.lower()
+    columns = [column for column in columns if column in COLUMNS]
+    if not columns:
+        return []
+
+    regex = None
+    if not exact:
+        try:
+            regex = re.compile(term)
+        except re.error:
+            # Invalid regex
+            pass
+
+    def is_hit(row):
+        for value in (row[3 + COLUMNS.index(column)].lower() for column in columns):
+            if exact:
+                if value == term:
+                    return True
+                continue
+            if term in value:
+                return True
+            if regex and regex.search(value):
+                return True
+        return False
+
+    literals = [term]
+    if regex:
+        # The pattern can match text that doesn't contain it literally.
+        literal = _required_literal(term)
+        if literal != term:
+            literals.append(literal)
+
+    hits = {}
+    conn = _open_index()
+    try:
+        for literal in literals:
+            for row in _query(conn, literal, columns, kinds):
+                if (row[1], row[2]) in hits or not is_hit(row):
+                    continue
+                hits[(row[1], row[2])] = Hit(*row)
+                if limit and len(hits) >= limit:
+                    return list(hits.values())
+    finally:
+        conn.close()
+
+    return list(hits.values())
+
+
+def search_paths(term, exact=False, columns=COLUMNS, kinds=None):
+    # {path: [hits]} for a search.
+    out = {}
+    for hit in search(term, exact, columns, kinds):
+        out.setdefault(hit.path, []).append(hit)
+    return out
@@ -4,6 +4,9 @@ import copy
 import os
 import argparse
 import sys
+import atexit
+import threading
+from contextlib import contextmanager
 
 default_settings = {
     'client_version': None,
@@ -25,12 +28,25 @@ default_settings = {
     'cj_orig_name': None,
 }
 
+# Settings are kept in memory, the file is only parsed again when something else changed it.
+# Changes are saved together after SAVE_DELAY seconds without new changes, or when a transaction ends.
+SAVE_DELAY = 0.5
+
 class Settings:
     _path = util.SETTINGS_PATH
 
     def __init__(self):
         self.args = self._parse_args()
 
+        self._lock = threading.RLock()
+        self._data = None
+        self._stat = None
+        self._changed = set()
+        self._save_timer = None
+        self._transaction_depth = 0
+
+        atexit.register(self.flush)
+
     @property
     def first_run(self):
         return self['first_run']
@@ -167,7 +183,14 @@ class Settings:
     def cj_orig_name(self, value):
         self['cj_orig_name'] = value
     
-    def _load(self):
+    def _get_stat(self):
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
         # print("Loading settings")
         if not os.path.exists(self._path):
             # print("Settings file not found. Using default.")
@@ -177,36 +200,106 @@ class Settings:
             tmp = json.load(f)
         
         return tmp
+
+    def _load(self):
+        with self._lock:
+            stat = self._get_stat()
+            if self._data is None or stat != self._stat:
+                data = self._read()
+
+                # Unsaved changes win over the file.
+                for key in self._changed:
+                    data[key] = self._data[key]
+
+                self._data = data
+                self._stat = stat
+
+            return self._data
     
-    def _save(self, settings):
+    def _save(self):
         # print("Saving settings")
         new_settings = {}
         for key in default_settings:
-            if key in settings:
-                new_settings[key] = settings[key]
+            if key in self._data:
+                new_settings[key] = self._data[key]
             else:
                 new_settings[key] = default_settings[key]
 
-        with open(self._path, 'w') as f:
+        # Write to a temporary file first, so the settings file is never left half written.
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(new_settings, f, indent=4)
+        os.replace(tmp_path, self._path)
+
+        self._stat = self._get_stat()
+        self._changed.clear()
+
+    def _schedule_save(self):
+        if self._save_timer:
+            self._save_timer.cancel()
+
+        self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def flush(self):
+        # Save pending changes now.
+        with self._lock:
+            if self._save_timer:
+                self._save_timer.cancel()
+                self._save_timer = None
+
+            if not self._changed:
+                return
+
+            # Only the changed keys are written over what is in the file now.
+            self._load()
+            self._save()
+
+    @contextmanager
+    def transaction(self):
+        # Changes made in the block are saved together when it ends.
+        # Other threads can't read or change settings in the meantime.
+        with self._lock:
+            self._transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self._transaction_depth -= 1
+                if not self._transaction_depth:
+                    self.flush()
     
+    def as_dict(self):
+        out = copy.deepcopy(default_settings)
+        with self._lock:
+            out.update(copy.deepcopy(self._load()))
+        return out
+
     def __getitem__(self, key):
         # print(f"Getting setting {key}")
         settings = self._load()
 
         if key in settings:
-            return settings[key]
-        
-        if key in default_settings:
-            return default_settings[key]
-        
-        return None
+            value = settings[key]
+        elif key in default_settings:
+            value = default_settings[key]
+        else:
+            return None
+
+        # Don't hand out the cached dicts.
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
     
     def __setitem__(self, key, value):
         # print(f"Setting {key} to {value}")
-        settings = self._load()
-        settings[key] = value
-        self._save(settings)
+        with self._lock:
+            settings = self._load()
+            settings[key] = copy.deepcopy(value)
+            self._changed.add(key)
+
+            if not self._transaction_depth:
+                self._schedule_save()
     
     def _parse_args(self):
         p = argparse.ArgumentParser()
@@ -215,6 +308,8 @@ class Settings:
         p.add_argument('-f', '--force', action='store_true', help="Force install the patch even if there's no update. DLL name as argument")
         p.add_argument('-u', '--unpatch', action='store_true', help="Uninstall the patch")
         p.add_argument('-c', '--customization', action='store_true', help="Show the customization widget")
+        p.add_argument('-P', '--plan', action='store_true', help="Show what patching would do without changing anything")
+        p.add_argument('--profile-startup', action='store_true', help="Print an import and startup timing tree for the editor, then exit")
 
         return p.parse_args()
     
@@ -236,8 +331,8 @@ def pc(cust_setting):
 
 def filter_mdb_jsons(mdb_jsons):
     filters = {
-        'skill_names': [j for j in mdb_jsons if j.endswith('\\text_data\\47.json')],
-        'skill_descs': [j for j in mdb_jsons if j.endswith('\\text_data\\48.json')],
+        'skill_names': [j for j in mdb_jsons if util.split_mdb_path(j) == ('text_data', '47')],
+        'skill_descs': [j for j in mdb_jsons if util.split_mdb_path(j) == ('text_data', '48')],
     }
     
     filtered_jsons = set()
@@ -0,0 +1,120 @@
+import sys
+import time
+import builtins
+import importlib.util
+from contextlib import contextmanager
+
+# Keeps the editor's cold start cheap: lazy imports, and the --profile-startup timing tree.
+# Import this module first, START_TIME is taken when it loads.
+
+START_TIME = time.perf_counter()
+
+# Seconds from process start to the first shown window.
+STARTUP_BUDGET = 3.0
+
+PROFILE_ARG = "--profile-startup"
+# Timings below this are left out of the tree.
+PROFILE_MIN_MS = 1.0
+
+
+def lazy_import(name):
+    # The module is registered right away, but only runs on first attribute access.
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Profile nodes: [label, seconds, children]
+_profile_stack = []
+_original_import = None
+
+def is_profiling():
+    return bool(_profile_stack)
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    with section(f"import {name}"):
+        return _original_import(name, globals, locals, fromlist, level)
+
+def start_profile():
+    global _original_import
+    if _profile_stack:
+        return
+
+    _profile_stack.append(["startup", 0.0, []])
+    _original_import = builtins.__import__
+    builtins.__import__ = _profiled_import
+
+def start_profile_from_args():
+    if PROFILE_ARG in sys.argv:
+        start_profile()
+
+def stop_profile():
+    # Returns the root node.
+    if not _profile_stack:
+        return None
+
+    builtins.__import__ = _original_import
+    root = _profile_stack[0]
+    root[1] = time.perf_counter() - START_TIME
+    _profile_stack.clear()
+    return root
+
+@contextmanager
+def section(label):
+    # Time a block as a node of the tree. Does nothing unless profiling.
+    if not _profile_stack:
+        yield
+        return
+
+    node = [label, 0.0, []]
+    _profile_stack[-1][2].append(node)
+    _profile_stack.append(node)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        node[1] = time.perf_counter() - start
+        if _profile_stack:
+            _profile_stack.pop()
+
+
+def format_tree(node, depth=0):
+    label, seconds, children = node
+    lines = [f"{'  ' * depth}{seconds * 1000:8.1f} ms  {label}"]
+
+    hidden = 0.0
+    for child in children:
+        if child[1] * 1000 < PROFILE_MIN_MS:
+            hidden += child[1]
+            continue
+        lines += format_tree(child, depth + 1)
+
+    if hidden * 1000 >= PROFILE_MIN_MS:
+        lines.append(f"{'  ' * (depth + 1)}{hidden * 1000:8.1f} ms  (smaller items)")
+
+    return lines
+
+def report():
+    # Call once the first window is shown. Returns whether startup was within budget.
+    elapsed = time.perf_counter() - START_TIME
+
+    root = stop_profile()
+    if root:
+        print("\n".join(format_tree(root)))
+
+    within_budget = elapsed <= STARTUP_BUDGET
+    print(f"Time to first window: {elapsed:.2f}s (budget {STARTUP_BUDGET:.1f}s){'' if within_budget else ' OVER BUDGET'}")
+    return within_budget
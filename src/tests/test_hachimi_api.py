@@ -0,0 +1,153 @@
+import http.server
+import json
+import socket
+import threading
+import time
+import unittest
+
+import hachimi_api
+
+# Run from src: python -m unittest discover -s tests -t .
+
+WAIT_TIMEOUT = 5
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((time.monotonic(), json.loads(body)))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"type": "Ok"}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    # Stand-in for Hachimi's local API. Records the JSON of every POST.
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.received = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class HachimiClientTest(unittest.TestCase):
+    def setUp(self):
+        self.dispatched = []
+        self.server = None
+        self.client = None
+
+    def tearDown(self):
+        if self.client:
+            self.client.close()
+        if self.server:
+            self.server.stop()
+
+    def dispatch(self, func):
+        self.dispatched.append(func)
+        func()
+
+    def make_client(self, url):
+        self.client = hachimi_api.HachimiClient(url, dispatch=self.dispatch)
+        return self.client
+
+    def test_burst_is_coalesced(self):
+        self.server = StubServer()
+        client = self.make_client(self.server.url)
+
+        done = threading.Event()
+        responses = []
+        def callback(response, error):
+            responses.append((response, error))
+            done.set()
+
+        # Hold the queue so the worker can't send any of the burst before it is complete.
+        with client.cond:
+            for block_id in range(20):
+                client.send({"type": "StoryGotoBlock", "block_id": block_id}, callback, coalesce=True)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        time.sleep(0.2)
+
+        self.assertEqual([data for _, data in self.server.received], [{"type": "StoryGotoBlock", "block_id": 19}])
+        self.assertEqual(len(responses), 1)
+
+    def test_callbacks_are_dispatched(self):
+        self.server = StubServer()
+        client = self.make_client(self.server.url)
+
+        done = threading.Event()
+        results = []
+        def callback(response, error):
+            results.append((response, error))
+            done.set()
+
+        client.send({"type": "ReloadLocalizedData"}, callback)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        self.assertEqual(len(self.dispatched), 1)
+
+        response, error = results[0]
+        self.assertIsNone(error)
+        self.assertEqual(response.json(), {"type": "Ok"})
+
+    def test_backoff_while_down(self):
+        port = get_free_port()
+        client = self.make_client(f"http://127.0.0.1:{port}")
+
+        failed = threading.Event()
+        errors = []
+        def callback(response, error):
+            errors.append(error)
+            failed.set()
+
+        client.send({"type": "ReloadLocalizedData"}, callback)
+        self.assertTrue(failed.wait(WAIT_TIMEOUT))
+        self.assertIsInstance(errors[0], hachimi_api.requests.RequestException)
+
+        with client.cond:
+            self.assertEqual(client.failures, 1)
+            backoff_until = client.backoff_until
+        self.assertGreater(backoff_until, time.monotonic())
+
+        # Blocking requests fail right away instead of trying to connect.
+        with self.assertRaises(hachimi_api.HachimiBackoffException):
+            client.request({"type": "ReloadLocalizedData"})
+
+        # Once the game is back, queued requests are only sent after the backoff.
+        self.server = StubServer(port)
+        sent = threading.Event()
+        client.send({"type": "ReloadLocalizedData"}, lambda response, error: sent.set())
+
+        self.assertTrue(sent.wait(WAIT_TIMEOUT))
+        self.assertEqual(len(self.server.received), 1)
+        received_at, _ = self.server.received[0]
+        self.assertGreaterEqual(received_at, backoff_until)
+
+        with client.cond:
+            self.assertEqual(client.failures, 0)
+
+        # And blocking requests work again.
+        self.assertEqual(client.request({"type": "ReloadLocalizedData"}).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
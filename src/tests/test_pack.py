@@ -0,0 +1,61 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import pack
+
+# Run from src: python -m unittest discover -s tests -t .
+
+
+def make_pack(paths, data=b"x"):
+    # A pack with the given entry paths, without the checks write_pack gets from os.walk.
+    index = []
+    offset = 0
+    for path in sorted(paths):
+        index.append([path, offset, len(data), len(data), False, hashlib.sha256(data).hexdigest()])
+        offset += len(data)
+
+    index_bytes = json.dumps(index).encode("utf-8")
+    header = pack.HEADER.pack(pack.MAGIC, pack.FORMAT_VERSION, 0, len(index), len(index_bytes))
+    return header + index_bytes + data * len(index)
+
+
+class PackPathTest(unittest.TestCase):
+    UNSAFE_PATHS = ["../x", "a/../../x", "/x", "C:/x", "C:x", "a//x", "a/./x", "a\\..\\x", ""]
+
+    def test_install_rejects_unsafe_paths(self):
+        with tempfile.TemporaryDirectory() as root:
+            out_folder = os.path.join(root, "out")
+            for path in self.UNSAFE_PATHS:
+                with self.subTest(path=path):
+                    with self.assertRaises(pack.PackFormatException):
+                        pack.install_stream(io.BytesIO(make_pack([path])), out_folder)
+            self.assertEqual(os.listdir(root), [])
+
+    def test_install_writes_nested_paths(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.assertEqual(pack.install_stream(io.BytesIO(make_pack(["a/b.json", "c.json"])), root), 2)
+            with open(os.path.join(root, "a", "b.json"), "rb") as f:
+                self.assertEqual(f.read(), b"x")
+
+    def test_reader_rejects_unsafe_paths(self):
+        with tempfile.TemporaryDirectory() as root:
+            pack_path = os.path.join(root, "bad.cpak")
+            with open(pack_path, "wb") as f:
+                f.write(make_pack(["../x"]))
+            with self.assertRaises(pack.PackFormatException):
+                pack.PackReader(pack_path)
+
+            with open(pack_path, "wb") as f:
+                f.write(make_pack(["a.json"]))
+            with pack.PackReader(pack_path) as reader:
+                self.assertIn("a.json", reader)
+                self.assertNotIn("../a.json", reader)
+                self.assertNotIn("b/../a.json", reader)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import importlib.util
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+import startup
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_TIMEOUT = 120
+
+FIRST_WINDOW_RE = re.compile(r"Time to first window: ([\d.]+)s")
+
+
+def make_editor_tree(root):
+    # The least the editor needs to open its window: the UI font, the
+    # story folders, the name tables of the gacha tab and a master.mdb.
+    import benchmark
+    benchmark._make_font(os.path.join(root, "editing", "mdb", "font", "dynamic01.otf"), np.random.default_rng(0))
+
+    for folder in ("story", "home"):
+        os.makedirs(os.path.join(root, "editing", "assets", folder))
+
+    text_data = os.path.join(root, "editing", "mdb", "text_data")
+    os.makedirs(text_data)
+    for category in ("5", "170"):
+        with open(os.path.join(text_data, f"{category}.json"), "w", encoding="utf-8") as f:
+            f.write("[]")
+
+    os.makedirs(os.path.join(root, "game", "master"))
+    sqlite3.connect(os.path.join(root, "game", "master", "master.mdb")).close()
+
+
+# Every folder the editor reads or writes, see environment.py.
+FOLDERS = {
+    "app_dir": "app",
+    "editing_dir": "editing",
+    "translations_dir": "translations",
+    "game_data_dir": "game",
+    "tmp_dir": "tmp",
+    "temp_dir": "temp",
+    "hachimi_export_dir": "hachimi",
+}
+
+def get_env(root):
+    env = dict(os.environ)
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    for name, folder in FOLDERS.items():
+        env["CAROTENE_" + name.upper()] = os.path.join(root, folder)
+    return env
+
+
+@unittest.skipUnless(importlib.util.find_spec("PyQt5"), "PyQt5 is not installed")
+class StartupBudgetTest(unittest.TestCase):
+    def test_first_window_within_budget(self):
+        with tempfile.TemporaryDirectory() as root:
+            make_editor_tree(root)
+
+            result = subprocess.run(
+                [sys.executable, "_gui.py", startup.PROFILE_ARG],
+                cwd=SRC_DIR,
+                env=get_env(root),
+                capture_output=True,
+                text=True,
+                timeout=GUI_TIMEOUT,
+            )
+
+        match = FIRST_WINDOW_RE.search(result.stdout)
+        self.assertIsNotNone(match, f"No startup report:\n{result.stdout}\n{result.stderr}")
+
+        elapsed = float(match.group(1))
+        self.assertLessEqual(elapsed, startup.STARTUP_BUDGET, f"Time to first window over budget:\n{result.stdout}")
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
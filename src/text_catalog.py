@@ -0,0 +1,122 @@
+import os
+import json
+import util
+
+
+class TextDataCatalog:
+    # The editing text_data/<category>.json files.
+    # Categories are loaded on first use, edits are tracked and only changed categories are saved.
+    def __init__(self, folder=None):
+        self.folder = folder or os.path.join(util.MDB_FOLDER_EDITING, "text_data")
+        self._categories = {}
+        self._modified = {}
+
+    def get_path(self, category):
+        return os.path.join(self.folder, f"{category}.json")
+
+    def exists(self, category):
+        return str(category) in self._categories or os.path.exists(self.get_path(category))
+
+    def _load(self, category):
+        category = str(category)
+        path = self.get_path(category)
+        loaded = self._categories.get(category)
+
+        if loaded and (category in self._modified or (os.path.exists(path) and loaded["mtime"] == os.path.getmtime(path))):
+            return loaded
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File {path} does not exist.")
+
+        entries = util.load_json(path)
+        keys = []
+        key_index = {}
+        hash_index = {}
+        for entry in entries:
+            entry_keys = tuple(tuple(key) for key in json.loads(entry["keys"]))
+            keys.append(entry_keys)
+            for key in entry_keys:
+                key_index[key] = entry
+            if entry.get("hash"):
+                hash_index[entry["hash"]] = entry
+
+        loaded = {
+            "mtime": os.path.getmtime(path),
+            "entries": entries,
+            "keys": keys,
+            "key_index": key_index,
+            "hash_index": hash_index,
+            "text_index": None,
+        }
+        self._categories[category] = loaded
+        return loaded
+
+    def entries(self, category):
+        return self._load(category)["entries"]
+
+    def items(self, category):
+        # (keys, entry) pairs, with keys as a tuple of key tuples.
+        loaded = self._load(category)
+        return zip(loaded["keys"], loaded["entries"])
+
+    def get(self, category, index):
+        return self._load(category)["key_index"].get((int(category), int(index)))
+
+    def get_by_hash(self, category, hash):
+        return self._load(category)["hash_index"].get(hash)
+
+    def text_index(self, category):
+        # {last key value: text} for every translated entry.
+        loaded = self._load(category)
+        if loaded["text_index"] is None:
+            index = {}
+            for entry_keys, entry in zip(loaded["keys"], loaded["entries"]):
+                if entry["text"]:
+                    for key in entry_keys:
+                        index[key[-1]] = entry["text"]
+            loaded["text_index"] = index
+        return loaded["text_index"]
+
+    def update(self, category, entry, **fields):
+        # Set fields of an entry. Returns True if anything changed.
+        changed = False
+        for field, value in fields.items():
+            if field not in entry or entry[field] != value:
+                entry[field] = value
+                changed = True
+
+        if changed:
+            category = str(category)
+            self._modified.setdefault(category, {})[id(entry)] = entry
+            if "text" in fields:
+                self._categories[category]["text_index"] = None
+
+        return changed
+
+    def modified(self, category=None):
+        if category is None:
+            return {cat: list(entries.values()) for cat, entries in self._modified.items()}
+        return list(self._modified.get(str(category), {}).values())
+
+    def save(self):
+        # Write back the categories that were changed. Returns the number of files written.
+        for category in self._modified:
+            loaded = self._categories[category]
+            path = self.get_path(category)
+            util.save_json(path, loaded["entries"])
+            loaded["mtime"] = os.path.getmtime(path)
+
+        count = len(self._modified)
+        self._modified = {}
+        return count
+
+
+SHARED_CATALOG = None
+def get_shared_catalog():
+    # Read-mostly catalog for the GUI. Categories are reloaded when their file changes on disk.
+    global SHARED_CATALOG
+
+    if not SHARED_CATALOG:
+        SHARED_CATALOG = TextDataCatalog()
+
+    return SHARED_CATALOG
@@ -2,10 +2,12 @@ from PyQt5 import QtCore
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
+from PyQt5 import sip
 import math
+import traceback
 import util
 import os
-import json
+import text_catalog
 
 MDB_CAT_NAMES = {
     "text_data": {
@@ -317,15 +319,14 @@ def get_mdb_cat_names():
 
     if not MDB_CAT_NAMES_LOADED:
         MDB_CAT_NAMES_LOADED = True
-        chara_json = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "170.json")
-        if not os.path.exists(chara_json):
-            raise FileNotFoundError(f"Json not found: {chara_json}")
+        catalog = text_catalog.get_shared_catalog()
+        if not catalog.exists(170):
+            raise FileNotFoundError(f"Json not found: {catalog.get_path(170)}")
         
         MDB_CAT_NAMES["character_system_text"] = {}
 
-        chara_data = util.load_json(chara_json)
-        for chara in chara_data:
-            chara_id = str(json.loads(chara['keys'])[0][-1])
+        for keys, chara in catalog.items(170):
+            chara_id = str(keys[0][-1])
             chara_name = chara.get("text", "")
             MDB_CAT_NAMES["character_system_text"][chara_id] = chara_name
 
@@ -380,4 +381,54 @@ def uma_font(font_size=8, weight=QFont.Weight.Normal, italic=False):
     font.setStyleStrategy(QFont.PreferAntialias)
     # font.setHintingPreference(QFont.PreferNoHinting)
 
-    return font
\ No newline at end of file
+    return font
+
+class UiDispatcher(QObject):
+    # Calls functions on the UI thread, from any thread.
+    call = pyqtSignal(object)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.call.connect(lambda func: func())
+
+    def __call__(self, func):
+        self.call.emit(func)
+
+UI_DISPATCHER = None
+def get_ui_dispatcher():
+    # Create on the UI thread.
+    global UI_DISPATCHER
+    if not UI_DISPATCHER:
+        UI_DISPATCHER = UiDispatcher()
+    return UI_DISPATCHER
+
+
+class _BackgroundTask(QRunnable):
+    def __init__(self, func, callback, owner, dispatcher):
+        super().__init__()
+        self.func = func
+        self.callback = callback
+        self.owner = owner
+        self.dispatcher = dispatcher
+
+    def run(self):
+        try:
+            result = self.func()
+        except Exception:
+            traceback.print_exc()
+            return
+
+        if self.callback:
+            self.dispatcher(lambda: self._deliver(result))
+
+    def _deliver(self, result):
+        # The widget may have been closed in the meantime.
+        if self.owner is not None and sip.isdeleted(self.owner):
+            return
+        self.callback(result)
+
+def run_in_background(func, callback=None, owner=None):
+    # Runs func on Qt's global thread pool, then callback(result) on the UI thread.
+    # For short loads that shouldn't freeze a widget. Pipelines go through ui.jobs.
+    task = _BackgroundTask(func, callback, owner, get_ui_dispatcher())
+    QThreadPool.globalInstance().start(task)
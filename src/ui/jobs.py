@@ -0,0 +1,213 @@
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+import traceback
+import startup
+util = startup.lazy_import("util")
+
+# Runs long pipelines off the UI thread.
+# A job is a list of (label, function) tasks that run in order. Cancelling stops a job before its next task.
+# The cleanup function of a job runs however it ends: finished, failed or cancelled.
+# Jobs run one at a time, because the pipelines work on the same files.
+# Progress bars report events through util.report_progress, pool workers included, which are sent on as progress signals.
+
+JOB_PANEL_HEIGHT = 56
+
+
+class JobCancelledException(Exception):
+    pass
+
+
+class Job(QObject):
+    # Emitted from the worker thread, delivered on the UI thread.
+    progress = pyqtSignal(dict)
+    finished = pyqtSignal(object)  # Result of the last task
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    ended = pyqtSignal()  # After any of the above
+
+    def __init__(self, name, tasks, key=None, cleanup=None, parent=None):
+        # Queued jobs with the same key are coalesced, only the latest one runs.
+        super().__init__(parent)
+        self.name = name
+        self.tasks = tasks
+        self.key = key
+        self.cleanup = cleanup
+        self.cancel_requested = False
+        self.current_task = None
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def report(self, event):
+        # Called from the job's thread and from util's pool forwarding threads.
+        self.progress.emit(dict(event, job=self.name, task=self.current_task))
+
+    def run(self):
+        result = None
+        util.set_progress_listener(self.report)
+        try:
+            for i, (label, func) in enumerate(self.tasks):
+                if self.cancel_requested:
+                    raise JobCancelledException()
+
+                self.current_task = label
+                self.progress.emit({"type": "task", "job": self.name, "task": label, "index": i, "count": len(self.tasks)})
+                result = func()
+
+        except JobCancelledException:
+            print(f"{self.name} cancelled")
+            self.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(f"{type(e).__name__}: {e}")
+        else:
+            self.finished.emit(result)
+        finally:
+            if self.cleanup:
+                try:
+                    self.cleanup()
+                except Exception:
+                    traceback.print_exc()
+            util.set_progress_listener(None)
+
+        self.ended.emit()
+
+
+class _JobRunnable(QRunnable):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def run(self):
+        self.job.run()
+
+
+class JobRunner(QObject):
+    busy_changed = pyqtSignal(bool)
+    progress = pyqtSignal(dict)
+    failed = pyqtSignal(str, str)  # Job name, error
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+        self.pending = []
+        self.current = None
+        self.current_runnable = None
+
+    def is_busy(self):
+        return self.current is not None
+
+    def submit(self, job):
+        if job.key is not None:
+            for pending in [pending for pending in self.pending if pending.key == job.key]:
+                self.pending.remove(pending)
+                pending.cancelled.emit()
+                pending.ended.emit()
+
+            if self.current and self.current.key == job.key:
+                self.current.cancel()
+
+        self.pending.append(job)
+
+        if not self.current:
+            self.start_next()
+
+        return job
+
+    def cancel(self):
+        # Cancel the running job and everything that is queued.
+        pending = self.pending
+        self.pending = []
+        for job in pending:
+            job.cancelled.emit()
+            job.ended.emit()
+
+        if self.current:
+            self.current.cancel()
+
+    def start_next(self):
+        self.current = None
+        self.current_runnable = None
+
+        if not self.pending:
+            self.busy_changed.emit(False)
+            return
+
+        job = self.pending.pop(0)
+        self.current = job
+        job.progress.connect(self.progress)
+        job.failed.connect(lambda message: self.failed.emit(job.name, message))
+        job.ended.connect(self.start_next)
+
+        self.busy_changed.emit(True)
+
+        self.current_runnable = _JobRunnable(job)
+        self.current_runnable.setAutoDelete(False)
+        self.pool.start(self.current_runnable)
+
+
+class JobPanel(QWidget):
+    # Shows the running job, hidden while nothing runs.
+    def __init__(self, runner, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.runner = runner
+        self.task_text = ""
+
+        self.setupUi(self)
+        self.setFixedHeight(JOB_PANEL_HEIGHT)
+        self.hide()
+
+        runner.progress.connect(self.on_progress)
+        runner.busy_changed.connect(self.on_busy_changed)
+        runner.failed.connect(self.on_failed)
+
+    def on_busy_changed(self, busy):
+        if busy:
+            self.btn_cancel.setEnabled(True)
+            self.progress_bar.setRange(0, 0)
+        self.setVisible(busy)
+
+    def on_progress(self, event):
+        if event["type"] == "task":
+            self.task_text = f"{event['job']}: {event['task']} ({event['index'] + 1}/{event['count']})"
+            self.lbl_task.setText(self.task_text)
+            self.progress_bar.setRange(0, 0)
+            return
+
+        if event["total"]:
+            self.progress_bar.setRange(0, int(event["total"]))
+            self.progress_bar.setValue(int(event["n"]))
+        else:
+            self.progress_bar.setRange(0, 0)
+
+        if event["desc"]:
+            self.lbl_task.setText(f"{self.task_text} - {event['desc']}")
+
+    def on_failed(self, job_name, message):
+        QMessageBox.warning(self, job_name, f"{job_name} failed:\n{message}")
+
+    def cancel_clicked(self):
+        self.btn_cancel.setEnabled(False)
+        self.lbl_task.setText(f"{self.task_text} - Cancelling after this step...")
+        self.runner.cancel()
+
+    def setupUi(self, job_panel):
+        job_panel.setObjectName(u"job_panel")
+        self.gridLayout = QGridLayout(job_panel)
+        self.gridLayout.setContentsMargins(0, 0, 0, 0)
+        self.lbl_task = QLabel(job_panel)
+        self.lbl_task.setObjectName(u"lbl_task")
+        self.gridLayout.addWidget(self.lbl_task, 0, 0, 1, 2)
+        self.progress_bar = QProgressBar(job_panel)
+        self.progress_bar.setObjectName(u"progress_bar")
+        self.gridLayout.addWidget(self.progress_bar, 1, 0)
+        self.btn_cancel = QPushButton(job_panel)
+        self.btn_cancel.setObjectName(u"btn_cancel")
+        self.btn_cancel.setText(u"Cancel")
+        self.btn_cancel.clicked.connect(self.cancel_clicked)
+        self.gridLayout.addWidget(self.btn_cancel, 1, 1)
@@ -3,12 +3,17 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 import glob
+import hashlib
 import util
-from PIL import Image, ImageFilter, ImageQt
-import json
+import img_util
+import text_catalog
 import os
 import ui.common as common
 
+# Bump when the thumbnails change, so they are made again.
+THUMBNAIL_VERSION = 1
+THUMBNAIL_CACHE_FOLDER = os.path.join(util.APP_DIR, "gacha_comment_thumbs", "")
+
 class Ui_gacha_comment(QWidget):
     def __init__(self, base_widget=None, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -18,12 +23,17 @@ class Ui_gacha_comment(QWidget):
 
         self.changed = False
 
-        self.img_data = get_img_data_dict()
+        self.img_data, missing_thumbnails = get_img_data_dict()
         self.text_data = {}
+        self.image_rows = []
         self.uma_font = common.uma_font(16)
 
         self.setupUi()
         self.setFixedSize(self.size())
+
+        if missing_thumbnails:
+            # Made in the background, rows show their image once it exists.
+            common.run_in_background(lambda: make_thumbnails(missing_thumbnails), self.load_visible_images, owner=self)
     
     def setupUi(self):
         self.resize(1280, 720)
@@ -52,7 +62,8 @@ class Ui_gacha_comment(QWidget):
             horizontalLayout.setObjectName(u"horizontalLayout")
             lbl_image = QLabel(grp_comment_container)
             lbl_image.setObjectName(u"lbl_image")
-            lbl_image.setPixmap(QPixmap.fromImage(ImageQt.ImageQt(data['image'])))
+            # The image is loaded when the row scrolls into view.
+            self.image_rows.append((grp_comment_container, lbl_image, data['thumbnail']))
 
             lbl_image.setFixedWidth(650)
             lbl_image.setFixedHeight(163)
@@ -86,6 +97,7 @@ class Ui_gacha_comment(QWidget):
         self.verticalLayout_5.addItem(self.verticalSpacer)
 
         self.scrollArea.setWidget(self.scrollAreaWidgetContents_2)
+        self.scrollArea.verticalScrollBar().valueChanged.connect(self.load_visible_images)
 
         self.verticalLayout_4.addWidget(self.scrollArea)
 
@@ -115,6 +127,26 @@ class Ui_gacha_comment(QWidget):
 
         self.verticalLayout_2.addLayout(self.horizontalLayout_2)
 
+    def load_visible_images(self, *args):
+        top = self.scrollArea.verticalScrollBar().value()
+        bottom = top + self.scrollArea.viewport().height()
+
+        not_loaded = []
+        for row in self.image_rows:
+            grp_comment_container, lbl_image, thumbnail = row
+            geometry = grp_comment_container.geometry()
+            if geometry.bottom() < top or geometry.top() > bottom or not os.path.exists(thumbnail):
+                not_loaded.append(row)
+                continue
+            lbl_image.setPixmap(QPixmap(thumbnail))
+
+        self.image_rows = not_loaded
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # The layout is only done once the widget is shown.
+        QTimer.singleShot(0, self.load_visible_images)
+
     def set_changed(self):
         self.changed = True
         self.base_widget.set_changed(self)
@@ -161,52 +193,65 @@ class Ui_gacha_comment(QWidget):
         
         return True
 
-def load_process_image(meta):
-    texture_name = meta['file_name'].rsplit("/",1)[1]
-    support_id = texture_name.rsplit("_",1)[1]
-    file_path = util.ASSETS_FOLDER_EDITING + meta['file_name'] + "/" + texture_name + ".org.png"
+def get_thumbnail_path(meta, file_path):
+    # Thumbnails are keyed by the hash of the source asset.
+    source_key = meta.get('hash')
+    if not source_key:
+        stat = os.stat(file_path)
+        source_key = f"{file_path}:{stat.st_mtime}:{stat.st_size}"
+    key = hashlib.sha1(f"{THUMBNAIL_VERSION}:{source_key}".encode("utf-8")).hexdigest()
+    return THUMBNAIL_CACHE_FOLDER + key + ".png"
 
-    image = Image.open(file_path)
-    image = image.split()[3]  # Get alpha channel only
-    image = image.point(lambda a: 0 if a < 255 else 255)  # Convert to black and white
 
-    # Scale image down 50%
-    image = image.resize((image.width // 2, image.height // 2), Image.Resampling.BICUBIC)
-
-    return (support_id, image)
+def make_thumbnails(missing):
+    print(f"Making {len(missing)} gacha comment thumbnails")
+    with util.UmaPool() as pool:
+        list(pool.imap_unordered(img_util.make_thumbnail, missing, chunksize=8))
 
 
 def load_images():
-    # Load all images.
-    jsons = glob.glob(util.ASSETS_FOLDER_EDITING + "\\gacha\\comment\\**\\*.json")
-    metas = []
+    # {support id: thumbnail path} of all comment images,
+    # and the (image, thumbnail) paths of thumbnails that aren't cached yet.
+    jsons = glob.glob(os.path.join(util.ASSETS_FOLDER_EDITING, "gacha", "comment", "*", "*.json"))
+    os.makedirs(THUMBNAIL_CACHE_FOLDER, exist_ok=True)
+
+    out = {}
+    missing = []
     for file in jsons:
-        data = util.load_json(file)
-        metas.append(data)
+        meta = util.load_json(file)
+        if 'file_name' not in meta:
+            continue
 
-    # TODO: Make this pooled map? Although it goes pretty fast on my machine.
-    out = []
-    for meta in metas:
-        out.append(load_process_image(meta))
-    
-    return {k: v for k, v in out}
+        texture_name = meta['file_name'].rsplit("/",1)[1]
+        support_id = texture_name.rsplit("_",1)[1]
+        file_path = util.ASSETS_FOLDER_EDITING + meta['file_name'] + "/" + texture_name + ".org.png"
+        if not os.path.exists(file_path):
+            continue
+
+        thumbnail_path = get_thumbnail_path(meta, file_path)
+        if not os.path.exists(thumbnail_path):
+            missing.append((file_path, thumbnail_path))
+
+        out[support_id] = thumbnail_path
+
+    return out, missing
 
 
 def get_img_data_dict():
     # Load gacha comment images as well as translations.
-    img_data = load_images()
+    img_data, missing = load_images()
 
     # Load character and outfit names.
     chara_names = load_mdb_file("170")
     outfit_names = load_mdb_file("5")
 
     data_dict = {}
-    for key, img in img_data.items():
+    for key, thumbnail in img_data.items():
         chara_name = chara_names.get(int(key[:4]), "???")
         outfit_name = outfit_names.get(int(key), "[???]")
         name = f"{key} {chara_name} {outfit_name}"
         data_dict[key] = {
-            'image': img,
+            'thumbnail': thumbnail,
             'name': name,
             'comment': ""
         }
@@ -219,15 +264,8 @@ def get_img_data_dict():
         for key, val in tl_data.items():
             data_dict[key]['comment'] = val
 
-    return data_dict
+    return data_dict, missing
 
 def load_mdb_file(mdb_id):
-    path = util.MDB_FOLDER_EDITING + f"\\text_data\\{mdb_id}.json"
-    data = util.load_json(path)
-    out = {}
-
-    for entry in data:
-        keys = json.loads(entry['keys'])
-        out[keys[0][-1]] = entry['text']
-    
-    return out
+    # Built once by the shared catalog, until the file changes.
+    return text_catalog.get_shared_catalog().text_index(mdb_id)
@@ -2,11 +2,14 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtWidgets import QWidget
-import _patch
-import _unpatch
-import _update_local
-import _prepare_release
+import startup
 import version
+# The pipelines are only loaded when used.
+_patch = startup.lazy_import("_patch")
+_unpatch = startup.lazy_import("_unpatch")
+_update_local = startup.lazy_import("_update_local")
+_prepare_release = startup.lazy_import("_prepare_release")
+import ui.jobs as jobs
 
 class Ui_widget_main(QWidget):
     def __init__(self, *args, base_widget=None, **kwargs):
@@ -17,6 +20,8 @@ class Ui_widget_main(QWidget):
         self.setupUi(self)
         self.setFixedSize(self.size())
 
+        self.base_widget.jobs.busy_changed.connect(self.set_busy)
+
     def check_patched(self):
         cur_ver = _patch.get_current_patch_ver()
         if cur_ver:
@@ -26,24 +31,36 @@ class Ui_widget_main(QWidget):
             self.lbl_patch_status_indicator.setStyleSheet(u"background-color: rgb(255, 0, 0);")
             self.lbl_patch_status_2.setText(u"Unpatched")
     
+    def set_busy(self, busy):
+        for button in (self.btn_patch, self.btn_revert, self.btn_index, self.btn_commit):
+            button.setEnabled(not busy)
+
     def index_clicked(self):
-        self.base_widget.refresh_widgets(_update_local.main)
-        self.check_patched()
+        job = self.base_widget.refresh_widgets("Index", _update_local.TASKS)
+        if job:
+            job.ended.connect(self.check_patched)
     
     def commit_clicked(self):
-        self.base_widget.refresh_widgets(_prepare_release.main)
+        self.base_widget.refresh_widgets("Commit", _prepare_release.TASKS)
 
     def patch_clicked(self):
-        self.setCursor(Qt.WaitCursor)
-        _patch.main()
-        self.check_patched()
-        self.unsetCursor()
+        job = jobs.Job("Patch", [("Planning", lambda: _patch.main(plan_only=True))])
+        job.finished.connect(self.confirm_patch)
+        self.base_widget.jobs.submit(job)
+
+    def confirm_patch(self, plan):
+        ret = QMessageBox.question(self, "Patch", _patch.format_plan(plan) + "\n\nContinue patching?")
+        if ret != QMessageBox.Yes:
+            return
+
+        job = jobs.Job("Patch", _patch.get_tasks(), cleanup=_patch.stop_prefetch)
+        job.ended.connect(self.check_patched)
+        self.base_widget.jobs.submit(job)
 
     def revert_clicked(self):
-        self.setCursor(Qt.WaitCursor)
-        _unpatch.main()
-        self.check_patched()
-        self.unsetCursor()
+        job = jobs.Job("Revert", _unpatch.TASKS)
+        job.ended.connect(self.check_patched)
+        self.base_widget.jobs.submit(job)
 
     def setupUi(self, widget_main):
         if not widget_main.objectName():
@@ -129,7 +146,8 @@ class Ui_widget_main(QWidget):
 
         QMetaObject.connectSlotsByName(widget_main)
 
-        self.check_patched()
+        # Needs _patch, so it waits until the window is up.
+        QTimer.singleShot(0, self.check_patched)
     # setupUi
 
     def retranslateUi(self, widget_main):
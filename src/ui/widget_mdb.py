@@ -3,8 +3,10 @@ from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 from ui.common import *
 import intermediate
+import search_index
+import ui.jobs as jobs
 import util
-import tqdm
+import os
 import re
 
 COLORS = {
@@ -13,6 +15,188 @@ COLORS = {
     'new': QColor(0, 255, 0, 127)
 }
 
+COL_KEYS, COL_SOURCE, COL_TEXT = range(3)
+ENTRY_FONT_SIZE = 16
+ENTRY_LINE_HEIGHT = 23
+
+
+def unescape_text(text):
+    return text.replace('\\r', '\r').replace('\\n', '\n')
+
+def escape_text(text):
+    return text.replace('\r', '\\r').replace('\n', '\\n')
+
+
+class MdbEntryModel(QAbstractTableModel):
+    # Entries of one MDB category. Edits are kept aside until apply_edits is called.
+    edited = pyqtSignal()
+
+    HEADERS = ("Key", "Japanese", "English")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.entries = []
+        self.edits = {}
+        self.font = uma_font(ENTRY_FONT_SIZE)
+
+    def set_entries(self, entries):
+        self.beginResetModel()
+        self.entries = entries
+        self.edits = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def get_text(self, row, column):
+        # Display text, with real newlines.
+        entry = self.entries[row]
+        if column == COL_KEYS:
+            return entry['keys']
+        if column == COL_SOURCE:
+            return unescape_text(entry['source'])
+        if row in self.edits:
+            return unescape_text(self.edits[row])
+        return unescape_text(entry['text'])
+
+    def get_color(self, row):
+        entry = self.entries[row]
+        if entry['edited']:
+            return COLORS['edited']
+        if entry['new']:
+            return COLORS['new']
+        return COLORS[None]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        column = index.column()
+
+        if role in (Qt.DisplayRole, Qt.EditRole, Qt.ToolTipRole):
+            return self.get_text(row, column)
+        if role == Qt.BackgroundRole:
+            return QBrush(self.get_color(row))
+        if role == Qt.FontRole and column != COL_KEYS:
+            return self.font
+        if role == Qt.SizeHintRole:
+            # Based on line count only, so no text has to be laid out.
+            lines = max(self.get_text(row, COL_SOURCE).count('\n'), self.get_text(row, COL_TEXT).count('\n')) + 1
+            return QSize(-1, lines * ENTRY_LINE_HEIGHT + 4)
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == COL_TEXT:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != COL_TEXT:
+            return False
+
+        row = index.row()
+        value = escape_text(value)
+        if value == self.edits.get(row, self.entries[row]['text']):
+            return False
+
+        if value == self.entries[row]['text']:
+            del self.edits[row]
+        else:
+            self.edits[row] = value
+
+        self.dataChanged.emit(index, index)
+        self.edited.emit()
+        return True
+
+    def apply_edits(self):
+        # Write the edits into the entries. Returns the number of changed entries.
+        for row, text in self.edits.items():
+            entry = self.entries[row]
+            entry['prev'] = entry['text']
+            entry['text'] = text
+            entry['new'] = False
+            entry['edited'] = False
+
+        count = len(self.edits)
+        self.edits = {}
+        if count:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.entries) - 1, len(self.HEADERS) - 1))
+        return count
+
+
+class MdbFilterModel(QSortFilterProxyModel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.search_term = ""
+        self.search_regex = None
+        self.exact = False
+        self.columns = (COL_SOURCE, COL_TEXT)
+
+    def set_filter(self, search_term, exact, search_jp, search_en):
+        self.search_term = search_term.lower()
+        self.exact = exact
+        self.columns = [column for column, enabled in ((COL_SOURCE, search_jp), (COL_TEXT, search_en)) if enabled]
+
+        self.search_regex = None
+        if self.search_term and not exact:
+            try:
+                self.search_regex = re.compile(self.search_term)
+            except re.error:
+                # Invalid regex
+                pass
+
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.search_term and not self.exact:
+            return True
+
+        model = self.sourceModel()
+        for column in self.columns:
+            text = model.get_text(source_row, column).lower()
+            if self.exact:
+                if self.search_term == text:
+                    return True
+                continue
+
+            if self.search_term in text:
+                return True
+            if self.search_regex and self.search_regex.search(text):
+                return True
+
+        return False
+
+
+class MdbTextDelegate(QStyledItemDelegate):
+    # Edits translations in place, with support for newlines.
+    def createEditor(self, parent, option, index):
+        editor = QPlainTextEdit(parent)
+        editor.setFont(index.data(Qt.FontRole))
+        editor.setLineWrapMode(QPlainTextEdit.NoWrap)
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setPlainText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.toPlainText(), Qt.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        # Leave room for at least two lines while editing.
+        rect = option.rect
+        rect.setHeight(max(rect.height(), ENTRY_LINE_HEIGHT * 2 + 4))
+        editor.setGeometry(rect)
+
 class Ui_widget_mdb(QWidget):
     def __init__(self, *args, base_widget=None, **kwargs):
         super().__init__(*args, **kwargs)
@@ -25,10 +209,10 @@ class Ui_widget_mdb(QWidget):
         self.current_data = None
 
         self.filter_timer = QTimer()
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.timeout.connect(self._filter)
 
-        self.json_dict = {}
-
-        self.json_has_new = set()
+        self.tree_items = {}
 
         self.setupUi(self)
         self.setFixedSize(self.size())
@@ -64,53 +248,24 @@ class Ui_widget_mdb(QWidget):
         
         return True
     
-    def color_elements(self):
-        if not self.current_data:
-            return
-        
-        for i, entry in enumerate(self.current_data):
-            cur_grp_box = self.verticalLayout.itemAt(i).widget()
-            cur_grp_box.setAutoFillBackground(True)
-
-            palette = cur_grp_box.palette()
-            palette.setColor(QPalette.Background, COLORS[None])
-            if entry['new'] and not entry['edited']:
-                # cur_grp_box.setStyleSheet("background-color: rgba(0, 255, 0, 127);")
-                palette.setColor(QPalette.Background, COLORS['new'])
-
-            if entry['edited']:
-                # cur_grp_box.setStyleSheet("background-color: rgba(255, 127, 0, 127);")
-                palette.setColor(QPalette.Background, COLORS['edited'])
-            
-            cur_grp_box.setPalette(palette)
-
-    def color_tree(self):
-        # Loop over all QTreeWidgetItems including children
-        def recursive_color_tree(item):
-            item.setBackground(0, QBrush(COLORS[None]))
-
-            for i in range(item.childCount()):
-                child = item.child(i)
-                recursive_color_tree(child)
-                if child.data(0, Qt.UserRole + 1):
-                    item.setBackground(0, QBrush(COLORS[child.data(0, Qt.UserRole + 1)]))
-                    item.setData(0, Qt.UserRole + 1, True)
+    def _color_single_item(self, item):
+        # Leaves store their own status, folders take the strongest status of their children.
+        if item.childCount():
+            statuses = {item.child(i).data(0, Qt.UserRole + 1) for i in range(item.childCount())}
+            status = 'new' if 'new' in statuses else 'edited' if 'edited' in statuses else None
+            item.setData(0, Qt.UserRole + 1, status)
 
-            item.setData(0, Qt.UserRole + 1, None)
-            if item.data(0, Qt.UserRole) and any([entry['edited'] for entry in self.json_dict[item.data(0, Qt.UserRole)]]):
-                item.setBackground(0, QBrush(COLORS['edited']))
-                item.setData(0, Qt.UserRole + 1, 'edited')
+        item.setBackground(0, QBrush(COLORS[item.data(0, Qt.UserRole + 1)]))
 
-            if item.data(0, Qt.UserRole) and any([entry['new'] for entry in self.json_dict[item.data(0, Qt.UserRole)]]):
-                item.setBackground(0, QBrush(COLORS['new']))
-                item.setData(0, Qt.UserRole + 1, 'new')
-
-        for i in range(self.tree_categories.topLevelItemCount()):
-            item = self.tree_categories.topLevelItem(i)
-            recursive_color_tree(item)
+    def color_item(self, item):
+        # Recolour an item and its parents.
+        while item:
+            self._color_single_item(item)
+            item = item.parent()
 
     def fill_tree_categories(self):
         self.tree_categories.clear()
+        self.tree_items = {}
 
         categories = intermediate.get_mdb_structure()
 
@@ -139,17 +294,24 @@ class Ui_widget_mdb(QWidget):
 
                     json_path = categories[category]
                     item.setData(0, Qt.UserRole, json_path)
-                    self.json_dict[json_path] = util.load_json(json_path)
-        
-        print("Loading all MDB categories...")
+                    self.tree_items[json_path] = item
+
         recursive_add_categories(self.tree_categories, categories, [])
-        print(self.json_has_new)
-        self.color_tree()
-        print("Done")
 
+        # Colour from the summary index, the jsons themselves are only loaded when opened.
+        summaries = intermediate.get_mdb_summaries(list(self.tree_items.keys()))
+
+        def recursive_color_tree(item):
+            for i in range(item.childCount()):
+                recursive_color_tree(item.child(i))
 
-    def update_text(self, txt):
-        txt.size_change()
+            json_path = item.data(0, Qt.UserRole)
+            if json_path:
+                item.setData(0, Qt.UserRole + 1, intermediate.get_mdb_summary_status(summaries[json_path]))
+            self._color_single_item(item)
+
+        for i in range(self.tree_categories.topLevelItemCount()):
+            recursive_color_tree(self.tree_categories.topLevelItem(i))
 
     def save(self, force=False):
         if not self.current_data:
@@ -157,44 +319,18 @@ class Ui_widget_mdb(QWidget):
 
         if not self.changed:
             return
-        
-        # if not force:
-        #     # Ask for confirmation
-        #     msgbox = QMessageBox()
-        #     msgbox.setIcon(QMessageBox.Question)
-        #     msgbox.setText("Are you sure you want to save?")
-        #     msgbox.setWindowTitle("Save")
-        #     msgbox.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
-        #     msgbox.setDefaultButton(QMessageBox.No)
-        #     ret = msgbox.exec()
-
-        #     if ret != QMessageBox.Yes:
-        #         return
-        
-        # Save
-        cur_data = self.current_data
-        for i, entry in enumerate(cur_data):
-            cur_grp_box = self.verticalLayout.itemAt(i).widget()
-            cur_txt_translation = cur_grp_box.findChild(QTextEdit, "txt_translation")
-            cur_translation = cur_txt_translation.toPlainText().replace('\r', '\\r').replace('\n', '\\n')
-            cur_txt_source = cur_grp_box.findChild(QTextEdit, "txt_source")
-            cur_source = cur_txt_source.toPlainText().replace('\r', '\\r').replace('\n', '\\n')
-
-            # Sanity check
-            if entry['source'] != cur_source:
-                raise Exception(f"Source mismatch: {entry['source']} != {cur_source}")
-
-            if entry['text'] != cur_translation:
-                entry['prev'] = entry['text']
-                entry['text'] = cur_translation
-                entry['new'] = False
-                entry['edited'] = False
-        
-        self.json_dict[self.current_json] = cur_data
-        util.save_json(self.current_json, cur_data)
+
+        self.entry_model.apply_edits()
+
+        util.save_json(self.current_json, self.current_data)
+        summary = intermediate.update_mdb_summary(self.current_json, self.current_data)
+        search_index.index_file(self.current_json, "mdb")
         self.set_unchanged()
-        self.color_elements()
-        self.color_tree()
+
+        item = self.tree_items.get(self.current_json)
+        if item:
+            item.setData(0, Qt.UserRole + 1, intermediate.get_mdb_summary_status(summary))
+            self.color_item(item)
 
 
     def reload(self):
@@ -215,70 +351,71 @@ class Ui_widget_mdb(QWidget):
 
         self.fill_tl_entries(self.current_json, reload_data=True, keep_position=True)
 
-    def _filter(self):
-        if not self.current_data:
+    def resize_visible_rows(self, *args):
+        # Rows only get their real height once they are in view.
+        view = self.tbl_entries
+        first = view.rowAt(0)
+        if first < 0:
             return
 
-        search_term = self.le_searchbar.text().lower()
-
-
-        if self.chk_exact_filter.isChecked():
-            for i in range(self.verticalLayout.count()):
-                cur_grp_box = self.verticalLayout.itemAt(i).widget()
-                cur_txt_translation = cur_grp_box.findChild(QTextEdit, "txt_translation")
-                cur_txt_source = cur_grp_box.findChild(QTextEdit, "txt_source")
-
-                cur_translation = cur_txt_translation.toPlainText().lower()
-                cur_source = cur_txt_source.toPlainText().lower()
+        last = view.rowAt(view.viewport().height())
+        if last < 0:
+            last = self.filter_model.rowCount() - 1
+
+        for row in range(first, last + 1):
+            view.resizeRowToContents(row)
+
+    def filter_tree(self):
+        # With "All" checked, only categories that have hits are shown.
+        term = self.le_searchbar.text()
+        exact = self.chk_exact_filter.isChecked()
+
+        hit_paths = None
+        if self.chk_all_filter.isChecked() and (term or exact):
+            columns = [column for column, enabled in (("source", self.chk_jp_filter.isChecked()), ("text", self.chk_en_filter.isChecked())) if enabled]
+            hit_paths = set(search_index.search_paths(term, exact, columns, kinds=("mdb",)).keys())
+
+        def recursive_filter_tree(item):
+            json_path = item.data(0, Qt.UserRole)
+            if json_path:
+                visible = hit_paths is None or os.path.normpath(json_path) in hit_paths
+            else:
+                visible = False
+                for i in range(item.childCount()):
+                    visible = recursive_filter_tree(item.child(i)) or visible
+                if hit_paths is not None and visible:
+                    item.setExpanded(True)
+
+            item.setHidden(not visible)
+            return visible
 
-                cur_grp_box.hide()
-
-                if self.chk_en_filter.isChecked() and search_term == cur_translation:
-                    cur_grp_box.show()
-                
-                if self.chk_jp_filter.isChecked() and search_term == cur_source:
-                    cur_grp_box.show()
-            return
-
-
-        if not search_term:
-            for i in range(self.verticalLayout.count()):
-                cur_grp_box = self.verticalLayout.itemAt(i).widget()
-                cur_grp_box.show()
-            return
-
-        for i in range(self.verticalLayout.count()):
-            cur_grp_box = self.verticalLayout.itemAt(i).widget()
-            cur_txt_translation = cur_grp_box.findChild(QTextEdit, "txt_translation")
-            cur_txt_source = cur_grp_box.findChild(QTextEdit, "txt_source")
+        for i in range(self.tree_categories.topLevelItemCount()):
+            recursive_filter_tree(self.tree_categories.topLevelItem(i))
 
-            cur_translation = cur_txt_translation.toPlainText().lower()
-            cur_source = cur_txt_source.toPlainText().lower()
+    def all_filter_toggled(self):
+        if self.chk_all_filter.isChecked():
+            # Pick up files that were changed outside the editor, then filter again.
+            job = jobs.Job("Search index", [("Updating", search_index.update_index)], key="search_index")
+            job.finished.connect(self.on_search_index_updated)
+            self.base_widget.jobs.submit(job)
+        self.filter()
 
-            cur_grp_box.hide()
+    def on_search_index_updated(self, _):
+        if self.chk_all_filter.isChecked():
+            self.filter()
 
-            if self.chk_en_filter.isChecked() and search_term in cur_translation:
-                cur_grp_box.show()
-                
-            if self.chk_jp_filter.isChecked() and search_term in cur_source:
-                cur_grp_box.show()
-            
-            # Regex search
-            try:
-                if self.chk_en_filter.isChecked() and re.search(search_term, cur_translation):
-                    cur_grp_box.show()
-                
-                if self.chk_jp_filter.isChecked() and re.search(search_term, cur_source):
-                    cur_grp_box.show()
-            except re.error:
-                # Invalid regex
-                pass
+    def _filter(self):
+        self.filter_model.set_filter(
+            self.le_searchbar.text(),
+            self.chk_exact_filter.isChecked(),
+            self.chk_jp_filter.isChecked(),
+            self.chk_en_filter.isChecked()
+        )
+        self.filter_tree()
+        self.resize_visible_rows()
 
     def filter(self):
         # Debounce
-        self.filter_timer.stop()
-        self.filter_timer.setSingleShot(True)
-        self.filter_timer.timeout.connect(self._filter)
         self.filter_timer.start(250)
 
 
@@ -305,118 +442,19 @@ class Ui_widget_mdb(QWidget):
 
         self.current_json = json_path
 
-        if reload_data:
-            self.json_dict[json_path] = util.load_json(json_path)
-
-        self.current_data = self.json_dict[json_path]
+        # Only the opened category is kept in memory.
+        self.current_data = util.load_json(json_path)
 
         scroll_position = 0
         if keep_position:
-            scroll_position = self.scrollArea.verticalScrollBar().value()
-
-        while self.verticalLayout.count():
-            child = self.verticalLayout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-
-        for entry in tqdm.tqdm(self.current_data, desc="Loading TL Entries"):
-            keys = entry['keys']
-            source = entry['source'].replace('\\r', '\r').replace('\\n', '\n')
-            text = entry['text'].replace('\\r', '\r').replace('\\n', '\n')
-            font = uma_font(16)
-            spacing = -16
-
-            grp_tl_entry = QGroupBox(self.scrollAreaWidgetContents)
-            grp_tl_entry.setObjectName(f"grp_tl_entry_{keys}")
-            grp_tl_entry.setEnabled(True)
-            sizePolicy1 = QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Maximum)
-            sizePolicy1.setHorizontalStretch(0)
-            sizePolicy1.setVerticalStretch(0)
-            sizePolicy1.setHeightForWidth(grp_tl_entry.sizePolicy().hasHeightForWidth())
-            grp_tl_entry.setSizePolicy(sizePolicy1)
-            grp_tl_entry.setMinimumSize(QSize(0, 0))
-            grp_tl_entry.setMaximumWidth(821)
-            grp_tl_entry.setTitle(keys)
-            verticalLayout_2 = QVBoxLayout(grp_tl_entry)
-            verticalLayout_2.setObjectName(u"verticalLayout_2")
-            horizontalLayout = QHBoxLayout()
-            horizontalLayout.setObjectName(u"horizontalLayout")
-            lbl_japanese = QLabel(grp_tl_entry)
-            lbl_japanese.setObjectName(u"lbl_japanese")
-            sizePolicy2 = QSizePolicy(QSizePolicy.Fixed, QSizePolicy.Maximum)
-            sizePolicy2.setHorizontalStretch(0)
-            sizePolicy2.setVerticalStretch(0)
-            sizePolicy2.setHeightForWidth(lbl_japanese.sizePolicy().hasHeightForWidth())
-            lbl_japanese.setSizePolicy(sizePolicy2)
-            lbl_japanese.setMinimumSize(QSize(50, 0))
-            lbl_japanese.setText(u"Japanese")
-            lbl_japanese.setAlignment(Qt.AlignLeading|Qt.AlignLeft|Qt.AlignTop)
-
-            horizontalLayout.addWidget(lbl_japanese)
-
-            txt_source = ExpandingTextEdit(grp_tl_entry)
-            txt_source.setObjectName(u"txt_source")
-            sizePolicy3 = QSizePolicy(QSizePolicy.Preferred, QSizePolicy.Fixed)
-            sizePolicy3.setHorizontalStretch(0)
-            sizePolicy3.setVerticalStretch(0)
-            sizePolicy3.setHeightForWidth(txt_source.sizePolicy().hasHeightForWidth())
-            txt_source.setSizePolicy(sizePolicy3)
-            txt_source.setMinimumSize(QSize(0, 0))
-            txt_source.setMaximumSize(QSize(16777215, 23))
-            txt_source.setReadOnly(True)
-            txt_source.setLineWrapMode(QTextEdit.NoWrap)
-            txt_source.setFont(font)
-            txt_source.textChanged.connect(lambda: self.update_text(txt_source))
-            txt_source.setText(source)
-
-            # txt_source.line_spacing(spacing)
-
-            horizontalLayout.addWidget(txt_source)
-
-
-            verticalLayout_2.addLayout(horizontalLayout)
-
-            horizontalLayout_2 = QHBoxLayout()
-            horizontalLayout_2.setObjectName(u"horizontalLayout_2")
-            lbl_english = QLabel(grp_tl_entry)
-            lbl_english.setObjectName(u"lbl_english")
-            sizePolicy2.setHeightForWidth(lbl_english.sizePolicy().hasHeightForWidth())
-            lbl_english.setSizePolicy(sizePolicy2)
-            lbl_english.setMinimumSize(QSize(50, 0))
-            lbl_english.setText(u"English")
-            lbl_english.setAlignment(Qt.AlignLeading|Qt.AlignLeft|Qt.AlignTop)
-
-            horizontalLayout_2.addWidget(lbl_english)
-
-            txt_translation = ExpandingTextEdit(grp_tl_entry)
-            txt_translation.setObjectName(u"txt_translation")
-            sizePolicy3.setHeightForWidth(txt_translation.sizePolicy().hasHeightForWidth())
-            txt_translation.setSizePolicy(sizePolicy3)
-            txt_translation.setMinimumSize(QSize(0, 0))
-            txt_translation.setMaximumSize(QSize(16777215, 23))
-            txt_translation.setLineWrapMode(QTextEdit.NoWrap)
-            txt_translation.setFont(font)
-
-            txt_translation.textChanged.connect(lambda: self.update_text(txt_translation))
-            txt_translation.textChanged.connect(self.set_changed)
-
-            txt_translation.setText(text)
-            # txt_translation.line_spacing(spacing)
-
-            horizontalLayout_2.addWidget(txt_translation)
-
-
-            verticalLayout_2.addLayout(horizontalLayout_2)
-
-            self.verticalLayout.addWidget(grp_tl_entry)
-
-
-        # self.verticalSpacer = QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Minimum)
-        # self.verticalLayout.addItem(self.verticalSpacer)
-        self.scrollArea.verticalScrollBar().setValue(scroll_position)
+            scroll_position = self.tbl_entries.verticalScrollBar().value()
+
+        # The view only creates what is visible, so this is instant for any category.
+        self.entry_model.set_entries(self.current_data)
+
+        self.resize_visible_rows()
+        self.tbl_entries.verticalScrollBar().setValue(scroll_position)
         self.set_unchanged()
-        self.color_elements()
-        self.color_tree()
 
     def setupUi(self, widget_mdb):
         if not widget_mdb.objectName():
@@ -445,17 +483,30 @@ class Ui_widget_mdb(QWidget):
         self.lbl_category.setObjectName(u"lbl_category")
         self.lbl_category.setGeometry(QRect(10, 10, 231, 21))
         self.lbl_category.setText(u"<html><head/><body><p><span style=\" font-size:10pt; font-weight:600;\">Choose Category</span></p></body></html>")
-        self.scrollArea = QScrollArea(widget_mdb)
-        self.scrollArea.setObjectName(u"scrollArea")
-        self.scrollArea.setGeometry(QRect(250, 40, 861, 671))
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollAreaWidgetContents = QWidget()
-        self.scrollAreaWidgetContents.setObjectName(u"scrollAreaWidgetContents")
-        self.scrollAreaWidgetContents.setGeometry(QRect(0, 0, 859, 669))
-        self.verticalLayout = QVBoxLayout(self.scrollAreaWidgetContents)
-        self.verticalLayout.setObjectName(u"verticalLayout")
-
-        self.scrollArea.setWidget(self.scrollAreaWidgetContents)
+        self.entry_model = MdbEntryModel(widget_mdb)
+        self.entry_model.edited.connect(self.set_changed)
+        self.entry_model.dataChanged.connect(self.resize_visible_rows)
+        self.filter_model = MdbFilterModel(widget_mdb)
+        self.filter_model.setSourceModel(self.entry_model)
+        self.filter_model.layoutChanged.connect(self.resize_visible_rows)
+
+        self.tbl_entries = QTableView(widget_mdb)
+        self.tbl_entries.setObjectName(u"tbl_entries")
+        self.tbl_entries.setGeometry(QRect(250, 40, 861, 671))
+        self.tbl_entries.setModel(self.filter_model)
+        self.tbl_entries.setItemDelegateForColumn(COL_TEXT, MdbTextDelegate(self.tbl_entries))
+        self.tbl_entries.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked | QAbstractItemView.EditKeyPressed | QAbstractItemView.AnyKeyPressed)
+        self.tbl_entries.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tbl_entries.setWordWrap(False)
+        self.tbl_entries.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.tbl_entries.verticalHeader().setVisible(False)
+        self.tbl_entries.verticalHeader().setDefaultSectionSize(ENTRY_LINE_HEIGHT + 4)
+        self.tbl_entries.verticalScrollBar().valueChanged.connect(self.resize_visible_rows)
+        self.tbl_entries.horizontalHeader().setSectionResizeMode(COL_KEYS, QHeaderView.Interactive)
+        self.tbl_entries.horizontalHeader().setSectionResizeMode(COL_SOURCE, QHeaderView.Stretch)
+        self.tbl_entries.horizontalHeader().setSectionResizeMode(COL_TEXT, QHeaderView.Stretch)
+        self.tbl_entries.setColumnWidth(COL_KEYS, 120)
+
         self.grp_actions = QGroupBox(widget_mdb)
         self.grp_actions.setObjectName(u"grp_actions")
         self.grp_actions.setGeometry(QRect(1120, 10, 151, 701))
@@ -475,7 +526,7 @@ class Ui_widget_mdb(QWidget):
 
         self.le_searchbar = QLineEdit(widget_mdb)
         self.le_searchbar.setObjectName(u"le_searchbar")
-        self.le_searchbar.setGeometry(QRect(290, 8, 671, 24))
+        self.le_searchbar.setGeometry(QRect(290, 8, 621, 24))
         font = QFont()
         font.setPointSize(10)
         self.le_searchbar.setFont(font)
@@ -497,12 +548,18 @@ class Ui_widget_mdb(QWidget):
         self.chk_jp_filter.setGeometry(QRect(970, 10, 41, 20))
         self.chk_jp_filter.setText(u"JP")
         self.chk_jp_filter.setChecked(True)
+        self.chk_all_filter = QCheckBox(widget_mdb)
+        self.chk_all_filter.setObjectName(u"chk_all_filter")
+        self.chk_all_filter.setGeometry(QRect(920, 10, 41, 20))
+        self.chk_all_filter.setText(u"All")
+        self.chk_all_filter.setToolTip(u"Search all categories")
 
 
         self.le_searchbar.textChanged.connect(self.filter)
         self.chk_exact_filter.stateChanged.connect(self.filter)
         self.chk_en_filter.stateChanged.connect(self.filter)
         self.chk_jp_filter.stateChanged.connect(self.filter)
+        self.chk_all_filter.stateChanged.connect(self.all_filter_toggled)
 
 
         self.retranslateUi(widget_mdb)
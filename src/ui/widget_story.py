@@ -4,15 +4,19 @@ from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 import util
 import os
-import json
+import text_catalog
 import ui.common as common
 import intermediate
-import _patch
-import postprocess
-import hachimi
+import startup
 import hachimi_api
+import search_index
+import ui.jobs as jobs
 import shutil
 from settings import settings
+# Only needed to apply chapters.
+_patch = startup.lazy_import("_patch")
+postprocess = startup.lazy_import("postprocess")
+hachimi = startup.lazy_import("hachimi")
 import ui.widget_story_utils as sutils
 import ui.widget_story_choices as story_choices
 import ui.widget_story_speakers as story_speakers
@@ -50,6 +54,8 @@ class Ui_story_editor(QWidget):
     font_size = 16
     timeout_ms = 500
     sync_timeout_ms = 200
+    search_timeout_ms = 250
+    search_limit = 1000
 
     def __init__(self, base_widget=None, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -74,23 +80,32 @@ class Ui_story_editor(QWidget):
         self.sync_timeout.setSingleShot(True)
         self.sync_timeout.timeout.connect(self.handle_sync_timeout)
 
+        self.search_timeout = QTimer()
+        self.search_timeout.setSingleShot(True)
+        self.search_timeout.timeout.connect(self._search)
+        self.search_index_updated = False
+        self.search_index_job = None
+
+        hachimi_api.get_client().dispatch = common.get_ui_dispatcher()
+
         self.loaded_chapter = None
         self.loaded_path = None
         self.box_items = []
 
-        self.chara_name_dict = {}
-        json_path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "6.json")
-        chara_name_data = util.load_json(json_path)
-        for entry in chara_name_data:
-            if not entry.get("text"):
-                continue
-            char_id = json.loads(entry["keys"])[0][1]
-            self.chara_name_dict[str(char_id)] = entry["text"]
+        self.chara_name_dict = None
+
+        self.assets_root = os.path.normpath(util.ASSETS_FOLDER_EDITING)
+        # Loaded in the background, the folder percentages are filled in when it's done.
+        self.story_progress = {}
+        self.update_folder_progress()
 
         self.setupUi(self)
         self.set_fonts()
         self.setFixedSize(self.size())
 
+        story_folders = [self.root_dir, util.ASSETS_FOLDER_EDITING + "home"]
+        common.run_in_background(lambda: intermediate.get_story_progress(story_folders), self.on_story_progress_loaded, owner=self)
+
         self.bold_shortcut = QShortcut(QKeySequence("Ctrl+B"), self)
         self.bold_shortcut.activated.connect(lambda: self.selection_toggle_format(self.txt_en_text, bold=True))
         self.italic_shortcut = QShortcut(QKeySequence("Ctrl+I"), self)
@@ -138,7 +153,7 @@ class Ui_story_editor(QWidget):
                 continue
 
             editing_path = full_path[len(self.root_dir) + 1:]
-            segments = editing_path.split("\\")
+            segments = editing_path.split(os.sep)
 
             item_text = os.path.basename(full_path)
 
@@ -155,7 +170,7 @@ class Ui_story_editor(QWidget):
             # Character stories
             elif (len(segments) == 2 and segments[0] in ["04", "50", "80"]) or (home and len(segments[-1]) == 4):
                 # Load character names
-                en_name = self.chara_name_dict.get(segments[-1])
+                en_name = self.get_chara_name(segments[-1])
                 if en_name:
                     item_text = f"{segments[-1]} {en_name}"
 
@@ -168,11 +183,57 @@ class Ui_story_editor(QWidget):
 
             if is_dir:
                 item.setData(0, Qt.UserRole, True)  # Directory
+                item.setData(0, Qt.UserRole + 4, item_text)  # Label without progress
+                self.set_folder_label(item)
                 # If it's a directory, add a dummy item to it
                 dummy = QTreeWidgetItem(item)
                 dummy.setText(0, "Loading...")
                 # item.setData(0, Qt.UserRole + 2, dummy)
 
+    def get_chara_name(self, char_id):
+        # Only loaded once a character folder is shown.
+        if self.chara_name_dict is None:
+            self.chara_name_dict = {}
+            for keys, entry in text_catalog.get_shared_catalog().items(6):
+                if not entry.get("text"):
+                    continue
+                self.chara_name_dict[str(keys[0][1])] = entry["text"]
+
+        return self.chara_name_dict.get(char_id)
+
+    def update_folder_progress(self):
+        # [translated, total] lines per folder, summed from the progress index.
+        self.folder_progress = {}
+        for path, summary in self.story_progress.items():
+            translated = summary["translated"] + summary["choices_translated"]
+            total = summary["blocks"] + summary["choices"]
+            folder = os.path.dirname(path)
+            while folder.startswith(self.assets_root + os.sep):
+                counts = self.folder_progress.setdefault(folder, [0, 0])
+                counts[0] += translated
+                counts[1] += total
+                folder = os.path.dirname(folder)
+
+    def on_story_progress_loaded(self, progress):
+        # Chapters saved while loading are newer.
+        progress.update(self.story_progress)
+        self.story_progress = progress
+        self.update_folder_progress()
+
+        iterator = QTreeWidgetItemIterator(self.treeWidget)
+        while iterator.value():
+            item = iterator.value()
+            if item.data(0, Qt.UserRole):
+                self.set_folder_label(item)
+            iterator += 1
+
+    def set_folder_label(self, item):
+        label = item.data(0, Qt.UserRole + 4)
+        translated, total = self.folder_progress.get(os.path.normpath(item.data(0, Qt.UserRole + 1)), (0, 0))
+        if total:
+            label += f" ({translated * 100 // total}%)"
+        item.setText(0, label)
+
     def on_tree_item_expanded(self, item):
         if item.data(0, Qt.UserRole):
             self.fill_branch(item, item.data(0, Qt.UserRole + 1))
@@ -242,6 +303,93 @@ class Ui_story_editor(QWidget):
                 return
             self.on_tree_item_clicked(prev_item, 0)
 
+    def find_tree_item(self, file_path):
+        # Find the tree item of a chapter, loading the branches on the way.
+        file_path = os.path.normpath(file_path)
+        children = [self.treeWidget.topLevelItem(i) for i in range(self.treeWidget.topLevelItemCount())]
+
+        while children:
+            for child in children:
+                child_path = child.data(0, Qt.UserRole + 1)
+                if not child_path:
+                    continue
+                child_path = os.path.normpath(child_path)
+
+                if child_path == file_path:
+                    return child
+
+                if file_path.startswith(child_path + os.sep) and child.data(0, Qt.UserRole):
+                    self.fill_branch(child, child.data(0, Qt.UserRole + 1))
+                    children = [child.child(i) for i in range(child.childCount())]
+                    break
+            else:
+                return None
+
+        return None
+
+    def search(self):
+        # Debounce
+        self.search_timeout.start(self.search_timeout_ms)
+
+    def _search(self):
+        term = self.le_search.text()
+        if not term:
+            self.lst_search_results.hide()
+            self.treeWidget.show()
+            return
+
+        if not self.search_index_updated:
+            # Pick up files that were changed outside the editor. The search runs again when it's done.
+            if not self.search_index_job:
+                job = jobs.Job("Search index", [("Updating", search_index.update_index)], key="search_index")
+                job.finished.connect(self.on_search_index_updated)
+                job.ended.connect(self.on_search_index_job_ended)
+                self.search_index_job = self.base_widget.jobs.submit(job)
+            return
+
+        hits = search_index.search(term, kinds=("story",), limit=self.search_limit)
+
+        def hit_sort_key(hit):
+            block = hit.key.split(".")[0]
+            return hit.path, int(block) if block.isdigit() else -1, hit.key
+
+        root_dir = os.path.normpath(util.ASSETS_FOLDER_EDITING)
+        self.lst_search_results.clear()
+        for hit in sorted(hits, key=hit_sort_key):
+            chapter = os.path.splitext(os.path.relpath(hit.path, root_dir))[0]
+            preview = (hit.text or hit.source).replace("\n", " ")
+            item = QListWidgetItem(f"{chapter} {hit.key}: {preview}")
+            item.setToolTip(f"{hit.source}\n\n{hit.text}")
+            item.setData(Qt.UserRole, hit.path)
+            item.setData(Qt.UserRole + 1, hit.key)
+            self.lst_search_results.addItem(item)
+
+        self.treeWidget.hide()
+        self.lst_search_results.show()
+
+    def on_search_index_updated(self, _):
+        self.search_index_updated = True
+        self._search()
+
+    def on_search_index_job_ended(self):
+        self.search_index_job = None
+
+    def on_search_result_clicked(self, result: QListWidgetItem):
+        item = self.find_tree_item(result.data(Qt.UserRole))
+        if not item:
+            return
+
+        file_path = item.data(0, Qt.UserRole + 1)
+        if self.marked_item is not item:
+            self.load_chapter(file_path, item)
+            if self.loaded_path != file_path:
+                # Load was cancelled
+                return
+
+        block = result.data(Qt.UserRole + 1).split(".")[0]
+        if block.isdigit() and int(block) in self.box_items:
+            self.cmb_textblock.setCurrentIndex(self.box_items.index(int(block)))
+
     def ask_close(self):
         return self.ask_save()
 
@@ -409,7 +557,15 @@ class Ui_story_editor(QWidget):
         self.loaded_chapter["title"] = sutils.get_text(self.txt_chapter_name)
 
         util.save_json(self.loaded_path, self.loaded_chapter)
+        search_index.index_file(self.loaded_path, "story")
+        self.story_progress[os.path.normpath(self.loaded_path)] = intermediate.update_story_progress(self.loaded_path, self.loaded_chapter)
+        self.update_folder_progress()
         self.set_unchanged()
+
+        item = self.marked_item.parent()
+        while item:
+            self.set_folder_label(item)
+            item = item.parent()
     
     def handle_save_timeout(self):
         # print("Save timeout")
@@ -482,35 +638,41 @@ class Ui_story_editor(QWidget):
         settings.autosave_story_editor = self.chkb_autosave.isChecked()
 
     
+    def get_apply_chapter_tasks(self, editing_path):
+        tl_path = util.ASSETS_FOLDER + editing_path[len(util.ASSETS_FOLDER_EDITING):]
+
+        def convert_chapter():
+            intermediate.process_asset(editing_path)
+            postprocess._fix_story((util.load_json(tl_path), tl_path))
+            # _patch._import_story(util.load_json(tl_path))
+            hachimi.convert_stories([[util.load_json(tl_path), tl_path]])
+
+        def copy_to_game():
+            file_name = util.load_json(tl_path)['file_name']
+            game_path = util.get_game_folder()
+            local_out_path = os.path.join(hachimi.HACHIMI_ROOT, "assets", file_name + ".json")
+            out_path = os.path.join(game_path, "hachimi", "localized_data", "assets", file_name + ".json")
+            out_folder = os.path.dirname(out_path)
+            os.makedirs(out_folder, exist_ok=True)
+            shutil.copy(local_out_path, out_path)
+            print(out_path)
+            # res = hachimi_api.reload_localized_data(blocking=True)
+            # print(res.text)
+
+        return [
+            ("Converting chapter", convert_chapter),
+            ("Copying to game", copy_to_game),
+        ]
+
     def apply_chapter(self):
         if not self.loaded_chapter:
             return
-        
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        self.btn_apply_chapter.setEnabled(False)
-        
+
         self.save_chapter()
 
-        # Patch the chapter
-        editing_path = self.loaded_path
-        tl_path = util.ASSETS_FOLDER + editing_path[len(util.ASSETS_FOLDER_EDITING):]
-        intermediate.process_asset(editing_path)
-        postprocess._fix_story((util.load_json(tl_path), tl_path))
-        # _patch._import_story(util.load_json(tl_path))
-        tl_data = util.load_json(tl_path)
-        hachimi.convert_stories([[tl_data, tl_path]])
-        game_path = util.get_game_folder()
-        local_out_path = os.path.join(hachimi.HACHIMI_ROOT, "assets", tl_data['file_name'] + ".json")
-        out_path = os.path.join(game_path, "hachimi", "localized_data", "assets", tl_data['file_name'] + ".json")
-        out_folder = os.path.dirname(out_path)
-        os.makedirs(out_folder, exist_ok=True)
-        shutil.copy(local_out_path, out_path)
-        print(out_path)
-        # res = hachimi_api.reload_localized_data(blocking=True)
-        # print(res.text)
-
-        self.btn_apply_chapter.setEnabled(True)
-        QApplication.restoreOverrideCursor()
+        # Runs in the background. Applying again before it is done only applies the latest save.
+        job = jobs.Job("Apply chapter", self.get_apply_chapter_tasks(self.loaded_path), key=("apply_chapter", self.loaded_path))
+        self.base_widget.jobs.submit(job)
 
     def unpatch_chapter(self):
         if not self.loaded_chapter:
@@ -645,7 +807,16 @@ class Ui_story_editor(QWidget):
         if not cur_block_id:
             return
         
-        hachimi_api.story_goto_block(cur_block_id, incremental=True)
+        # Bursts of block changes only send the latest block.
+        hachimi_api.story_goto_block(cur_block_id, incremental=True, callback=self.on_goto_game_response)
+
+    def on_goto_game_response(self, response, error):
+        if error:
+            self.chkb_sync_game.setStyleSheet(u"color: rgb(200, 0, 0);")
+            self.chkb_sync_game.setToolTip(u"Could not reach the game. Is it running with Hachimi?")
+        else:
+            self.chkb_sync_game.setStyleSheet(u"")
+            self.chkb_sync_game.setToolTip(u"")
 
     def handle_sync_change(self):
         if self.chkb_sync_game.isChecked():
@@ -709,17 +880,8 @@ class Ui_story_editor(QWidget):
         self.btn_goto_choices.setEnabled(next_untranslated_choice is not None)
         self.btn_goto_dialogue.setEnabled(next_untranslated is not None)
 
-    def recursive_find_all_child_stories(self, item, out_list):
-        self.on_tree_item_expanded(item)
-        for i in range(item.childCount()):
-            child = item.child(i)
-            if child.data(0, Qt.UserRole):
-                self.recursive_find_all_child_stories(child, out_list)
-            else:
-                out_list.append(child)
-
-    def context_goto_next_untranslated_block(self):
-        """Finds all children of the current item and goes to the next untranslated block"""
+    def goto_next_untranslated(self, field):
+        # Open the first chapter in the selected folder that has an untranslated block or choice.
         item = self.treeWidget.currentItem()
 
         if not item:
@@ -728,49 +890,34 @@ class Ui_story_editor(QWidget):
         is_directory = item.data(0, Qt.UserRole)
         if not is_directory:
             return
-        
-        children = []
-        self.recursive_find_all_child_stories(item, children)
 
-        for child in children:
-            file_path = child.data(0, Qt.UserRole + 1)
-            if not file_path:
+        folder = os.path.normpath(item.data(0, Qt.UserRole + 1))
+
+        for path in sorted(self.story_progress):
+            if not path.startswith(folder + os.sep):
                 continue
-            chapter_data = util.load_json(file_path)
-            for i, block in enumerate(chapter_data["data"]):
-                if block.get("source") and not block.get("text"):
-                    self.load_chapter(file_path, child)
-                    index = self.box_items.index(i)
-                    self.cmb_textblock.setCurrentIndex(index)
-                    return
-    
-    def context_goto_next_untranslated_choice(self):
-        """Finds all children of the current item and goes to the next untranslated choice block"""
-        item = self.treeWidget.currentItem()
 
-        if not item:
-            return
-        
-        is_directory = item.data(0, Qt.UserRole)
-        if not is_directory:
-            return
-        
-        children = []
-        self.recursive_find_all_child_stories(item, children)
+            block_index = self.story_progress[path][field]
+            if block_index is None:
+                continue
 
-        for child in children:
-            file_path = child.data(0, Qt.UserRole + 1)
-            if not file_path:
+            child = self.find_tree_item(path)
+            if not child:
                 continue
-            chapter_data = util.load_json(file_path)
-            for i, block in enumerate(chapter_data["data"]):
-                if block.get("choices"):
-                    for choice in block["choices"]:
-                        if choice.get("source") and not choice.get("text"):
-                            self.load_chapter(file_path, child)
-                            index = self.box_items.index(i)
-                            self.cmb_textblock.setCurrentIndex(index)
-                            return
+
+            file_path = child.data(0, Qt.UserRole + 1)
+            self.load_chapter(file_path, child)
+            if self.loaded_path == file_path and block_index in self.box_items:
+                self.cmb_textblock.setCurrentIndex(self.box_items.index(block_index))
+            return
+
+    def context_goto_next_untranslated_block(self):
+        """Goes to the first untranslated block in the current folder"""
+        self.goto_next_untranslated("first_block")
+    
+    def context_goto_next_untranslated_choice(self):
+        """Goes to the first untranslated choice block in the current folder"""
+        self.goto_next_untranslated("first_choice")
 
     
     def on_tree_context_menu(self, pos):
@@ -829,7 +976,21 @@ class Ui_story_editor(QWidget):
 
 
         self.treeWidget.setObjectName(u"treeWidget")
-        self.treeWidget.setGeometry(QRect(10, 40, 251, 411))
+        self.treeWidget.setGeometry(QRect(10, 70, 251, 381))
+
+        self.le_search = QLineEdit(story_editor)
+        self.le_search.setObjectName(u"le_search")
+        self.le_search.setGeometry(QRect(10, 40, 251, 24))
+        self.le_search.setPlaceholderText(u"Search all stories")
+        self.le_search.setClearButtonEnabled(True)
+        self.le_search.textChanged.connect(self.search)
+
+        self.lst_search_results = QListWidget(story_editor)
+        self.lst_search_results.setObjectName(u"lst_search_results")
+        self.lst_search_results.setGeometry(QRect(10, 70, 251, 381))
+        self.lst_search_results.itemClicked.connect(self.on_search_result_clicked)
+        self.lst_search_results.hide()
+
         self.grp_actions = QGroupBox(story_editor)
         self.grp_actions.setObjectName(u"grp_actions")
         self.grp_actions.setGeometry(QRect(1059, 0, 211, 461))
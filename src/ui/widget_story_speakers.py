@@ -4,18 +4,18 @@ from PyQt5.QtWidgets import *
 import ui.common as common
 import ui.widget_story_utils as sutils
 import util
+import text_catalog
 import os
 import copy
 
 def generate_autofill_dict():
-    path = os.path.join(util.MDB_FOLDER_EDITING, "text_data", "170.json")
-    data = util.load_json(path)
+    data = text_catalog.get_shared_catalog().entries(170)
 
     autofill_dict = copy.deepcopy(common.SPEAKER_AUTOFILL)
 
     for entry in data:
         if not entry.get("text"):
-            return
+            continue
         
         text = entry["text"]
         source = entry["source"]
@@ -24,9 +24,13 @@ def generate_autofill_dict():
     return autofill_dict
 
 class Ui_story_speakers(QDialog):
-    autofill_dict = generate_autofill_dict()
+    # Made when the dialog is first opened.
+    autofill_dict = None
 
     def __init__(self, speakers_list, focus_name, *args, **kwargs):
+        if Ui_story_speakers.autofill_dict is None:
+            Ui_story_speakers.autofill_dict = generate_autofill_dict()
+
         self.text_widgets = []
         self.speakers_list = speakers_list
         self.focus_name = focus_name
@@ -3,52 +3,10 @@ from PyQt5.QtGui import *
 from PyQt5.QtGui import QMouseEvent
 from PyQt5.QtWidgets import *
 import time
+import markup
 
 def str_to_char_data(text: str) -> list:
-    in_tag = False
-    tag_active = False
-
-    text_chars = []
-
-    cur_tags = []
-    cur_tag = ""
-
-    for char in text:
-        is_bold = False
-        is_italic = False
-
-        if char == "<":
-            in_tag = True
-            tag_active = True
-            cur_tag = ""
-            continue
-
-        if in_tag and char == "/":
-            tag_active = False
-            continue
-
-        if in_tag and char == ">":
-            in_tag = False
-
-            if not tag_active:
-                cur_tags.pop()
-            else:
-                cur_tags.append(cur_tag)
-            continue
-
-        if in_tag:
-            cur_tag += char
-            continue
-
-        if "b" in cur_tags:
-            is_bold = True
-
-        if "i" in cur_tags:
-            is_italic = True
-
-        text_chars.append((char, is_bold, is_italic))
-    
-    return text_chars
+    return list(markup.to_char_data(text))
 
 def char_data_to_str(char_data: list) -> str:
     # Reconstruct the text
@@ -7,6 +7,11 @@ import ui.widget_main as widget_main
 import ui.widget_mdb as widget_mdb
 import ui.widget_story as widget_story
 import ui.widget_gacha_comment as widget_gacha_comment
+import ui.jobs as jobs
+import startup
+
+# How long closing waits for a cancelled job before letting it finish in the background.
+CLOSE_WAIT_MS = 2000
 
 class Ui_widget_tabs(QWidget):
     def __init__(self, app, *args, **kwargs) -> None:
@@ -14,6 +19,9 @@ class Ui_widget_tabs(QWidget):
 
         self.app = app
 
+        self.jobs = jobs.JobRunner(self)
+        self.close_pending = False
+
         self.setupUi(self)
         self.tabWidget.currentChanged.connect(self.tab_changed)
         self.adjust_size()
@@ -45,6 +53,9 @@ class Ui_widget_tabs(QWidget):
         current_size.setWidth(current_size.width() + 28)
         current_size.setHeight(current_size.height() + 48)
 
+        if self.job_panel.isVisibleTo(self):
+            current_size.setHeight(current_size.height() + self.job_panel.height() + self.verticalLayout.spacing())
+
         print(current_size)
         self.setFixedSize(current_size)
     
@@ -68,7 +79,8 @@ class Ui_widget_tabs(QWidget):
             self.tabWidget.removeTab(self.tabWidget.indexOf(widget))
 
     def create_tabs(self):
-        self.tab_2 = widget_mdb.Ui_widget_mdb(base_widget=self)
+        with startup.section("MDB tab"):
+            self.tab_2 = widget_mdb.Ui_widget_mdb(base_widget=self)
         self.tab_2.setObjectName(u"tab_2")
         self.tabWidget.addTab(self.tab_2, "")
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_2), "MDB")
@@ -76,25 +88,27 @@ class Ui_widget_tabs(QWidget):
         self.tab_3.setObjectName(u"tab_3")
         self.tabWidget.addTab(self.tab_3, "")
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_3), "Assembly")
-        self.tab_4 = widget_story.Ui_story_editor(base_widget=self)
+        with startup.section("Story tab"):
+            self.tab_4 = widget_story.Ui_story_editor(base_widget=self)
         self.tab_4.setObjectName(u"tab_4")
         self.tabWidget.addTab(self.tab_4, "")
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_4), "Story")
-        self.tab_5 = widget_gacha_comment.Ui_gacha_comment(base_widget=self)
+        with startup.section("Gacha comment tab"):
+            self.tab_5 = widget_gacha_comment.Ui_gacha_comment(base_widget=self)
         self.tab_5.setObjectName(u"tab_5")
         self.tabWidget.addTab(self.tab_5, "")
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_5), "Gacha Comment")
 
-    def refresh_widgets(self, func):
+    def refresh_widgets(self, name, tasks):
+        # The editors are closed while the job runs, and recreated when it ends.
         if not self.ask_widgets_close():
-            return
-        
-        self.app.setOverrideCursor(QCursor(Qt.WaitCursor))
-        func()
-        self.app.restoreOverrideCursor()
+            return None
 
         self.remove_all_but_main()
-        self.create_tabs()
+
+        job = jobs.Job(name, tasks)
+        job.ended.connect(self.create_tabs)
+        return self.jobs.submit(job)
 
     def ask_widgets_close(self):
         for i in range(self.tabWidget.count()):
@@ -111,12 +125,42 @@ class Ui_widget_tabs(QWidget):
     def closeEvent(self, a0: QCloseEvent) -> None:
         print("closeEvent")
 
+        if self.close_pending:
+            # Already confirmed, waiting for the cancelled job to stop.
+            if self.jobs.is_busy():
+                a0.ignore()
+                return
+            return super().closeEvent(a0)
+
         if not self.ask_widgets_close():
             a0.ignore()
             return
 
+        if self.jobs.is_busy():
+            ret = QMessageBox.question(self, "Job running", "A job is still running. Stop it after the current step and close?")
+            if ret != QMessageBox.Yes:
+                a0.ignore()
+                return
+
+            self.app.setOverrideCursor(QCursor(Qt.WaitCursor))
+            self.jobs.cancel()
+            done = self.jobs.pool.waitForDone(CLOSE_WAIT_MS)
+            self.app.restoreOverrideCursor()
+
+            if not done:
+                # Don't freeze the UI until the step finishes. Close once the job has stopped.
+                self.close_pending = True
+                self.jobs.busy_changed.connect(self.close_when_idle)
+                QMessageBox.information(self, "Job running", "The editor will close once the current step has finished.")
+                a0.ignore()
+                return
+
         return super().closeEvent(a0)
 
+    def close_when_idle(self, busy):
+        if not busy:
+            self.close()
+
     def setupUi(self, widget_tabs):
         if not widget_tabs.objectName():
             widget_tabs.setObjectName(u"widget_tabs")
@@ -142,6 +186,11 @@ class Ui_widget_tabs(QWidget):
 
         self.verticalLayout.addWidget(self.tabWidget)
 
+        self.job_panel = jobs.JobPanel(self.jobs, widget_tabs)
+        self.job_panel.setObjectName(u"job_panel")
+        self.verticalLayout.addWidget(self.job_panel)
+        self.jobs.busy_changed.connect(lambda busy: self.adjust_size())
+
         self.create_tabs()
 
         self.tabWidget.setCurrentIndex(0)
@@ -8,21 +8,26 @@ import zipfile
 from PIL import Image, ImageFilter
 import tqdm as _tqdm
 import sys
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from PyQt5.QtGui import QIcon
-from fontTools.ttLib import TTFont
-import win32gui
-import win32process
-import win32api
-import win32con
+import subprocess
+import tempfile
 import lz4.frame
 import time
 import glob
 import pyphen
 from functools import cache
 from multiprocessing.pool import Pool
+import multiprocessing
+import threading
 import re
 import hashlib
+import markup
+import pack
+import startup
+import environment
+from environment import win32gui, win32process, win32api, win32con, QtWidgets, QtGui
+
+# Only needed for text measurements.
+ttLib = startup.lazy_import("fontTools.ttLib")
 
 hyphen_dict = pyphen.Pyphen(lang='en_US')
 
@@ -47,6 +52,33 @@ def get_asset(asset_path):
     return os.path.join(unpack_dir, asset_path)
 
 
+# Structured progress events, e.g. for the UI's job panel.
+# Pool workers put theirs on a queue, which a thread in the main process forwards to the listener.
+_progress_listener = None
+_progress_queue = None
+
+def set_progress_listener(listener):
+    global _progress_listener
+    _progress_listener = listener
+
+def report_progress(event):
+    if _progress_queue is not None:
+        _progress_queue.put(event)
+    elif _progress_listener:
+        _progress_listener(event)
+
+def _init_progress_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+def _forward_progress(progress_queue):
+    while True:
+        event = progress_queue.get()
+        if event is None:
+            break
+        report_progress(event)
+
+
 class UmaPool(Pool):
     def __init__(self, processes=None, *args, **kwargs):
         # Limit processes to 12 maximum.
@@ -56,52 +88,79 @@ class UmaPool(Pool):
         # if processes > 12:
         #     processes = 12
 
+        self.progress_queue = None
+        if _progress_listener and not args and 'initializer' not in kwargs:
+            self.progress_queue = multiprocessing.Queue()
+            kwargs['initializer'] = _init_progress_worker
+            kwargs['initargs'] = (self.progress_queue,)
+            threading.Thread(target=_forward_progress, args=(self.progress_queue,), daemon=True).start()
+
         super().__init__(processes, *args, **kwargs)
 
+    def _stop_progress(self):
+        if self.progress_queue is not None:
+            self.progress_queue.put(None)
+            self.progress_queue = None
+
+    def join(self):
+        super().join()
+        self._stop_progress()
+
+    def terminate(self):
+        super().terminate()
+        self._stop_progress()
+
 
-APP_DIR = os.path.expandvars("%AppData%\\Uma-Carotene\\")
+# Folders end with a separator, so file names can be appended.
+APP_DIR = os.path.join(environment.get_path("app_dir", os.path.join(environment.get_appdata_folder(), "Uma-Carotene")), "")
 os.makedirs(APP_DIR, exist_ok=True)
 
-SETTINGS_PATH = APP_DIR + "patcher_settings.json"
+SETTINGS_PATH = os.path.join(APP_DIR, "patcher_settings.json")
+PATCH_STATS_PATH = os.path.join(APP_DIR, "patch_stats.json")
 
 
 TQDM_FORMAT = "{desc}: {percentage:3.0f}% |{bar}|"
 TQDM_NCOLS = 65
 
-MDB_PATH = os.path.expandvars("%userprofile%\\appdata\\locallow\\Cygames\\umamusume\\master\\master.mdb")
-META_PATH = os.path.expandvars("%userprofile%\\appdata\\locallow\\Cygames\\umamusume\\meta")
+GAME_DATA_PATH = environment.get_path("game_data_dir", environment.get_default_game_data_folder())
+
+MDB_PATH = os.path.join(GAME_DATA_PATH, "master", "master.mdb")
+META_PATH = os.path.join(GAME_DATA_PATH, "meta")
 META_BACKUP_SUFFIX = ".carotene.bak"
+META_STATUS_PATH = META_PATH + ".carotene.status"
+META_UNDO_PATH = META_PATH + ".carotene.undo"
 
-DATA_PATH = os.path.expandvars("%userprofile%\\appdata\\locallow\\Cygames\\umamusume\\dat")
-CAROTENIFY_PATY = os.path.expandvars("%TEMP%\\carotenify")
+DATA_PATH = os.path.join(GAME_DATA_PATH, "dat")
+CAROTENIFY_PATY = os.path.join(environment.get_path("temp_dir", tempfile.gettempdir()), "carotenify")
 
-TMP_FOLDER = get_asset("tmp\\")
+TMP_FOLDER = os.path.join(environment.get_path("tmp_dir", get_asset("tmp")), "")
 
-TL_PREFIX = get_asset("translations\\")
-INTERMEDIATE_PREFIX = get_asset("editing\\")
+TL_PREFIX = os.path.join(environment.get_path("translations_dir", get_asset("translations")), "")
+INTERMEDIATE_PREFIX = os.path.join(environment.get_path("editing_dir", get_asset("editing")), "")
 
-MDB_FOLDER = TL_PREFIX + "mdb\\"
-MDB_FOLDER_EDITING = INTERMEDIATE_PREFIX + "mdb\\"
+MDB_FOLDER = os.path.join(TL_PREFIX, "mdb", "")
+MDB_FOLDER_EDITING = os.path.join(INTERMEDIATE_PREFIX, "mdb", "")
+FONT_PATH = os.path.join(MDB_FOLDER_EDITING, "font", "dynamic01.otf")
 
 def get_tl_mdb_jsons():
-    mdb_jsons = glob.glob(MDB_FOLDER + "*.json")
-    mdb_jsons += glob.glob(MDB_FOLDER + "**\\*.json")
+    mdb_jsons = glob.glob(os.path.join(MDB_FOLDER, "*.json"))
+    mdb_jsons += glob.glob(os.path.join(MDB_FOLDER, "*", "*.json"))
     return mdb_jsons
 
 
-ASSETS_FOLDER = TL_PREFIX + "assets\\"
-ASSETS_FOLDER_EDITING = INTERMEDIATE_PREFIX + "assets\\"
+ASSETS_FOLDER = os.path.join(TL_PREFIX, "assets", "")
+ASSETS_FOLDER_EDITING = os.path.join(INTERMEDIATE_PREFIX, "assets", "")
 
-FLASH_FOLDER = TL_PREFIX + "flash\\"
-FLASH_FOLDER_EDITING = INTERMEDIATE_PREFIX + "flash\\"
+FLASH_FOLDER = os.path.join(TL_PREFIX, "flash", "")
+FLASH_FOLDER_EDITING = os.path.join(INTERMEDIATE_PREFIX, "flash", "")
 
-ASSEMBLY_FOLDER = TL_PREFIX + "assembly\\"
-ASSEMBLY_FOLDER_EDITING = INTERMEDIATE_PREFIX + "assembly\\"
+ASSEMBLY_FOLDER = os.path.join(TL_PREFIX, "assembly", "")
+ASSEMBLY_FOLDER_EDITING = os.path.join(INTERMEDIATE_PREFIX, "assembly", "")
 
-DIFF_FOLDER = TL_PREFIX + "diff\\"
+DIFF_FOLDER = os.path.join(TL_PREFIX, "diff", "")
 
-GACHA_COMMENT_TL_PATH = ASSETS_FOLDER + "\\gacha\\comment\\translations.json"
-GACHA_COMMENT_TL_PATH_EDITING = ASSETS_FOLDER_EDITING + "\\gacha\\comment\\translations.json"
+GACHA_COMMENT_TL_PATH = os.path.join(ASSETS_FOLDER, "gacha", "comment", "translations.json")
+GACHA_COMMENT_TL_PATH_EDITING = os.path.join(ASSETS_FOLDER_EDITING, "gacha", "comment", "translations.json")
 
 TABLE_PREFIX = '_carotene'
 TABLE_BACKUP_PREFIX = TABLE_PREFIX + "_bak_"
@@ -110,7 +169,7 @@ META_BACKUP_TABLE = TABLE_BACKUP_PREFIX + "a"
 
 DLL_BACKUP_SUFFIX = ".bak"
 
-DMM_CONFIG_PATH = os.path.expandvars("%AppData%\\dmmgameplayer5\\dmmgame.cnf")
+DMM_CONFIG_PATH = environment.get_path("dmm_config", os.path.join(environment.get_appdata_folder(), "dmmgameplayer5", "dmmgame.cnf"))
 
 CELLAR_URL = "https://github.com/Hachimi-Hachimi/Cellar/releases/latest/download/dxgi.dll"
 
@@ -123,6 +182,11 @@ def string_to_version(version_string):
     
     return tuple(int(v) for v in version_string.split("."))
 
+# Seconds to wait for another connection's write, e.g. from a pool worker, before "database is locked".
+DB_BUSY_TIMEOUT = 60
+# Stays below SQLite's variable limit.
+SQL_CHUNK_SIZE = 500
+
 class Connection:
     DB_PATH = None
 
@@ -131,7 +195,7 @@ class Connection:
             display_critical_message("No Database Found", "We couldn't find the game's database file.\n\nPlease make sure that you have finished the tutorial and the initial in-game download before running Carotene.\n\nIf you are still encoutering this issue please join our Discord server for direct help.")
             raise GameDatabaseNotFoundException(f"Game database {self.DB_PATH} not found.")
         else:
-            self.conn = sqlite3.connect(self.DB_PATH)
+            self.conn = sqlite3.connect(self.DB_PATH, timeout=DB_BUSY_TIMEOUT)
 
     def __enter__(self):
             return self.conn, self.conn.cursor()
@@ -148,6 +212,9 @@ class MetaConnection(Connection):
 class MetaBackupConnection(Connection):
     DB_PATH = META_PATH + META_BACKUP_SUFFIX
 
+class MetaUndoConnection(Connection):
+    DB_PATH = META_UNDO_PATH
+
 class GameDatabaseNotFoundException(Exception):
     pass
 
@@ -158,14 +225,14 @@ class DMMConfigNotFoundException(Exception):
     pass
 
 def display_critical_message(title, text):
-    if is_script:
+    if is_script or environment.is_headless():
         print(f"{title}: {text}")
         return
-    msg = QMessageBox()
-    msg.setIcon(QMessageBox.Critical)
+    msg = QtWidgets.QMessageBox()
+    msg.setIcon(QtWidgets.QMessageBox.Critical)
     msg.setText(text)
     msg.setWindowTitle(title)
-    msg.setStandardButtons(QMessageBox.Ok)
+    msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
     msg.exec_()
 
 def load_json(path):
@@ -182,6 +249,32 @@ def save_json(path, data):
     with open(path, "w", encoding='utf-8') as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
 
+def save_json_if_changed(path, data):
+    # Only write the file if its contents would change. Returns True if written.
+    new_text = json.dumps(data, indent=4, ensure_ascii=False)
+
+    if os.path.exists(path):
+        with open(path, "r", encoding='utf-8') as f:
+            if f.read() == new_text:
+                return False
+
+    dir_path = os.path.dirname(path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    with open(path, "w", encoding='utf-8') as f:
+        f.write(new_text)
+    return True
+
+def copy_if_changed(src, dst):
+    # Only copy the file if the destination differs. Returns True if copied.
+    if os.path.exists(dst) and os.path.getsize(dst) == os.path.getsize(src):
+        with open(src, "rb") as f_src, open(dst, "rb") as f_dst:
+            if f_src.read() == f_dst.read():
+                return False
+
+    shutil.copy(src, dst)
+    return True
+
 def download_json(url):
     r = requests.get(url)
     r.raise_for_status()
@@ -252,6 +345,10 @@ def get_window_handle(query: str, type=LAZY) -> str:
     global window_handle
 
     window_handle = None
+    if not environment.HAS_WIN32:
+        # No windows to look through.
+        return window_handle
+
     win32gui.EnumWindows(type, query)
     return window_handle
 
@@ -260,15 +357,19 @@ def check_umamusume():
 
 def close_umamusume():
     if check_umamusume():
+        if environment.is_headless():
+            print("Please close the game before continuing.")
+            return False
+
         # Messagebox telling the user to close the game, choose Cancel and Continue
-        qm = QMessageBox()
+        qm = QtWidgets.QMessageBox()
         # qm.warning(qm, "Please close the game", "Please close the game before continuing.", QMessageBox.Cancel | QMessageBox.Ok, QMessageBox.Cancel)
         qm.setText("Please close the game before continuing.")
         qm.setWindowTitle("Please close the game")
-        qm.setIcon(QMessageBox.Warning)
-        qm.setStandardButtons(QMessageBox.Cancel | QMessageBox.Ok)
-        qm.setDefaultButton(QMessageBox.Cancel)
-        qm.setEscapeButton(QMessageBox.Cancel)
+        qm.setIcon(QtWidgets.QMessageBox.Warning)
+        qm.setStandardButtons(QtWidgets.QMessageBox.Cancel | QtWidgets.QMessageBox.Ok)
+        qm.setDefaultButton(QtWidgets.QMessageBox.Cancel)
+        qm.setEscapeButton(QtWidgets.QMessageBox.Cancel)
         run_widget(qm)
         if qm.clickedButton() == qm.Cancel:
             return False
@@ -368,6 +469,38 @@ def download_file(url, path, no_progress=False):
                 if progress_bar:
                     progress_bar.update(len(chunk))
 
+def replace_folder(src, dst):
+    # Move src to dst, replacing dst. A folder can't be replaced in one step on Windows,
+    # so the old one is moved aside first.
+    old_path = dst + ".old"
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+    if os.path.exists(dst):
+        os.replace(dst, old_path)
+    os.replace(src, dst)
+
+    if os.path.exists(old_path):
+        print("Deleting old files")
+        shutil.rmtree(old_path)
+
+def download_pack(url, out_folder):
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+
+        bar_format = TQDM_FORMAT + " {n_fmt}/{total_fmt}"
+        progress_bar = tqdm(total=int(r.headers.get('Content-Length', 0)), unit='B', unit_scale=True, desc=f"Installing", bar_format=bar_format)
+
+        def progress(_):
+            # Content-Length counts the bytes on the wire, before decoding.
+            progress_bar.update(r.raw.tell() - progress_bar.n)
+
+        count = pack.install_stream(r.raw, out_folder, progress=progress)
+        progress_bar.close()
+
+    print(f"Installed {count} files")
+
 def download_latest(ignore_filesize=False, prerelease=False):
     print("Downloading latest translation files")
 
@@ -376,10 +509,16 @@ def download_latest(ignore_filesize=False, prerelease=False):
     ver = cur_version['tag_name']
     
     dl_asset = None
+    pack_asset = None
     for asset in cur_version['assets']:
         if asset['name'].endswith(f"{ver}.zip"):
             dl_asset = asset
-            break
+        elif asset['name'].endswith(f"{ver}.cpak"):
+            pack_asset = asset
+
+    if pack_asset:
+        # Packed releases are installed while they download.
+        dl_asset = pack_asset
 
     if not dl_asset:
         raise Exception("No translations zip found")
@@ -392,6 +531,23 @@ def download_latest(ignore_filesize=False, prerelease=False):
     
     print(f"Downloading {ver}")
 
+    if dl_asset is pack_asset:
+        # Install next to the current files, which are only replaced once the pack is complete.
+        final_path = os.path.normpath(TL_PREFIX)
+        install_path = final_path + ".download"
+        if os.path.exists(install_path):
+            shutil.rmtree(install_path)
+        os.makedirs(install_path)
+
+        try:
+            download_pack(dl_asset['browser_download_url'], install_path)
+        except Exception:
+            shutil.rmtree(install_path, ignore_errors=True)
+            raise
+
+        replace_folder(install_path, final_path)
+        return ver
+
     os.makedirs(TMP_FOLDER, exist_ok=True)
     dl_path = os.path.join(TMP_FOLDER, dl_asset['name'])
 
@@ -419,18 +575,33 @@ def clean_download():
         shutil.rmtree(TL_PREFIX)
     # print("Done")
 
+class ProgressBar(_tqdm.tqdm):
+    # Reports its state as a progress event whenever it redraws.
+    def display(self, *args, **kwargs):
+        report_progress({
+            "type": "bar",
+            "desc": self.desc,
+            "n": self.n,
+            "total": self.total,
+        })
+        return super().display(*args, **kwargs)
+
 def tqdm(*args, **kwargs):
     if not kwargs.get('bar_format'):
         kwargs['bar_format'] = TQDM_FORMAT
     if not kwargs.get('ncols'):
         kwargs['ncols'] = TQDM_NCOLS
-    return _tqdm.tqdm(*args, **kwargs)
+    return ProgressBar(*args, **kwargs)
 
 def raise_dmm_config_not_found(reason):
     display_critical_message("DMM Game Config Error", f"{reason}<br>Please make sure that all of the following are done:<ul><li>DMM Game Player is installed on this computer.</li><li>Umamusume: Pretty Derby is installed via DMM.</li><li>You have started the game via DMM at least once.</li></ul>Expected config file location:<br>{DMM_CONFIG_PATH}")
     raise DMMConfigNotFoundException()
 
 def get_game_folder():
+    path = environment.get_path("game_folder")
+    if path:
+        return path
+
     if not os.path.exists(DMM_CONFIG_PATH):
         raise_dmm_config_not_found("DMM config file not found.")
 
@@ -456,8 +627,8 @@ def run_widget(widget, main=False, *args, **kwargs):
     global APPLICATION
 
     if not APPLICATION:
-        APPLICATION = QApplication([])
-        APPLICATION.setWindowIcon(QIcon(get_asset('assets/icon.ico')))
+        APPLICATION = QtWidgets.QApplication([])
+        APPLICATION.setWindowIcon(QtGui.QIcon(get_asset('assets/icon.ico')))
     
     if hasattr(widget, 'exec_') and not main:
         widget.exec_(*args, **kwargs)
@@ -500,7 +671,7 @@ def redownload_mdb():
     download_lz4(url, mdb_path)
     print("=== Downloaded latest master.mdb. You may now apply the patch again. ===")
 
-def download_asset(hash, no_progress=False, force=False):
+def download_asset(hash, no_progress=False, force=False, mark_downloaded=True):
     asset_path = get_asset_path(hash)
     if os.path.exists(asset_path):
         if force:
@@ -524,32 +695,70 @@ def download_asset(hash, no_progress=False, force=False):
         url = 'https://prd-storage-game-umamusume.akamaized.net/dl/resources/Generic/{0:.2}/{0}'.format(hash)
         download_file(url, asset_path, no_progress=no_progress)
 
-    # Mark the asset as downloaded in the meta db
+    if mark_downloaded:
+        mark_assets_downloaded([hash])
+
+def mark_assets_downloaded(hashes):
+    # Mark assets as downloaded in the meta db, in one transaction.
     with MetaConnection() as (conn, cursor):
-        cursor.execute("SELECT i FROM a WHERE h = ? AND s = 0", (hash,))
-        row = cursor.fetchone()
-        if not row:
-            return
-        cursor.execute("UPDATE a SET s = 1 WHERE i = ?", (row[0],))
+        log_changes = attach_meta_undo(cursor)
+
+        hashes = list(hashes)
+        for i in range(0, len(hashes), SQL_CHUNK_SIZE):
+            chunk = hashes[i:i + SQL_CHUNK_SIZE]
+            where = f"s = 0 AND h IN ({','.join(['?'] * len(chunk))})"
+            if log_changes:
+                log_meta_change(cursor, "s", where, chunk)
+            cursor.execute(f"UPDATE a SET s = 1 WHERE {where};", chunk)
         conn.commit()
 
-def prepare_font():
-    with MetaConnection() as (conn, cursor):
-        cursor.execute("SELECT h FROM a WHERE n = 'font/dynamic01.otf'")
-        row = cursor.fetchone()
-    
-    if not row:
-        raise Exception("Font not found in meta db.")
+def create_meta_undo():
+    # Start a new undo log for the meta db.
+    if os.path.exists(META_UNDO_PATH):
+        os.remove(META_UNDO_PATH)
 
-    font_hash = row[0]
-    
-    font_path = MDB_FOLDER_EDITING + "font/dynamic01.otf"
-    os.makedirs(os.path.dirname(font_path), exist_ok=True)
+    conn = sqlite3.connect(META_UNDO_PATH)
+    conn.execute("CREATE TABLE u (r INTEGER, c TEXT, v, PRIMARY KEY (r, c)) WITHOUT ROWID;")
+    conn.commit()
+    conn.close()
+
+def attach_meta_undo(cursor):
+    # Attach the undo log to a meta db connection, if the meta db is patched.
+    # Must be called outside of a transaction.
+    if not os.path.exists(META_UNDO_PATH):
+        return False
+
+    cursor.execute("ATTACH DATABASE ? AS undo;", (META_UNDO_PATH,))
+    return True
+
+def log_meta_change(cursor, column, where, params):
+    # Store the original value of a column before the patcher changes it.
+    # Values that were already logged are kept.
+    cursor.execute(f"INSERT OR IGNORE INTO undo.u SELECT rowid, '{column}', {column} FROM a WHERE {where};", params)
 
+def prepare_font():
+    font_path = FONT_PATH
+
+    # Only copied from the game once, so it also works without the game.
     if not os.path.exists(font_path):
+        with MetaConnection() as (conn, cursor):
+            cursor.execute("SELECT h FROM a WHERE n = 'font/dynamic01.otf'")
+            row = cursor.fetchone()
+
+        if not row:
+            raise Exception("Font not found in meta db.")
+
+        font_hash = row[0]
+
+        os.makedirs(os.path.dirname(font_path), exist_ok=True)
         shutil.copy(get_asset_path(font_hash), font_path)
 
-    return TTFont(font_path)
+    return ttLib.TTFont(font_path)
+
+@cache
+def get_font_hash():
+    with open(FONT_PATH, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
 
 @cache
 def get_font_data(ttfont):
@@ -645,8 +854,8 @@ def add_nested_dict(d, path, value):
     d[path[-1]] = value
 
 def get_assets_type_dict():
-    jsons = glob.glob(ASSETS_FOLDER + "\\**\\*.json", recursive=True)
-    jsons += glob.glob(FLASH_FOLDER + "\\**\\*.json", recursive=True)
+    jsons = glob.glob(os.path.join(ASSETS_FOLDER, "**", "*.json"), recursive=True)
+    jsons += glob.glob(os.path.join(FLASH_FOLDER, "**", "*.json"), recursive=True)
 
     with UmaPool() as pool:
         results = list(tqdm(pool.imap_unordered(get_asset_and_type, jsons, chunksize=128), total=len(jsons), desc="Looking for assets"))
@@ -668,37 +877,15 @@ def get_assets_type_dict():
 
 def filter_tags(in_str):
     # Remove any <> tags from string.
-    return re.sub(r'<[^>]*>', '', in_str)
+    return markup.strip_tags(in_str)
 
 def remove_size_tags(str):
     # Remove any <size=?> or </size> tags from string.
-    return re.sub(r"<size=[^>]*>|</size>", "", str)
+    return markup.strip_size_tags(str)
 
 def process_colored_text(in_str):
-    color_list = []
-    used_text = set()
-
-    matches = re.findall(r"<col=[^>]*>.*?</col>", in_str)
-
-    for match_str in matches:
-        color_id = re.search(r"<col=([^>]*)>", match_str).group(1)
-        text = re.search(r"<col=[^>]*>(.*)</col>", match_str).group(1)
-
-        # Skip if text has already been colored.
-        if text in used_text:
-            continue
-
-        used_text.add(text)
-
-        color_list.append({
-            "text": text,
-            "color_id": int(color_id)
-        })
-    
-    # Remove all <col=?> and </col> tags from string.
-    in_str = re.sub(r"<col=[^>]*>|</col>", "", in_str)
-
-    return in_str, color_list
+    # Remove all <col=?> and </col> tags from string, and list the colored text.
+    return markup.extract_colors(in_str)
 
 def apply_colored_text(in_str, color_list):
     if not color_list:
@@ -767,17 +954,24 @@ def _check_enough_space(path, needed):
     
     return True, None
 
-def check_enough_space(size):
-    app_folder = os.path.realpath(APP_DIR)
-    game_folder = os.path.realpath(DATA_PATH)
+def _get_drive(path):
+    # The drive letter on Windows, the closest existing folder elsewhere.
+    path = os.path.realpath(path)
+    drive = os.path.splitdrive(path)[0]
+    if drive:
+        return drive
 
-    # Extract the windows drive letters.
-    app_drive = os.path.splitdrive(app_folder)[0]
-    game_drive = os.path.splitdrive(game_folder)[0]
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+def check_enough_space(size):
+    app_drive = _get_drive(APP_DIR)
+    game_drive = _get_drive(DATA_PATH)
 
     failures = []
 
-    if app_drive == game_drive:
+    if os.stat(app_drive).st_dev == os.stat(game_drive).st_dev:
         # Only check once.
         needed = 2 * size
         enough, err = _check_enough_space(app_drive, needed)
@@ -796,20 +990,36 @@ def check_enough_space(size):
             failures.append(err)
     
     if failures:
-        err_list = []
-        err_list.append("There may not be enough space on the following drives:<br>")
-
-        for err in failures:
-            err_list.append(f"{err[0]} {err[1] / 1024**3:.2f} GB needed, {err[2] / 1024**3:.2f} GB available")
+        return False, _format_space_failures(failures)
+    
+    return True, None
 
-        err_list.append("<br>These are estimations, so you may still try to install.<br>Click the Patch/Update button again to force the patch.")
+def check_enough_game_space(size):
+    # Check the game drive for the space a patch will take up.
+    game_drive = _get_drive(DATA_PATH)
 
-        return False, "<br>".join(err_list)
+    enough, err = _check_enough_space(game_drive, size)
+    if not enough:
+        return False, _format_space_failures([err])
     
     return True, None
 
+def _format_space_failures(failures):
+    err_list = []
+    err_list.append("There may not be enough space on the following drives:<br>")
+
+    for err in failures:
+        err_list.append(f"{err[0]} {err[1] / 1024**3:.2f} GB needed, {err[2] / 1024**3:.2f} GB available")
+
+    err_list.append("<br>These are estimations, so you may still try to install.<br>Click the Patch/Update button again to force the patch.")
+
+    return "<br>".join(err_list)
+
 def open_path_in_explorer(path):
-    os.startfile(path)
+    if environment.IS_WINDOWS:
+        os.startfile(path)
+    else:
+        subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", path])
 
 def running_from_game_folder():
     return os.path.abspath(os.getcwd()) == os.path.abspath(get_game_folder())
@@ -842,7 +1052,7 @@ def write_carotenify_file(out_str, file_type):
 def cleanup_carotenify_files():
     os.makedirs(CAROTENIFY_PATY, exist_ok=True)
     timestamp = int((time.time() - 60) * 1000)
-    files = glob.glob(f"{CAROTENIFY_PATY}\\*")
+    files = glob.glob(os.path.join(CAROTENIFY_PATY, "*"))
     for file in files:
         if int(os.path.basename(file).split('.')[0]) < timestamp:
             os.remove(file)